@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Attendance Rollups
+Packs each student's academic-year attendance into per-day bitmaps (marked and
+present), updated incrementally from student_attendance, and serves monthly,
+term, class and school percentages from popcounts instead of row scans
+"""
+import os
+import sys
+import time
+import argparse
+import logging
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+ACADEMIC_YEAR = '2025-26'
+ACADEMIC_YEAR_START_MONTH = 4  # tenants.academic_year_start_month default
+ROLLUP_DIR = 'attendance_rollups'
+FETCH_ROWS = 50000  # Rows per server-side cursor fetch
+TERMS = [('Term 1', 0, 6), ('Term 2', 6, 12)]  # (label, first month, end month) as offsets from the year start
+REPORT_FILE = 'attendance_report.csv'
+ID_DTYPE = '<U36'  # Student and class ids are UUID strings
+
+# Rows inserted since the watermark; created_at >= so rows sharing the watermark timestamp are never missed
+# (re-applying a row is harmless: it sets the same bits)
+ATTENDANCE_QUERY = """
+    SELECT student_id, class_id, date, status, created_at
+    FROM student_attendance
+    WHERE tenant_id = %(tenant_id)s AND date BETWEEN %(start)s AND %(end)s
+      AND (%(watermark)s::timestamp IS NULL OR created_at >= %(watermark)s::timestamp)
+    ORDER BY created_at
+"""
+
+def popcount(packed):
+    """Set bits per byte of a uint8 array"""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(packed)
+    return _POPCOUNT_TABLE[packed]
+
+_POPCOUNT_TABLE = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+def academic_year_range(academic_year, start_month=ACADEMIC_YEAR_START_MONTH):
+    """First and last day of an academic year such as '2025-26'"""
+    first_year = int(str(academic_year)[:4])
+    start = date(first_year, start_month, 1)
+    return start, date(first_year + 1, start_month, 1) - timedelta(days=1)
+
+def month_start(start, offset):
+    year, month = divmod(start.month - 1 + offset, 12)
+    return date(start.year + year, month + 1, 1)
+
+class AttendanceBitmaps:
+    """
+    One tenant's attendance for one academic year, as two bit arrays per student.
+
+    Bit d of a student's 'marked' row says attendance was taken on day d of
+    the year; the same bit of 'present' says they were present. Rows are
+    np.packbits'd, so a full year is 46 bytes per bitmap per student.
+    """
+
+    def __init__(self, tenant_id, academic_year, start_month=ACADEMIC_YEAR_START_MONTH):
+        self.tenant_id = tenant_id
+        self.academic_year = academic_year
+        self.start, self.end = academic_year_range(academic_year, start_month)
+        self.days = (self.end - self.start).days + 1
+        self.student_ids = np.array([], dtype=ID_DTYPE)
+        self.class_ids = np.array([], dtype=ID_DTYPE)
+        self.marked = np.zeros((0, (self.days + 7) // 8), dtype=np.uint8)
+        self.present = np.zeros_like(self.marked)
+        self.watermark = None
+        self._index = {}
+
+    @staticmethod
+    def path(store_dir, tenant_id, academic_year):
+        return os.path.join(store_dir, str(tenant_id), f"{academic_year}.npz")
+
+    @classmethod
+    def load(cls, store_dir, tenant_id, academic_year, start_month=ACADEMIC_YEAR_START_MONTH):
+        """Stored bitmaps, or an empty set when none have been built yet"""
+        bitmaps = cls(tenant_id, academic_year, start_month)
+        path = cls.path(store_dir, tenant_id, academic_year)
+        if os.path.exists(path):
+            with np.load(path, allow_pickle=False) as data:
+                bitmaps.student_ids = data['student_ids']
+                bitmaps.class_ids = data['class_ids']
+                bitmaps.marked = data['marked']
+                bitmaps.present = data['present']
+                bitmaps.watermark = str(data['watermark']) or None
+            bitmaps._index = {student_id: i for i, student_id in enumerate(bitmaps.student_ids)}
+        return bitmaps
+
+    def save(self, store_dir):
+        path = self.path(store_dir, self.tenant_id, self.academic_year)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            np.savez_compressed(f, student_ids=self.student_ids, class_ids=self.class_ids, marked=self.marked,
+                                present=self.present, watermark=np.array(self.watermark or ''))
+        os.replace(tmp_path, path)
+        return path
+
+    def _student_rows(self, student_ids, class_ids):
+        """Bitmap row of each student, adding rows for students seen for the first time"""
+        new = [sid for sid in pd.unique(student_ids) if sid not in self._index]
+        if new:
+            for sid in new:
+                self._index[sid] = len(self._index)
+            self.student_ids = np.concatenate([self.student_ids, np.array(new, dtype=ID_DTYPE)])
+            self.class_ids = np.concatenate([self.class_ids, np.full(len(new), '', dtype=ID_DTYPE)])
+            padding = np.zeros((len(new), self.marked.shape[1]), dtype=np.uint8)
+            self.marked = np.vstack([self.marked, padding])
+            self.present = np.vstack([self.present, padding])
+
+        rows = np.fromiter((self._index[sid] for sid in student_ids), dtype=np.int64, count=len(student_ids))
+        self.class_ids[rows] = class_ids  # The latest row decides a student's class
+        return rows
+
+    def apply(self, rows):
+        """
+        Set bits from attendance rows (student_id, class_id, date, status, created_at).
+
+        When a student has several rows for one day, the latest created wins.
+        """
+        if rows.empty:
+            return 0
+        rows = rows.sort_values('created_at').drop_duplicates(['student_id', 'date'], keep='last')
+        days = (pd.to_datetime(rows['date']) - pd.Timestamp(self.start)).dt.days.to_numpy()
+        in_year = (days >= 0) & (days < self.days)
+        rows, days = rows[in_year], days[in_year]
+
+        student_rows = self._student_rows(rows['student_id'].astype(str).to_numpy(),
+                                          rows['class_id'].fillna('').astype(str).to_numpy())
+        byte = days >> 3
+        bit = (np.uint8(0x80) >> (days & 7).astype(np.uint8)).astype(np.uint8)  # packbits order: day 0 is the high bit
+        present = (rows['status'] == 'Present').to_numpy()
+
+        # ufunc.at applies repeated (row, byte) pairs one by one, unlike fancy-index assignment
+        np.bitwise_or.at(self.marked, (student_rows, byte), bit)
+        np.bitwise_and.at(self.present, (student_rows, byte), ~bit)
+        np.bitwise_or.at(self.present, (student_rows[present], byte[present]), bit[present])
+
+        latest = str(rows['created_at'].max())
+        if self.watermark is None or latest > self.watermark:
+            self.watermark = latest
+        return len(rows)
+
+    def period_mask(self, first_day, end_day):
+        """Packed mask with bits set for days first_day <= d < end_day"""
+        bits = np.zeros(self.marked.shape[1] * 8, dtype=bool)
+        bits[max(first_day, 0):min(end_day, self.days)] = True
+        return np.packbits(bits)
+
+    def periods(self, kind='month'):
+        """(label, first day, end day) for each month or term of the year"""
+        offsets = [(month_start(self.start, i).strftime('%Y-%m'), i, i + 1) for i in range(12)] \
+            if kind == 'month' else TERMS
+        return [(label, (month_start(self.start, first) - self.start).days,
+                 (month_start(self.start, end) - self.start).days) for label, first, end in offsets]
+
+    def counts(self, kind='month'):
+        """Per-student present and marked day counts per period, by popcount of the masked bitmaps"""
+        periods = self.periods(kind)
+        present = np.zeros((len(self.student_ids), len(periods)), dtype=np.int32)
+        marked = np.zeros_like(present)
+        for k, (_, first_day, end_day) in enumerate(periods):
+            mask = self.period_mask(first_day, end_day)
+            present[:, k] = popcount(self.present & mask).sum(axis=1)
+            marked[:, k] = popcount(self.marked & mask).sum(axis=1)
+        return [label for label, _, _ in periods], present, marked
+
+def fetch_new_rows(conn, bitmaps, fetch_rows=FETCH_ROWS):
+    """Yield DataFrames of attendance rows inserted since the bitmaps' watermark"""
+    cursor = conn.cursor(name='attendance_rollup')  # Server-side cursor: a full rebuild streams instead of loading
+    cursor.itersize = fetch_rows
+    try:
+        cursor.execute(ATTENDANCE_QUERY, {'tenant_id': bitmaps.tenant_id, 'start': bitmaps.start,
+                                          'end': bitmaps.end, 'watermark': bitmaps.watermark})
+        while True:
+            chunk = cursor.fetchmany(fetch_rows)
+            if not chunk:
+                return
+            yield pd.DataFrame(chunk, columns=['student_id', 'class_id', 'date', 'status', 'created_at'])
+    finally:
+        cursor.close()
+
+def update_rollups(conn, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR, store_dir=ROLLUP_DIR, rebuild=False,
+                   start_month=ACADEMIC_YEAR_START_MONTH):
+    """
+    Bring the stored bitmaps up to date and return them.
+
+    Only rows created since the last watermark are read. Rows edited in
+    place keep their created_at, so use rebuild after bulk corrections.
+    """
+    if rebuild:
+        bitmaps = AttendanceBitmaps(tenant_id, academic_year, start_month)
+    else:
+        bitmaps = AttendanceBitmaps.load(store_dir, tenant_id, academic_year, start_month)
+
+    start = time.perf_counter()
+    applied = sum(bitmaps.apply(rows) for rows in fetch_new_rows(conn, bitmaps))
+    bitmaps.save(store_dir)
+    logger.info(f"Applied {applied} attendance rows for {len(bitmaps.student_ids)} students in "
+                f"{time.perf_counter() - start:.1f}s (watermark {bitmaps.watermark})")
+    return bitmaps
+
+def attendance_report(bitmaps, kind='month', level='student'):
+    """Attendance percentages per period for each student, class, or the whole school"""
+    labels, present, marked = bitmaps.counts(kind)
+    report = pd.DataFrame({
+        'student_id': np.repeat(bitmaps.student_ids, len(labels)),
+        'class_id': np.repeat(bitmaps.class_ids, len(labels)),
+        'period': np.tile(labels, len(bitmaps.student_ids)),
+        'present': present.ravel(),
+        'marked': marked.ravel(),
+    })
+    if level == 'class':
+        report = report.groupby(['class_id', 'period'], as_index=False)[['present', 'marked']].sum()
+    elif level == 'school':
+        report = report.groupby('period', as_index=False)[['present', 'marked']].sum()
+
+    report = report[report['marked'] > 0].copy()
+    report['percent'] = (100.0 * report['present'] / report['marked']).round(1)
+    return report.reset_index(drop=True)
+
+def make_synthetic_rows(students, school_days, academic_year=ACADEMIC_YEAR, seed=3):
+    """Attendance rows for students x school days (weekdays from the year start), ~90% present"""
+    rng = np.random.default_rng(seed)
+    start, _ = academic_year_range(academic_year)
+    days = pd.bdate_range(start, periods=school_days)
+    student_ids = np.array([f"student-{i}" for i in range(students)])
+    class_ids = np.array([f"class-{i % 40}" for i in range(students)])
+    idx = np.repeat(np.arange(students), school_days)
+    dates = np.tile(days.values, students)
+    return pd.DataFrame({
+        'student_id': student_ids[idx],
+        'class_id': class_ids[idx],
+        'date': dates,
+        'status': np.where(rng.random(len(idx)) < 0.9, 'Present', 'Absent'),
+        'created_at': dates + np.timedelta64(9, 'h'),
+    })
+
+def benchmark(students, school_days):
+    """Time building bitmaps and a class report against a groupby scan of the same rows"""
+    rows = make_synthetic_rows(students, school_days)
+    bitmaps = AttendanceBitmaps('benchmark', ACADEMIC_YEAR)
+
+    start = time.perf_counter()
+    first = rows[rows['date'] < rows['date'].quantile(0.9)]
+    bitmaps.apply(first)
+    built = time.perf_counter()
+    bitmaps.apply(rows[rows['created_at'] >= pd.Timestamp(bitmaps.watermark)])  # Incremental catch-up
+    caught_up = time.perf_counter()
+    report = attendance_report(bitmaps, 'month', 'class')
+    reported = time.perf_counter()
+
+    scan = rows.assign(period=pd.to_datetime(rows['date']).dt.strftime('%Y-%m'),
+                       present=rows['status'] == 'Present')
+    scan = scan.groupby(['class_id', 'period'])['present'].agg(['sum', 'count'])
+    scanned = time.perf_counter()
+    expected = (100.0 * scan['sum'] / scan['count']).round(1).sort_index().to_numpy()
+    actual = report.sort_values(['class_id', 'period'])['percent'].to_numpy()
+
+    print(f"{len(rows)} rows, {students} students: build {built - start:.2f}s, "
+          f"incremental {caught_up - built:.2f}s, class report {reported - caught_up:.3f}s "
+          f"(row scan {scanned - reported:.2f}s), matches scan: {np.array_equal(expected, actual)}")
+    print(f"Bitmap storage: {bitmaps.marked.nbytes + bitmaps.present.nbytes} bytes")
+
+def main():
+    """Update a tenant's rollups and write an attendance report"""
+    parser = argparse.ArgumentParser(description='Maintain attendance bitmaps and report percentages')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--academic-year', default=ACADEMIC_YEAR)
+    parser.add_argument('--start-month', type=int, default=ACADEMIC_YEAR_START_MONTH)
+    parser.add_argument('--store-dir', default=ROLLUP_DIR)
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild from all rows instead of the watermark')
+    parser.add_argument('--no-update', action='store_true', help='Report from the stored bitmaps only')
+    parser.add_argument('--period', choices=['month', 'term'], default='month')
+    parser.add_argument('--level', choices=['student', 'class', 'school'], default='class')
+    parser.add_argument('--output', default=REPORT_FILE)
+    parser.add_argument('--benchmark', type=int, metavar='STUDENTS', help='Time bitmaps on synthetic attendance')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        benchmark(args.benchmark, 220)
+        return True
+
+    if args.no_update:
+        bitmaps = AttendanceBitmaps.load(args.store_dir, args.tenant_id, args.academic_year, args.start_month)
+    else:
+        from import_students import connect_database
+        conn = connect_database()
+        if not conn:
+            return False
+        bitmaps = update_rollups(conn, args.tenant_id, args.academic_year, args.store_dir, args.rebuild,
+                                 args.start_month)
+
+    report = attendance_report(bitmaps, args.period, args.level)
+    report.to_csv(args.output, index=False)
+    logger.info(f"Attendance report written: {args.output} ({len(report)} rows)")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
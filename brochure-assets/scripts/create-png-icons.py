@@ -5,15 +5,58 @@ This script creates proper PNG icons with actual shapes for VidyaSethu features
 """
 
 import os
+import sys
 import json
-from PIL import Image, ImageDraw, ImageFont
+import time
+import io
+import math
+import hashlib
+import inspect
+import zipfile
+import argparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from PIL import Image, ImageDraw, ImageFont, ImageChops, ImageStat
 import colorsys
 
+import numpy as np
+
+import svg_raster
+import png_encoder
+
+ICON_SIZES = [24, 32, 48, 64, 128, 256]
+OUTPUT_DIR = 'brochure-assets/icons/png-proper'
+MANIFEST_FILE = 'png-icons-manifest.json'
+RENDER_CACHE_FILE = '.render-cache.json'  # Content hashes of the last build, kept next to the PNGs
+RENDER_ENGINE_VERSION = '3'  # Bump when render_sizes changes, so every PNG is re-rendered
+DESIGN_SIZE = 256  # Fixed pixel details (line widths, corner radii) were designed for sizes up to this
+MASTER_SIZE = 1024  # 'master' engine: each icon is drawn once at this size and downscaled
+LANCZOS_REDUCING_GAP = 3.0  # Lanczos runs from an image at least this many times larger; 3.0 matches a full-size pass
+ENGINES = ['master', 'direct']  # 'direct' draws every size from scratch (the original behaviour)
+SHARED_HELPERS = ['hex_to_rgb', 'scaled']  # Drawing helpers the creators call, hashed with them
+ATLAS_PADDING = 2  # Transparent gap between sprites, so scaled backgrounds do not bleed into neighbours
+ATLAS_FILE = 'vidyasethu-atlas-{size}px.png'
+CSS_FILE = 'vidyasethu-icons.css'
+SVG_DIR = 'brochure-assets/icons'
+SVG_FILE = 'vidyasethu-{name}-256px.svg'  # The per-size SVGs differ only in width/height
+SOURCES = ['drawn', 'svg']  # 'svg' rasterizes the vector originals instead of the PIL approximations
+CSS_BASE_SIZE = 24  # Displayed size of .vs-icon; sheets at 2x/3x this size serve high density screens
+TENANT_OUTPUT_DIR = 'brochure-assets/icons/tenants'
+RECOLOR_CHUNK = 64  # Tenants recoloured per NumPy broadcast; at most two chunks of pixels are held at once
+PNG_ENCODERS = ['optimized', 'pil']  # 'optimized' searches palette/filters/zlib settings; 'pil' is Pillow's default
+BUNDLE_CONTENTS = ['icons', 'atlas']  # A bundle ships one or the other: every icon is also inside a sheet
+ZIP_DATE_TIME = (1980, 1, 1, 0, 0, 0)  # Fixed member timestamps, so an unchanged bundle is byte-identical
+
 def hex_to_rgb(hex_color):
     """Convert hex color to RGB tuple"""
     hex_color = hex_color.lstrip('#')
     return tuple(int(hex_color[i:i+2], 16) for i in (0, 2, 4))
 
+def scaled(size, px):
+    """Fixed pixel detail (line widths, caps) as designed up to 256px, grown proportionally above that"""
+    if size <= DESIGN_SIZE:
+        return px
+    return max(px, round(px * size / DESIGN_SIZE))
+
 def create_academic_icon(size, color):
     """Create academic management (school building) icon"""
     img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
@@ -44,7 +87,7 @@ def create_academic_icon(size, color):
     draw.polygon(points, fill=color)
     
     # Windows
-    window_size = min(size // 10, 8)
+    window_size = min(size // 10, scaled(size, 8))
     for i in range(2):
         for j in range(2):
             x = building_x + building_width * 0.2 + j * building_width * 0.6
@@ -76,7 +119,7 @@ def create_attendance_icon(size, color):
     
     # Draw thick checkmark
     for i in range(len(check_points) - 1):
-        draw.line([check_points[i], check_points[i + 1]], fill='white', width=max(2, size // 20))
+        draw.line([check_points[i], check_points[i + 1]], fill='white', width=max(scaled(size, 2), size // 20))
     
     return img
 
@@ -126,7 +169,7 @@ def create_communication_icon(size, color):
     draw.ellipse([x2, y2, x2 + bubble_size * 0.8, y2 + bubble_size * 0.8], fill=color)
     
     # Dots in first bubble
-    dot_size = max(2, size // 25)
+    dot_size = max(scaled(size, 2), size // 25)
     for i in range(3):
         dot_x = x1 + bubble_size * 0.3 + i * bubble_size * 0.2
         dot_y = y1 + bubble_size * 0.4
@@ -159,8 +202,8 @@ def create_reports_icon(size, color):
     
     # Axis lines
     axis_color = tuple(max(0, c - 50) for c in hex_to_rgb(color.lstrip('#')))
-    draw.line([padding, base_y, padding + chart_width, base_y], fill=axis_color, width=2)
-    draw.line([padding, base_y, padding, padding], fill=axis_color, width=2)
+    draw.line([padding, base_y, padding + chart_width, base_y], fill=axis_color, width=scaled(size, 2))
+    draw.line([padding, base_y, padding, padding], fill=axis_color, width=scaled(size, 2))
     
     return img
 
@@ -202,7 +245,7 @@ def create_mobile_icon(size, color):
     
     # Phone outline
     draw.rounded_rectangle([phone_x, phone_y, phone_x + phone_width, phone_y + phone_height], 
-                          radius=min(8, size//15), fill=color, outline=color)
+                          radius=min(scaled(size, 8), size//15), fill=color, outline=color)
     
     # Screen
     screen_padding = phone_width * 0.1
@@ -223,128 +266,651 @@ def create_mobile_icon(size, color):
     
     return img
 
-def create_icon_set():
-    """Create complete VidyaSethu icon set"""
-    
-    # Icon definitions
-    icons = [
-        {
-            'name': 'academic-management',
-            'color': '#4CAF50',
-            'creator': create_academic_icon,
-            'feature': 'Academic Management'
-        },
-        {
-            'name': 'attendance-tracking', 
-            'color': '#4CAF50',
-            'creator': create_attendance_icon,
-            'feature': 'Attendance Tracking'
-        },
-        {
-            'name': 'finance-fees',
-            'color': '#2196F3', 
-            'creator': create_finance_icon,
-            'feature': 'Finance & Fees'
-        },
-        {
-            'name': 'communication',
-            'color': '#9C27B0',
-            'creator': create_communication_icon, 
-            'feature': 'Communication'
-        },
-        {
-            'name': 'reports-analytics',
-            'color': '#2196F3',
-            'creator': create_reports_icon,
-            'feature': 'Reports & Analytics'  
-        },
-        {
-            'name': 'administration-tools',
-            'color': '#2196F3',
-            'creator': create_administration_icon,
-            'feature': 'Administration Tools'
-        },
-        {
-            'name': 'mobile-friendly',
-            'color': '#2196F3', 
-            'creator': create_mobile_icon,
-            'feature': 'Mobile-Friendly'
+# Icon definitions (creators are referenced by name so render jobs can be sent to worker processes)
+ICONS = [
+    {
+        'name': 'academic-management',
+        'color': '#4CAF50',
+        'creator': 'create_academic_icon',
+        'feature': 'Academic Management'
+    },
+    {
+        'name': 'attendance-tracking',
+        'color': '#4CAF50',
+        'creator': 'create_attendance_icon',
+        'feature': 'Attendance Tracking'
+    },
+    {
+        'name': 'finance-fees',
+        'color': '#2196F3',
+        'creator': 'create_finance_icon',
+        'feature': 'Finance & Fees'
+    },
+    {
+        'name': 'communication',
+        'color': '#9C27B0',
+        'creator': 'create_communication_icon',
+        'feature': 'Communication'
+    },
+    {
+        'name': 'reports-analytics',
+        'color': '#2196F3',
+        'creator': 'create_reports_icon',
+        'feature': 'Reports & Analytics'
+    },
+    {
+        'name': 'administration-tools',
+        'color': '#2196F3',
+        'creator': 'create_administration_icon',
+        'feature': 'Administration Tools'
+    },
+    {
+        'name': 'mobile-friendly',
+        'color': '#2196F3',
+        'creator': 'create_mobile_icon',
+        'feature': 'Mobile-Friendly'
+    }
+]
+
+def render_hash(creator_source, color, size, engine='master', master_size=MASTER_SIZE):
+    """Content hash of one render job: what is drawn, in which colour, at which size and how"""
+    engine_key = f"{engine}@{master_size}" if engine == 'master' else engine
+    key = f"{RENDER_ENGINE_VERSION}|{engine_key}|{creator_source}|{color.upper()}|{size}"
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+def downscale(master, sizes):
+    """
+    Derive every size from the master render.
+
+    The master is premultiplied once and halved into a box-filter pyramid
+    (exact 2x2 area averages); each size then takes one Lanczos pass from
+    the smallest level at least LANCZOS_REDUCING_GAP times larger.
+    """
+    premultiplied = master.convert('RGBa')  # Transparent edges must not bleed the fill colour to black
+    levels = [premultiplied]
+    while levels[-1].width // 2 >= LANCZOS_REDUCING_GAP * min(sizes):
+        levels.append(levels[-1].reduce(2))
+
+    images = {}
+    for size in sizes:
+        if size == master.width:
+            images[size] = master.copy()
+            continue
+        source = min((level for level in levels if level.width >= LANCZOS_REDUCING_GAP * size),
+                     key=lambda level: level.width, default=premultiplied)
+        images[size] = source.resize((size, size), Image.LANCZOS).convert('RGBA')
+    return images
+
+def render_sizes(creator_name, color, sizes, engine='master', master_size=MASTER_SIZE, svg_file=None):
+    """Render one icon at several sizes: drawn once at the master size and downscaled, or drawn per size"""
+    creator = globals()[creator_name]
+    if svg_file:
+        # The master engine's downscale already anti-aliases, so the master needs no supersampling
+        supersample = 1 if engine == 'master' else svg_raster.SVG_SUPERSAMPLE
+        creator = lambda size, color: svg_raster.rasterize_svg(svg_file, size, color, supersample)
+    if engine == 'master':
+        return downscale(creator(max(master_size, max(sizes)), color), sizes)
+    return {size: creator(size, color) for size in sizes}
+
+def encode_image(img, filepath, png_mode='optimized', webp=False):
+    """
+    Write an image as PNG (and optionally lossless WebP next to it).
+
+    Returns the byte counts for the manifest, including what Pillow's
+    default encoder would have written, and the encoded bytes by file name
+    so a bundle can be built without reading the files back.
+    """
+    baseline = png_encoder.pil_png(img)
+    data = png_encoder.encode_png(img) if png_mode == 'optimized' else baseline
+    data = min(data, baseline, key=len)  # Never ship a larger file than the default would have been
+    outputs = {os.path.basename(filepath): data}
+    stats = {'bytes': len(data), 'baseline_bytes': len(baseline)}
+    if webp:
+        webp_path = os.path.splitext(filepath)[0] + '.webp'
+        outputs[os.path.basename(webp_path)] = png_encoder.encode_webp(img)
+        stats['webp_bytes'] = len(outputs[os.path.basename(webp_path)])
+
+    directory = os.path.dirname(filepath)
+    for filename, content in outputs.items():
+        write_if_changed(os.path.join(directory, filename), content)
+    return stats, outputs
+
+def render_icon(creator_name, color, targets, engine='master', master_size=MASTER_SIZE, svg_file=None,
+                png_mode='optimized', webp=False):
+    """Render and encode one icon's (size, filepath) targets (runs in a worker process)"""
+    images = render_sizes(creator_name, color, [size for size, _ in targets], engine, master_size, svg_file)
+    return [(filepath,) + encode_image(images[size], filepath, png_mode, webp) for size, filepath in targets]
+
+def load_render_cache(output_dir):
+    """Hashes and byte counts recorded by the previous build ({} when there is none)"""
+    path = os.path.join(output_dir, RENDER_CACHE_FILE)
+    try:
+        with open(path, 'r') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # Entries from older builds hold only a hash string; treating them as missing re-renders those files
+    return {name: entry for name, entry in cache.items() if isinstance(entry, dict)}
+
+def is_stale(cache, filename, expected_hash, filepath, force=False):
+    """Whether an output must be rebuilt: forced, inputs changed, or the file is gone"""
+    return force or cache.get(filename, {}).get('hash') != expected_hash or not os.path.exists(filepath)
+
+def write_if_changed(path, content):
+    """Write a text or bytes file only when its content differs, so unchanged builds touch nothing"""
+    data = content.encode('utf-8') if isinstance(content, str) else content
+    if os.path.exists(path):
+        with open(path, 'rb') as f:
+            if f.read() == data:
+                return False
+    with open(path, 'wb') as f:
+        f.write(data)
+    return True
+
+def pack_shelves(rects, padding=ATLAS_PADDING):
+    """
+    Shelf bin-packing of (key, width, height) rectangles.
+
+    Tallest rectangles go first, left to right along a shelf; a new shelf
+    starts when the next one would pass the sheet width, which is chosen
+    so the sheet comes out roughly square.
+    Returns ({key: (x, y, w, h)}, sheet_width, sheet_height).
+    """
+    area = sum((w + padding) * (h + padding) for _, w, h in rects)
+    sheet_width = max(max(w for _, w, _ in rects) + padding, math.ceil(math.sqrt(area)))
+
+    positions = {}
+    x = y = shelf_height = 0
+    for key, w, h in sorted(rects, key=lambda rect: (-rect[2], -rect[1])):
+        if x and x + w > sheet_width:
+            x, y = 0, y + shelf_height + padding
+            shelf_height = 0
+        positions[key] = (x, y, w, h)
+        x += w + padding
+        shelf_height = max(shelf_height, h)
+
+    used_width = max(px + w for px, _, w, _ in positions.values())
+    used_height = max(py + h for _, py, _, h in positions.values())
+    return positions, used_width, used_height
+
+def plan_atlases(jobs, sizes):
+    """Sprite positions for one sheet per size, plus a hash of what each sheet contains"""
+    atlases = {}
+    for size in sizes:
+        size_jobs = [job for job in jobs if job['size'] == size]
+        positions, width, height = pack_shelves([(job['icon']['name'], size, size) for job in size_jobs])
+        content = '|'.join(f"{job['hash']}@{positions[job['icon']['name']]}" for job in size_jobs)
+        atlases[size] = {
+            'filename': ATLAS_FILE.format(size=size),
+            'width': width,
+            'height': height,
+            'sprites': {name: dict(zip(['x', 'y', 'w', 'h'], box)) for name, box in positions.items()},
+            'jobs': size_jobs,
+            'hash': hashlib.sha256(content.encode('utf-8')).hexdigest()
         }
+    return atlases
+
+def compose_atlas(atlas):
+    """Paste the rendered PNGs of one size into a sprite sheet image"""
+    sheet = Image.new('RGBA', (atlas['width'], atlas['height']), (0, 0, 0, 0))
+    for job in atlas['jobs']:
+        sprite = atlas['sprites'][job['icon']['name']]
+        with Image.open(job['filepath']) as img:
+            sheet.paste(img.convert('RGBA'), (sprite['x'], sprite['y']))
+    return sheet
+
+def build_sprite_css(atlases, base_size=CSS_BASE_SIZE):
+    """CSS classes for every icon: the base size sheet at 1x, larger sheets on high density screens"""
+    def rules(atlas, scale, indent=''):
+        lines = [f"{indent}.vs-icon {{ background-image: url('{atlas['filename']}'); "
+                 f"background-size: {atlas['width'] / scale:g}px {atlas['height'] / scale:g}px; }}"]
+        for name, sprite in atlas['sprites'].items():
+            lines.append(f"{indent}.vs-icon-{name} {{ background-position: "
+                         f"{-sprite['x'] / scale:g}px {-sprite['y'] / scale:g}px; }}")
+        return lines
+
+    lines = [
+        '/* VidyaSethu icon sprites - generated by create-png-icons.py --atlas, do not edit */',
+        f".vs-icon {{ display: inline-block; width: {base_size}px; height: {base_size}px; "
+        f"background-repeat: no-repeat; }}"
     ]
-    
-    sizes = [24, 32, 48, 64, 128, 256]
-    output_dir = 'brochure-assets/icons/png-proper'
-    
-    # Create output directory
-    os.makedirs(output_dir, exist_ok=True)
-    
-    print("🎨 VidyaSethu PNG Icon Generator")
-    print("===============================")
-    print(f"📁 Output directory: {output_dir}")
-    print(f"📏 Sizes: {', '.join(map(str, sizes))}px")
-    print()
-    
-    created_files = []
-    
+    lines += rules(atlases[base_size], 1)
+    for density in (2, 3, 4):
+        if base_size * density in atlases:
+            lines.append('')
+            lines.append(f"@media (-webkit-min-device-pixel-ratio: {density}), (min-resolution: {density}dppx) {{")
+            lines += rules(atlases[base_size * density], density, '  ')
+            lines.append('}')
+    return '\n'.join(lines) + '\n'
+
+def encoding_key(png_mode='optimized', webp=False):
+    """How outputs are encoded, hashed with every job so changing the encoder rewrites the files"""
+    key = f"png={png_mode}|webp={webp}|"
+    return key + inspect.getsource(png_encoder) if png_mode == 'optimized' else key
+
+def icon_sources(icons, source='svg', svg_dir=SVG_DIR, encoding=''):
+    """What each icon is rendered from (and how it is encoded), for hashing, and its SVG file in svg mode"""
+    svg_files = {}
+    if source == 'svg':
+        # Hash the vector original and the rasterizer instead of the PIL drawing code
+        rasterizer = inspect.getsource(svg_raster)
+        sources = {}
+        for icon in icons:
+            svg_files[icon['name']] = os.path.join(svg_dir, SVG_FILE.format(name=icon['name']))
+            with open(svg_files[icon['name']], 'r', encoding='utf-8-sig') as f:
+                sources[icon['name']] = rasterizer + f.read()
+    else:
+        helpers = ''.join(inspect.getsource(globals()[name]) for name in SHARED_HELPERS)
+        sources = {icon['name']: helpers + inspect.getsource(globals()[icon['creator']]) for icon in icons}
+    return {name: encoding + text for name, text in sources.items()}, svg_files
+
+def icon_color(color, icon):
+    """Colour for an icon: one colour for all, or a {icon name / 'default': colour} mapping"""
+    if isinstance(color, dict):
+        return color.get(icon['name']) or color.get('default') or icon['color']
+    return color or icon['color']
+
+def plan_render_jobs(icons, sizes, output_dir, color=None, engine='master', master_size=MASTER_SIZE,
+                     source='svg', svg_dir=SVG_DIR, sources=None, encoding=''):
+    """One job per (icon, size) with the PNG path and content hash it should have"""
+    sources, svg_files = sources or icon_sources(icons, source, svg_dir, encoding)
+
+    jobs = []
     for icon in icons:
-        print(f"🖼️  Creating: {icon['feature']}")
-        
+        job_color = icon_color(color, icon)
         for size in sizes:
-            # Create the icon
-            img = icon['creator'](size, icon['color'])
-            
-            # Save PNG
             filename = f"vidyasethu-{icon['name']}-{size}px.png"
-            filepath = os.path.join(output_dir, filename)
-            img.save(filepath, 'PNG', quality=100)
-            
-            created_files.append({
-                'feature': icon['feature'],
-                'filename': filename,
+            jobs.append({
+                'icon': icon,
                 'size': size,
-                'color': icon['color']
+                'color': job_color,
+                'filename': filename,
+                'filepath': os.path.join(output_dir, filename),
+                'svg_file': svg_files.get(icon['name']),
+                'hash': render_hash(sources[icon['name']], job_color, size, engine, master_size)
             })
-            
-            print(f"  ✅ {filename}")
-    
-    # Create manifest
+    return jobs
+
+def file_stats(entry):
+    """Manifest byte counts for one output, from its render cache entry"""
+    stats = {}
+    if 'bytes' in entry:
+        stats['bytes'] = entry['bytes']
+        stats['saved_bytes'] = entry['baseline_bytes'] - entry['bytes']
+    if 'webp_bytes' in entry:
+        stats['webp_bytes'] = entry['webp_bytes']
+    return stats
+
+def build_manifest(jobs, sizes, atlases=None, cache=None):
+    """PNG manifest grouped by feature, with byte savings per file and sprite sheet coordinates in atlas mode"""
+    cache = cache or {}
+    webp = any('webp_bytes' in cache.get(job['filename'], {}) for job in jobs)
     manifest = {
         'meta': {
             'name': 'VidyaSethu Feature Icons (PNG)',
             'version': '1.0.0',
             'description': 'Proper PNG icons for VidyaSethu with actual shapes',
-            'total_files': len(created_files),
-            'formats': ['PNG'],
+            'total_files': len(jobs),
+            'formats': ['PNG', 'WebP'] if webp else ['PNG'],
             'sizes': sizes
         },
         'icons': {}
     }
-    
+
     # Group by feature
-    for file_info in created_files:
-        feature = file_info['feature']
+    for job in jobs:
+        feature = job['icon']['feature']
         if feature not in manifest['icons']:
             manifest['icons'][feature] = {
-                'color': file_info['color'],
+                'color': job['color'],
                 'files': []
             }
-        manifest['icons'][feature]['files'].append({
-            'size': file_info['size'],
-            'filename': file_info['filename']
-        })
-    
-    # Save manifest
-    manifest_path = os.path.join(output_dir, 'png-icons-manifest.json')
-    with open(manifest_path, 'w') as f:
-        json.dump(manifest, f, indent=2)
-    
+        entry = {
+            'size': job['size'],
+            'filename': job['filename'],
+            **file_stats(cache.get(job['filename'], {}))
+        }
+        if 'webp_bytes' in entry:
+            entry['webp'] = os.path.splitext(job['filename'])[0] + '.webp'
+        manifest['icons'][feature]['files'].append(entry)
+
+    if atlases:
+        manifest['atlases'] = {
+            str(size): {**{key: atlas[key] for key in ('filename', 'width', 'height')},
+                        **file_stats(cache.get(atlas['filename'], {})),
+                        'sprites': atlas['sprites']}
+            for size, atlas in atlases.items()
+        }
+        manifest['meta']['css'] = CSS_FILE
+
+    counted = [file_stats(entry) for entry in cache.values()]
+    if counted and all('bytes' in stats for stats in counted):
+        manifest['meta']['total_bytes'] = sum(stats['bytes'] for stats in counted)
+        manifest['meta']['total_saved_bytes'] = sum(stats['saved_bytes'] for stats in counted)
+    return manifest
+
+def bundle_files(jobs, atlases=None, webp=False, bundle='icons'):
+    """
+    Files a bundle ships: the individual icons, or with bundle='atlas' the
+    sprite sheets and their CSS, plus the manifest. Never both, as every
+    icon is already inside a sheet; with webp the WebP files replace the PNGs.
+    """
+    if bundle == 'atlas':
+        if not atlases:
+            raise ValueError("An atlas bundle needs the sprite sheets: build with --atlas")
+        images = [sheet['filename'] for sheet in atlases.values()]
+        extras = [CSS_FILE]
+    else:
+        images = [job['filename'] for job in jobs]
+        extras = []
+    if webp:
+        images = [os.path.splitext(name)[0] + '.webp' for name in images]
+    return sorted(images + extras + [MANIFEST_FILE])
+
+def write_zip_bundle(zip_path, output_dir, buffers, names):
+    """
+    Bundle the named output files into a zip assembled in memory.
+
+    Files encoded in this build come straight from their buffers; files
+    that were already up to date are read once. PNG and WebP are stored
+    as-is (they are already compressed); text files are deflated.
+    """
+    prefix = os.path.basename(os.path.normpath(output_dir))
+
+    bundle = io.BytesIO()
+    with zipfile.ZipFile(bundle, 'w') as archive:
+        for name in names:
+            data = buffers.get(name)
+            if data is None:
+                with open(os.path.join(output_dir, name), 'rb') as f:
+                    data = f.read()
+            info = zipfile.ZipInfo(f"{prefix}/{name}", date_time=ZIP_DATE_TIME)
+            info.compress_type = zipfile.ZIP_STORED if name.endswith(('.png', '.webp')) else zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            archive.writestr(info, data)
+    return write_if_changed(zip_path, bundle.getvalue()), len(bundle.getvalue())
+
+def create_icon_set(output_dir=OUTPUT_DIR, sizes=ICON_SIZES, color=None, workers=None, force=False, icons=ICONS,
+                    engine='master', master_size=MASTER_SIZE, atlas=False, css_base_size=CSS_BASE_SIZE,
+                    source='svg', svg_dir=SVG_DIR, png_mode='optimized', webp=False, zip_path=None, bundle='icons'):
+    """Create complete VidyaSethu icon set, re-rendering only PNGs whose inputs changed"""
+    start = time.perf_counter()
+
+    # Create output directory
+    os.makedirs(output_dir, exist_ok=True)
+
+    print("🎨 VidyaSethu PNG Icon Generator")
+    print("===============================")
+    print(f"📁 Output directory: {output_dir}")
+    print(f"📏 Sizes: {', '.join(map(str, sizes))}px")
+    print(f"🧭 Source: {'SVG originals from ' + svg_dir if source == 'svg' else 'drawn shapes'}")
+    print(f"🖌️  Engine: {engine}" + (f" (drawn once at {master_size}px, Lanczos downscale)" if engine == 'master' else ''))
+    print()
+
+    # Step 1: Compare every job's hash with the previous build
+    jobs = plan_render_jobs(icons, sizes, output_dir, color, engine, master_size, source, svg_dir,
+                            encoding=encoding_key(png_mode, webp))
+    cache = load_render_cache(output_dir)
+    stale = [job for job in jobs if is_stale(cache, job['filename'], job['hash'], job['filepath'], force)]
+
+    # Step 2: Group stale sizes per icon, so the master is drawn once for all of them
+    groups = {}
+    for job in stale:
+        key = (job['icon']['creator'], job['color'], job['svg_file'])
+        groups.setdefault(key, []).append((job['size'], job['filepath']))
+
+    # Step 3: Render and encode, across a process pool when there is more than one icon to draw
+    results = []
+    if len(groups) > 1 and workers != 1:
+        with ProcessPoolExecutor(max_workers=min(workers or os.cpu_count() or 1, len(groups))) as pool:
+            futures = [pool.submit(render_icon, creator_name, icon_color, targets, engine, master_size, svg_file,
+                                   png_mode, webp)
+                       for (creator_name, icon_color, svg_file), targets in groups.items()]
+            for future in futures:
+                results += future.result()
+    else:
+        for (creator_name, icon_color, svg_file), targets in groups.items():
+            results += render_icon(creator_name, icon_color, targets, engine, master_size, svg_file, png_mode, webp)
+
+    # Keep unchanged files' entries; rendered files get their new hash and byte counts
+    new_cache = {job['filename']: cache.get(job['filename'], {}) for job in jobs}
+    hashes = {job['filepath']: job['hash'] for job in jobs}
+    buffers = {}
+    for filepath, stats, outputs in results:
+        new_cache[os.path.basename(filepath)] = {'hash': hashes[filepath], **stats}
+        buffers.update(outputs)
+        print(f"  ✅ {os.path.basename(filepath)} ({stats['baseline_bytes']} -> {stats['bytes']} bytes)")
+
+    # Step 4: Pack each size into a sprite sheet, recomposing only sheets whose sprites changed
+    atlases = plan_atlases(jobs, sizes) if atlas else None
+    for sheet in (atlases or {}).values():
+        filepath = os.path.join(output_dir, sheet['filename'])
+        if is_stale(cache, sheet['filename'], sheet['hash'], filepath, force):
+            stats, outputs = encode_image(compose_atlas(sheet), filepath, png_mode, webp)
+            new_cache[sheet['filename']] = {'hash': sheet['hash'], **stats}
+            buffers.update(outputs)
+            print(f"  🧩 {sheet['filename']} ({sheet['width']}x{sheet['height']}, {stats['bytes']} bytes)")
+        else:
+            new_cache[sheet['filename']] = cache[sheet['filename']]
+    if atlases:
+        if css_base_size not in atlases:
+            raise ValueError(f"CSS base size {css_base_size}px is not one of the rendered sizes")
+        write_if_changed(os.path.join(output_dir, CSS_FILE), build_sprite_css(atlases, css_base_size))
+
+    # Step 5: Record hashes and the manifest, writing only what changed
+    write_if_changed(os.path.join(output_dir, RENDER_CACHE_FILE), json.dumps(new_cache, indent=2, sort_keys=True))
+    manifest = build_manifest(jobs, sizes, atlases, new_cache)
+    manifest_changed = write_if_changed(os.path.join(output_dir, MANIFEST_FILE), json.dumps(manifest, indent=2))
+
+    # Step 6: Bundle everything into a zip built in memory
+    if zip_path:
+        zip_changed, zip_bytes = write_zip_bundle(zip_path, output_dir, buffers, bundle_files(jobs, atlases, webp, bundle))
+        print(f"🗜️  {zip_path}: {zip_bytes} bytes ({'updated' if zip_changed else 'unchanged'})")
+
     print()
     print("🎉 PNG Generation Complete!")
-    print(f"📊 Created {len(created_files)} PNG files")
-    print(f"📄 Manifest: png-icons-manifest.json") 
+    print(f"📊 Rendered {len(stale)} of {len(jobs)} PNG files ({len(jobs) - len(stale)} up to date)")
+    if 'total_saved_bytes' in manifest['meta']:
+        print(f"📉 {manifest['meta']['total_bytes']} bytes, "
+              f"{manifest['meta']['total_saved_bytes']} saved against Pillow's default encoder")
+    print(f"📄 Manifest: {MANIFEST_FILE} ({'updated' if manifest_changed else 'unchanged'})")
     print(f"📂 All files saved to: {output_dir}")
+    print(f"⏱️  {(time.perf_counter() - start) * 1000:.0f} ms")
     print()
     print("🚀 Professional PNG icons ready for your brochures!")
+    return jobs, stale
+
+def render_masks(keys, engine='master', master_size=MASTER_SIZE, svg_files=None):
+    """
+    Render each (icon, size) once in black, as 8-bit masks for recolouring.
+
+    Returns {(icon name, size): (alpha, white)}: the coverage and how far
+    each pixel is lifted towards white (the drawn icons' white details).
+    """
+    wanted = {}
+    for icon, size in keys:
+        wanted.setdefault(icon['name'], (icon, []))[1].append(size)
+
+    masks = {}
+    for name, (icon, sizes) in wanted.items():
+        images = render_sizes(icon['creator'], '#000000', sizes, engine, master_size, (svg_files or {}).get(name))
+        for size, img in images.items():
+            pixels = np.asarray(img)
+            white = pixels[..., :3].mean(axis=2).round().astype(np.uint8)
+            masks[(name, size)] = (pixels[..., 3].copy(), white)
+    return masks
+
+def recolor(mask, colors):
+    """Colour variants of one mask: (tenants, 3) RGB colours broadcast to (tenants, H, W, 4) RGBA"""
+    alpha, white = mask
+    colors = np.asarray(colors, dtype=np.uint16)
+    rgba = np.empty((len(colors),) + alpha.shape + (4,), dtype=np.uint8)
+    rgba[..., :3] = colors[:, None, None, :]
+    rgba[..., 3] = alpha
+
+    # Only the drawn icons' white details differ from the brand colour; a pixel's colour depends on its
+    # white level alone, so each tenant needs just a 256-entry table for them
+    rows, cols = np.nonzero(white)
+    if len(rows):
+        levels = np.arange(256, dtype=np.uint16)[None, :, None]
+        tables = (colors[:, None, :] + ((255 - colors[:, None, :]) * levels + 127) // 255).astype(np.uint8)
+        rgba[:, rows, cols, :3] = tables[:, white[rows, cols]]
+    return rgba
+
+def save_variant(pixels, filepath, png_mode='optimized', webp=False):
+    """Encode one RGBA array to its files (runs in a writer thread; zlib releases the GIL)"""
+    stats, _ = encode_image(Image.fromarray(pixels, 'RGBA'), filepath, png_mode, webp)
+    return stats
+
+def load_tenant_colors(path):
+    """Tenant brand colours: {"tenant": "#hex"} or {"tenant": {"default": "#hex", "<icon name>": "#hex"}}"""
+    with open(path, 'r', encoding='utf-8') as f:
+        tenants = json.load(f)
+    for tenant, colors in tenants.items():
+        if not isinstance(colors, (str, dict)):
+            raise ValueError(f"Tenant {tenant}: expected a colour or a mapping of icon name to colour")
+    return tenants
+
+def create_tenant_icon_sets(tenants, output_root=TENANT_OUTPUT_DIR, sizes=ICON_SIZES, workers=None, force=False,
+                            icons=ICONS, engine='master', master_size=MASTER_SIZE, source='svg', svg_dir=SVG_DIR,
+                            png_mode='optimized', webp=False):
+    """Write one icon set per tenant colour, recolouring shared masks instead of re-rendering per colour"""
+    start = time.perf_counter()
+    print("🎨 VidyaSethu Tenant Icon Packs")
+    print("===============================")
+    print(f"📁 Output directory: {output_root}")
+    print(f"🏫 Tenants: {len(tenants)}")
+    print()
+
+    # Step 1: Plan every tenant's set and keep the stale files
+    sources = icon_sources(icons, source, svg_dir, encoding_key(png_mode, webp))
+    plans = {}
+    for tenant, colors in tenants.items():
+        tenant_dir = os.path.join(output_root, tenant)
+        os.makedirs(tenant_dir, exist_ok=True)
+        jobs = plan_render_jobs(icons, sizes, tenant_dir, colors, engine, master_size, source, svg_dir, sources)
+        cache = load_render_cache(tenant_dir)
+        stale = [job for job in jobs if is_stale(cache, job['filename'], job['hash'], job['filepath'], force)]
+        plans[tenant] = (tenant_dir, jobs, stale, cache)
+
+    # Step 2: Render one mask per (icon, size) that any tenant needs
+    stale_by_mask = {}
+    for tenant_dir, jobs, stale, cache in plans.values():
+        for job in stale:
+            stale_by_mask.setdefault((job['icon']['name'], job['size']), (job['icon'], []))[1].append(job)
+    masks = render_masks([(icon, size) for (_, size), (icon, _) in stale_by_mask.items()],
+                         engine, master_size, sources[1])
+    mask_seconds = time.perf_counter() - start
+
+    # Step 3: Recolour in NumPy broadcasts and encode the files in writer threads. Each queued encode
+    # holds a view of its chunk's pixels, so a chunk is recoloured only once the one before the previous
+    # has been written: the writers stay busy while memory is bounded by two chunks
+    encoded = {}
+
+    def collect(futures):
+        for job, future in futures:
+            encoded[job['filepath']] = {'hash': job['hash'], **future.result()}
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        previous = []
+        for key, (_, stale_jobs) in stale_by_mask.items():
+            for i in range(0, len(stale_jobs), RECOLOR_CHUNK):
+                chunk = stale_jobs[i:i + RECOLOR_CHUNK]
+                variants = recolor(masks[key], [hex_to_rgb(job['color']) for job in chunk])
+                futures = [(job, pool.submit(save_variant, pixels, job['filepath'], png_mode, webp))
+                           for pixels, job in zip(variants, chunk)]
+                del variants
+                collect(previous)
+                previous = futures
+        collect(previous)
+    written = len(encoded)
+
+    # Step 4: Per-tenant render cache and manifest
+    for tenant_dir, jobs, stale, cache in plans.values():
+        new_cache = {job['filename']: encoded.get(job['filepath']) or cache.get(job['filename'], {}) for job in jobs}
+        write_if_changed(os.path.join(tenant_dir, RENDER_CACHE_FILE), json.dumps(new_cache, indent=2, sort_keys=True))
+        write_if_changed(os.path.join(tenant_dir, MANIFEST_FILE),
+                         json.dumps(build_manifest(jobs, sizes, cache=new_cache), indent=2))
+
+    total = sum(len(jobs) for _, jobs, _, _ in plans.values())
+    print(f"🖌️  Rendered {len(masks)} masks in {mask_seconds * 1000:.0f} ms")
+    print(f"📊 Wrote {written} of {total} PNG files ({total - written} up to date)")
+    print(f"⏱️  {time.perf_counter() - start:.2f} s")
+    return plans
+
+def image_error(image, reference):
+    """Mean absolute difference of two RGBA images in premultiplied alpha, as a percentage"""
+    diff = ImageChops.difference(image.convert('RGBa'), reference.convert('RGBa'))
+    return sum(ImageStat.Stat(diff).mean) / 4 / 255 * 100
+
+def benchmark_engines(sizes=ICON_SIZES, master_size=MASTER_SIZE, reference_size=4096, repeats=3, icons=ICONS):
+    """Compare draw time and quality of the master and direct engines"""
+    print(f"⏱️  Rendering {len(icons)} icons x {len(sizes)} sizes (best of {repeats})")
+    for engine in ENGINES:
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for icon in icons:
+                render_sizes(icon['creator'], icon['color'], sizes, engine, master_size)
+            best = min(best, time.perf_counter() - start)
+        print(f"  {engine:>8}: {best * 1000:8.1f} ms")
+
+    # Reference: each icon drawn at reference_size and area-averaged down, i.e. ideal anti-aliasing
+    print()
+    print(f"🔍 Mean error against a {reference_size}px box-filtered reference (% of full scale, lower is better)")
+    print(f"  {'size':>6} " + ' '.join(f"{engine:>8}" for engine in ENGINES))
+    errors = {(engine, size): 0.0 for engine in ENGINES for size in sizes}
+    for icon in icons:
+        reference = globals()[icon['creator']](reference_size, icon['color'])
+        for engine in ENGINES:
+            images = render_sizes(icon['creator'], icon['color'], sizes, engine, master_size)
+            for size in sizes:
+                truth = reference.resize((size, size), Image.BOX)
+                errors[(engine, size)] += image_error(images[size], truth) / len(icons)
+    for size in sizes:
+        print(f"  {size:>5}px " + ' '.join(f"{errors[(engine, size)]:8.2f}" for engine in ENGINES))
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Render VidyaSethu feature icons as PNG files')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--color', help='Render every icon in this colour (e.g. a tenant brand colour)')
+    parser.add_argument('--sizes', default=','.join(map(str, ICON_SIZES)), help='Comma separated pixel sizes')
+    parser.add_argument('--workers', type=int, help='Render processes, or PNG writer threads with --tenants (default: one per CPU)')
+    parser.add_argument('--force', action='store_true', help='Re-render every PNG, ignoring the render cache')
+    parser.add_argument('--engine', choices=ENGINES, default='master',
+                        help='master: draw once and downscale (anti-aliased); direct: draw every size')
+    parser.add_argument('--master-size', type=int, default=MASTER_SIZE)
+    parser.add_argument('--benchmark', action='store_true', help='Compare engine speed and quality, write nothing')
+    parser.add_argument('--source', choices=SOURCES, default='svg',
+                        help='drawn: PIL shapes; svg: rasterize the vector originals in --svg-dir')
+    parser.add_argument('--svg-dir', default=SVG_DIR)
+    parser.add_argument('--tenants', help='JSON of tenant brand colours: write one recoloured set per tenant')
+    parser.add_argument('--tenant-dir', default=TENANT_OUTPUT_DIR)
+    parser.add_argument('--png', choices=PNG_ENCODERS, default='optimized',
+                        help="optimized: smallest lossless PNG (palette, filters, zlib); pil: Pillow's default")
+    parser.add_argument('--webp', action='store_true', help='Also write lossless WebP next to every PNG')
+    parser.add_argument('--zip', help='Bundle the icons (or sprite sheets) and manifest into this zip (built in memory)')
+    parser.add_argument('--bundle', choices=BUNDLE_CONTENTS, default='icons',
+                        help="What --zip ships: individual icons, or the --atlas sprite sheets and CSS")
+    parser.add_argument('--atlas', action='store_true', help='Also pack each size into a sprite sheet with CSS')
+    parser.add_argument('--css-size', type=int, default=CSS_BASE_SIZE, help='Displayed icon size in the sprite CSS')
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(',')]
+    if args.benchmark:
+        benchmark_engines(sizes, args.master_size)
+        return True
+    if args.tenants:
+        create_tenant_icon_sets(load_tenant_colors(args.tenants), args.tenant_dir, sizes, args.workers, args.force,
+                                engine=args.engine, master_size=args.master_size,
+                                source=args.source, svg_dir=args.svg_dir, png_mode=args.png, webp=args.webp)
+        return True
+    create_icon_set(args.output_dir, sizes, args.color, args.workers, args.force,
+                    engine=args.engine, master_size=args.master_size, atlas=args.atlas, css_base_size=args.css_size,
+                    source=args.source, svg_dir=args.svg_dir, png_mode=args.png, webp=args.webp, zip_path=args.zip,
+                    bundle=args.bundle)
+    return True
 
 if __name__ == '__main__':
-    create_icon_set()
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+VidyaSethu PNG Encoder
+Writes the smallest PNG it can find for an RGBA image: palette when lossless, best row filter and zlib setting
+"""
+
+import io
+import sys
+import zlib
+import struct
+import hashlib
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+from PIL import Image
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+FILTERS = [0, 1, 2, 3, 4, 'adaptive']  # None, Sub, Up, Average, Paeth, and the best of them per row
+ZLIB_SETTINGS = [(9, zlib.Z_DEFAULT_STRATEGY), (9, zlib.Z_FILTERED), (9, zlib.Z_RLE)]
+IDAT_CACHE_SIZE = 1024  # Recoloured variants share their palette indices, so they share the compressed data
+
+_idat_cache = OrderedDict()
+
+def _chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff)
+
+def filter_rows(raw, bpp):
+    """All five PNG filters of a (rows, bytes) uint8 array, as {filter type: filtered rows}"""
+    data = raw.astype(np.int16)
+    left = np.zeros_like(data)
+    left[:, bpp:] = data[:, :-bpp]
+    up = np.zeros_like(data)
+    up[1:] = data[:-1]
+    up_left = np.zeros_like(data)
+    up_left[1:, bpp:] = data[:-1, :-bpp]
+
+    # Paeth predictor: whichever of left, up, up-left is closest to left + up - up-left
+    estimate = left + up - up_left
+    pa, pb, pc = np.abs(estimate - left), np.abs(estimate - up), np.abs(estimate - up_left)
+    paeth = np.where((pa <= pb) & (pa <= pc), left, np.where(pb <= pc, up, up_left))
+
+    return {
+        0: raw,
+        1: ((data - left) & 0xff).astype(np.uint8),
+        2: ((data - up) & 0xff).astype(np.uint8),
+        3: ((data - (left + up) // 2) & 0xff).astype(np.uint8),
+        4: ((data - paeth) & 0xff).astype(np.uint8),
+    }
+
+def filtered_stream(raw, bpp, filter_type):
+    """Scanlines prefixed with their filter byte, for one filter or the adaptive per-row choice"""
+    candidates = filter_rows(raw, bpp)
+    if filter_type == 'adaptive':
+        # Standard heuristic: per row, the filter with the smallest sum of signed byte magnitudes
+        costs = np.stack([np.abs(candidates[f].astype(np.int8).astype(np.int16)).sum(axis=1) for f in range(5)])
+        choice = costs.argmin(axis=0)
+        rows = np.stack([candidates[f] for f in range(5)])[choice, np.arange(raw.shape[0])]
+    else:
+        choice = np.full(raw.shape[0], filter_type)
+        rows = candidates[filter_type]
+    return np.hstack([choice.astype(np.uint8)[:, None], rows]).tobytes()
+
+def palette_image(rgba):
+    """(indices, palette) when the image has at most 256 distinct colours, else None"""
+    flat = rgba.reshape(-1, 4)
+    colors, indices = np.unique(flat.view(np.uint32), return_inverse=True)
+    if len(colors) > 256:
+        return None
+    palette = colors.view(np.uint8).reshape(-1, 4)
+
+    # Translucent entries first, so the tRNS chunk can stop at the last one
+    order = np.argsort(palette[:, 3] == 255, kind='stable')
+    remap = np.empty(len(order), dtype=np.uint8)
+    remap[order] = np.arange(len(order))
+    return remap[indices.reshape(rgba.shape[:2])], palette[order]
+
+def pack_indices(indices, bit_depth):
+    """Pack palette indices into rows of bit_depth bits per pixel"""
+    if bit_depth == 8:
+        return indices
+    per_byte = 8 // bit_depth
+    height, width = indices.shape
+    padded = np.zeros((height, -(-width // per_byte) * per_byte), dtype=np.uint8)
+    padded[:, :width] = indices
+    groups = padded.reshape(height, -1, per_byte)
+    shifts = (8 - bit_depth * (np.arange(per_byte) + 1)).astype(np.uint8)
+    return np.bitwise_or.reduce(groups << shifts, axis=2).astype(np.uint8)
+
+def png_candidates(rgba):
+    """Lossless encodings to try: (IHDR colour type, bit depth, rows, bytes per pixel, extra chunks)"""
+    height, width = rgba.shape[:2]
+
+    quantized = palette_image(rgba)
+    if quantized is not None:
+        indices, palette = quantized
+        bit_depth = next(depth for depth in (1, 2, 4, 8) if len(palette) <= 1 << depth)
+        extra = [_chunk(b'PLTE', palette[:, :3].tobytes())]
+        translucent = int((palette[:, 3] < 255).sum())
+        if translucent:
+            extra.append(_chunk(b'tRNS', palette[:translucent, 3].tobytes()))
+        # One byte (or less) per pixel beats four in practice, so truecolour is only tried without a palette
+        return [(3, bit_depth, pack_indices(indices, bit_depth), 1, extra)]
+
+    if (rgba[..., 3] == 255).all():
+        return [(2, 8, rgba[..., :3].reshape(height, width * 3), 3, [])]
+    return [(6, 8, rgba.reshape(height, width * 4), 4, [])]
+
+def compress_rows(rows, bpp, color_type, filters=FILTERS, zlib_settings=ZLIB_SETTINGS):
+    """Smallest IDAT payload for the rows over filters and zlib settings, memoized on the row data"""
+    key = (hashlib.blake2b(rows.tobytes(), digest_size=16).digest(), rows.shape, bpp, color_type)
+    if key in _idat_cache:
+        _idat_cache.move_to_end(key)
+        return _idat_cache[key]
+
+    best = None
+    for filter_type in (filters if color_type != 3 else [0, 'adaptive']):  # Filters rarely help palettes
+        stream = filtered_stream(rows, bpp, filter_type)
+        for level, strategy in zlib_settings:
+            compressor = zlib.compressobj(level, zlib.DEFLATED, 15, 9, strategy)
+            idat = compressor.compress(stream) + compressor.flush()
+            if best is None or len(idat) < len(best):
+                best = idat
+
+    _idat_cache[key] = best
+    while len(_idat_cache) > IDAT_CACHE_SIZE:
+        _idat_cache.popitem(last=False)
+    return best
+
+def encode_png(image, filters=FILTERS, zlib_settings=ZLIB_SETTINGS):
+    """Smallest lossless PNG bytes for a PIL image, over colour types, row filters and zlib settings"""
+    rgba = np.array(image.convert('RGBA'))
+    rgba[rgba[..., 3] == 0] = 0  # Colour under fully transparent pixels is invisible; zeroing it shrinks palettes
+    height, width = rgba.shape[:2]
+
+    best = None
+    for color_type, bit_depth, rows, bpp, extra in png_candidates(rgba):
+        idat = compress_rows(rows, bpp, color_type, filters, zlib_settings)
+        if best is None or len(idat) + sum(map(len, extra)) < len(best[0]) + sum(map(len, best[1])):
+            best = (idat, extra, color_type, bit_depth)
+
+    idat, extra, color_type, bit_depth = best
+    header = struct.pack('>IIBBBBB', width, height, bit_depth, color_type, 0, 0, 0)
+    return PNG_SIGNATURE + _chunk(b'IHDR', header) + b''.join(extra) + _chunk(b'IDAT', idat) + _chunk(b'IEND', b'')
+
+def pil_png(image):
+    """PNG bytes as Pillow writes them by default, the baseline for savings"""
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+def encode_webp(image):
+    """Lossless WebP bytes at the slowest, smallest setting"""
+    buffer = io.BytesIO()
+    image.save(buffer, 'WEBP', lossless=True, quality=100, method=6)
+    return buffer.getvalue()
+
+def main():
+    """Re-encode PNG files in place when the optimised version is smaller"""
+    parser = argparse.ArgumentParser(description='Losslessly shrink PNG files')
+    parser.add_argument('files', nargs='+')
+    args = parser.parse_args()
+
+    total_before = total_after = 0
+    for path in args.files:
+        with open(path, 'rb') as f:
+            original = f.read()
+        with Image.open(io.BytesIO(original)) as img:
+            optimized = encode_png(img)
+        if len(optimized) < len(original):
+            with open(path, 'wb') as f:
+                f.write(optimized)
+        total_before += len(original)
+        total_after += min(len(original), len(optimized))
+        print(f"  {path}: {len(original)} -> {min(len(original), len(optimized))} bytes")
+
+    print(f"📉 {total_before} -> {total_after} bytes ({total_before - total_after} saved)")
+    return True
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
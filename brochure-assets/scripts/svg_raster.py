@@ -0,0 +1,193 @@
+#!/usr/bin/env python3
+"""
+VidyaSethu SVG Icon Rasterizer
+Parses filled SVG path data (M/L/H/V/C/Z, absolute and relative) and renders it with PIL at any size
+"""
+
+import os
+import re
+import sys
+import math
+import argparse
+from functools import lru_cache
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from PIL import Image
+
+SVG_SUPERSAMPLE = 4  # Sub-pixel samples per axis for anti-aliased edges
+CURVE_SEGMENTS_PER_UNIT = 8  # Bezier flattening density, in segments per viewBox unit of control polygon
+PATH_TOKEN = re.compile(r'[MmLlHhVvCcZz]|[-+]?(?:\d*\.\d+|\d+\.?)(?:[eE][-+]?\d+)?')
+
+def flatten_cubic(p0, p1, p2, p3):
+    """Points along a cubic bezier (excluding p0), dense enough for the largest render size"""
+    length = math.dist(p0, p1) + math.dist(p1, p2) + math.dist(p2, p3)
+    steps = max(4, math.ceil(length * CURVE_SEGMENTS_PER_UNIT))
+    t = np.linspace(0, 1, steps + 1)[1:, None]
+    points = ((1 - t) ** 3 * p0 + 3 * (1 - t) ** 2 * t * p1
+              + 3 * (1 - t) * t ** 2 * p2 + t ** 3 * p3)
+    return [tuple(point) for point in points]
+
+def parse_path(d):
+    """Parse SVG path data into closed polygons (lists of (x, y) in viewBox units)"""
+    tokens = PATH_TOKEN.findall(d)
+    subpaths, points = [], []
+    x = y = start_x = start_y = 0.0
+    command = None
+    i = 0
+
+    def numbers(count):
+        nonlocal i
+        values = [float(value) for value in tokens[i:i + count]]
+        if len(values) != count:
+            raise ValueError(f"Truncated path data near token {i}")
+        i += count
+        return values
+
+    while i < len(tokens):
+        if tokens[i].isalpha():
+            command = tokens[i]
+            i += 1
+        elif command is None:
+            raise ValueError("Path data must start with a command")
+
+        relative = command.islower()
+        op = command.upper()
+        if op == 'Z':
+            if points:
+                subpaths.append(points)
+            points = []
+            x, y = start_x, start_y
+            continue
+
+        if op == 'M':
+            dx, dy = numbers(2)
+            x, y = (x + dx, y + dy) if relative else (dx, dy)
+            if points:
+                subpaths.append(points)
+            points = [(x, y)]
+            start_x, start_y = x, y
+            command = 'l' if relative else 'L'  # Extra coordinate pairs after M are line-tos
+            continue
+
+        if not points:
+            points = [(x, y)]  # Drawing after Z without a new M starts from the closed subpath's start
+        if op == 'L':
+            dx, dy = numbers(2)
+            x, y = (x + dx, y + dy) if relative else (dx, dy)
+            points.append((x, y))
+        elif op == 'H':
+            value, = numbers(1)
+            x = x + value if relative else value
+            points.append((x, y))
+        elif op == 'V':
+            value, = numbers(1)
+            y = y + value if relative else value
+            points.append((x, y))
+        elif op == 'C':
+            c = numbers(6)
+            if relative:
+                c = [value + (x if k % 2 == 0 else y) for k, value in enumerate(c)]
+            control = [np.array(pair) for pair in ((x, y), c[0:2], c[2:4], c[4:6])]
+            points.extend(flatten_cubic(*control))
+            x, y = c[4], c[5]
+        else:
+            raise ValueError(f"Unsupported path command '{command}'")
+
+    if points:
+        subpaths.append(points)
+    return [subpath for subpath in subpaths if len(subpath) > 2]
+
+@lru_cache(maxsize=128)
+def _load_geometry(path, mtime):
+    """Parsed geometry of one SVG file; mtime is part of the key so edited files are re-parsed"""
+    root = ET.fromstring(open(path, 'r', encoding='utf-8-sig').read())
+    view_box = [float(value) for value in re.split(r'[\s,]+', root.get('viewBox', '').strip()) if value]
+    if len(view_box) != 4:
+        view_box = [0.0, 0.0, float(root.get('width', 24)), float(root.get('height', 24))]
+
+    shapes = []
+    for element in root.iter():
+        if element.tag.rsplit('}', 1)[-1] != 'path' or not element.get('d'):
+            continue
+        fill_rule = element.get('fill-rule') or root.get('fill-rule') or 'nonzero'
+        shapes.append({'polygons': parse_path(element.get('d')), 'fill_rule': fill_rule})
+    return {'view_box': view_box, 'shapes': shapes, 'fill': root.get('fill')}
+
+def load_svg_geometry(path):
+    """Parsed geometry of an SVG icon file, cached per file until it changes on disk"""
+    return _load_geometry(os.path.abspath(path), os.path.getmtime(path))
+
+def fill_mask(polygons, width, height, scale, offset, fill_rule='nonzero'):
+    """Scanline-fill polygons into a boolean mask, sampling each pixel at its centre"""
+    edges = []
+    for polygon in polygons:
+        points = np.array(polygon + [polygon[0]], dtype=float)
+        points = (points - offset) * scale
+        edges.append(np.hstack([points[:-1], points[1:]]))
+    edges = np.vstack(edges)
+    edges = edges[edges[:, 1] != edges[:, 3]]  # Horizontal edges never cross a scanline
+
+    x0, y0, x1, y1 = edges.T
+    direction = np.where(y1 > y0, 1, -1)
+    y_low, y_high = np.minimum(y0, y1), np.maximum(y0, y1)
+    slope = (x1 - x0) / (y1 - y0)
+
+    mask = np.zeros((height, width), dtype=bool)
+    first_row = max(0, int(math.floor(y_low.min())))
+    last_row = min(height, int(math.ceil(y_high.max())) + 1)
+    for row in range(first_row, last_row):
+        center = row + 0.5
+        active = (y_low <= center) & (y_high > center)
+        if not active.any():
+            continue
+        xs = x0[active] + (center - y0[active]) * slope[active]
+        order = np.argsort(xs)
+        xs = xs[order]
+        if fill_rule == 'evenodd':
+            inside = np.arange(1, len(xs) + 1) % 2 == 1
+        else:
+            inside = np.cumsum(direction[active][order]) != 0
+
+        for k in np.flatnonzero(inside[:-1]):
+            start = max(0, int(math.ceil(xs[k] - 0.5)))
+            end = min(width, int(math.ceil(xs[k + 1] - 0.5)))
+            if end > start:
+                mask[row, start:end] = True
+    return mask
+
+def rasterize_svg(path, size, color=None, supersample=SVG_SUPERSAMPLE):
+    """Render an SVG icon file as a size x size RGBA image filled with color (default: the SVG's fill)"""
+    geometry = load_svg_geometry(path)
+    min_x, min_y, view_width, view_height = geometry['view_box']
+    canvas = size * supersample
+    scale = canvas / max(view_width, view_height)
+
+    coverage = np.zeros((canvas, canvas), dtype=bool)
+    for shape in geometry['shapes']:
+        if shape['polygons']:
+            coverage |= fill_mask(shape['polygons'], canvas, canvas, scale, (min_x, min_y), shape['fill_rule'])
+
+    alpha = Image.fromarray(coverage.astype(np.uint8) * 255, 'L')
+    if supersample > 1:
+        alpha = alpha.reduce(supersample)
+
+    img = Image.new('RGBA', (size, size), color or geometry['fill'] or '#000000')
+    img.putalpha(alpha)
+    return img
+
+def main():
+    """Rasterize one SVG file to PNG"""
+    parser = argparse.ArgumentParser(description='Render a filled SVG icon to PNG')
+    parser.add_argument('svg')
+    parser.add_argument('output')
+    parser.add_argument('--size', type=int, default=256)
+    parser.add_argument('--color')
+    args = parser.parse_args()
+
+    rasterize_svg(args.svg, args.size, args.color).save(args.output, 'PNG')
+    print(f"✅ {args.output} ({args.size}px)")
+    return True
+
+if __name__ == '__main__':
+    sys.exit(0 if main() else 1)
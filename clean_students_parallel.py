@@ -0,0 +1,438 @@
+#!/usr/bin/env python3
+"""
+Parallel Student Data Cleaning
+Cleans student workbooks across CPU cores for large (district-level) imports
+"""
+import os
+import re
+import sys
+import time
+import uuid
+import argparse
+import logging
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None  # Without pyarrow, chunks are sent to workers as pickled DataFrames
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Constants
+DEFAULT_CHUNK_SIZE = 50000
+MIN_ROWS_PER_WORKER = 50000  # Below this, Arrow and shared memory cost more than a worker saves
+NORMALISER_CACHE_SIZE = 65536  # Distinct cell values remembered per normaliser
+PHONE_COUNTRY_CODE = '91'  # Mobiles are stored in E.164 form, +91XXXXXXXXXX
+
+# Column mapping from Excel to database (same layout as the importers)
+COLUMN_MAPPING = {
+    'Unnamed: 0': 'serial_number',  # SN.
+    'Class': 'student_name',         # Student Name
+    'NURSERY': 'father_name',        # Father Name
+    'Unnamed: 3': 'mobile',          # Mobile
+    'Unnamed: 4': 'alternate_mobile', # Alternate Number
+    'Unnamed: 5': 'gender',          # Gender
+    'Unnamed: 6': 'dob',             # Date of Birth
+    'Unnamed: 7': 'address',         # Address
+    'Unnamed: 8': 'religion',        # Religion
+    'Unnamed: 9': 'caste',           # Caste
+    'Unnamed: 11': 'blood_group',    # Blood Group
+    'Unnamed: 12': 'admission_no',   # Admission Number
+    'Unnamed: 13': 'bus_facility'    # Bus Facility
+}
+
+GENDER_MAPPING = {'M': 'Male', 'F': 'Female', 'MALE': 'Male', 'FEMALE': 'Female'}
+
+CASTE_MAPPING = {
+    'BC': 'BC', 'SC': 'SC', 'ST': 'ST', 'OC': 'OC',
+    'GENERAL': 'OC', 'OTHER': 'Other', '': 'Other'
+}
+
+# Spellings seen in school lists, keyed with dots and spaces removed ('B.C-A' -> 'BCA')
+CASTE_SYNONYMS = {
+    'OBC': 'BC', 'BACKWARDCLASS': 'BC', 'BCA': 'BC', 'BCB': 'BC', 'BCC': 'BC', 'BCD': 'BC', 'BCE': 'BC',
+    'SCHEDULEDCASTE': 'SC', 'SCHEDULEDTRIBE': 'ST',
+    'GEN': 'OC', 'OPEN': 'OC', 'OPENCATEGORY': 'OC', 'FORWARD': 'OC', 'OTHERS': 'Other'
+}
+
+def read_student_workbook(filename):
+    """Read one student workbook and rename its columns to database names"""
+    # Read the Excel file - skip first row as it contains headers
+    df = pd.read_excel(filename, sheet_name='Sheet1', skiprows=1)
+
+    # Remove empty rows
+    df = df.dropna(how='all')
+
+    return df.rename(columns=COLUMN_MAPPING)
+
+def clean_student_chunk(df, tenant_id, academic_year, created_at, target='postgres'):
+    """
+    Clean one shard of renamed student rows.
+
+    Admission numbers are left blank where missing; they are assigned once
+    over the combined result so generated numbers stay unique and ordered.
+    target='supabase' formats dates and empty strings the way the Supabase
+    importer expects, 'postgres' keeps native date values.
+    """
+    df = df.copy()
+
+    # Clean and prepare data
+    df['id'] = [str(uuid.uuid4()) for _ in range(len(df))]
+    df['tenant_id'] = tenant_id
+    df['academic_year'] = academic_year
+    df['created_at'] = created_at
+
+    # Clean gender, names, address, religion, caste and mobiles once per distinct value
+    df = normalize_student_columns(df)
+
+    # Clean dates
+    df['dob'] = pd.to_datetime(df['dob'], errors='coerce')
+    if target == 'supabase':
+        df['dob'] = df['dob'].dt.strftime('%Y-%m-%d').fillna('2010-01-01')
+
+    # Clean admission numbers (blanks are filled after the shards are combined)
+    df['admission_no'] = df['admission_no'].fillna('').astype(str).str.strip()
+
+    # Add mobile numbers to remarks for parent linking later (vectorized form of the row-wise apply)
+    remarks = ('Mobile: ' + df['mobile'].fillna('') +
+               ', Alt Mobile: ' + df['alternate_mobile'].fillna('') +
+               ', Father: ' + df['father_name'])
+    df['remarks'] = remarks.where(df['mobile'].notna(), '')
+
+    # Handle missing required fields
+    df['name'] = df['student_name']
+
+    if target == 'supabase':
+        # Clean up empty strings and NaN values for Supabase
+        string_columns = ['name', 'address', 'religion', 'remarks', 'father_name', 'mobile', 'alternate_mobile']
+        for col in string_columns:
+            if col in df.columns:
+                df[col] = df[col].fillna('').replace('nan', '').replace('NaN', '')
+    else:
+        df['dob'] = df['dob'].fillna(pd.Timestamp(2010, 1, 1))  # Default DOB if missing
+
+    return df
+
+def normalize_phone(value):
+    """Reduce a mobile number cell (often a float like 9620118345.0) to its last 10 digits"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    text = str(value).strip()
+    if text.endswith('.0'):
+        text = text[:-2]
+    digits = re.sub(r'\D', '', text)
+    return digits[-10:] if len(digits) >= 10 else None
+
+@lru_cache(maxsize=NORMALISER_CACHE_SIZE)
+def phone_e164(value):
+    """Mobile number cell in E.164 form (+91XXXXXXXXXX), None if it has fewer than 10 digits"""
+    digits = normalize_phone(value)
+    return f"+{PHONE_COUNTRY_CODE}{digits}" if digits else None
+
+def _cell_text(value):
+    """Stripped text of a cell with inner whitespace collapsed ('' for blanks)"""
+    return '' if value is None else ' '.join(str(value).split())
+
+@lru_cache(maxsize=NORMALISER_CACHE_SIZE)
+def canonical_name(value):
+    """Person or religion name in title case"""
+    return _cell_text(value).title()
+
+@lru_cache(maxsize=NORMALISER_CACHE_SIZE)
+def canonical_gender(value):
+    """'Male' or 'Female' (blank and unknown values default to Male)"""
+    return GENDER_MAPPING.get(_cell_text(value).upper(), 'Male')
+
+@lru_cache(maxsize=NORMALISER_CACHE_SIZE)
+def canonical_caste(value):
+    """One of the allowed caste categories, folding known synonyms (unknown values become Other)"""
+    text = _cell_text(value).upper()
+    if text in CASTE_MAPPING:
+        return CASTE_MAPPING[text]
+    key = re.sub(r'[^A-Z]', '', text)
+    return CASTE_MAPPING.get(key) or CASTE_SYNONYMS.get(key, 'Other')
+
+@lru_cache(maxsize=NORMALISER_CACHE_SIZE)
+def canonical_text(value):
+    """Free text such as an address, stripped"""
+    return '' if value is None else str(value).strip()
+
+# Columns that repeat heavily across a school's list, with the normaliser for one value
+COLUMN_NORMALISERS = {
+    'gender': canonical_gender,
+    'student_name': canonical_name,
+    'father_name': canonical_name,
+    'address': canonical_text,
+    'religion': canonical_name,
+    'caste': canonical_caste,
+    'mobile': phone_e164,
+    'alternate_mobile': phone_e164,
+}
+
+def normalize_column(series, normaliser):
+    """
+    Apply a normaliser to each distinct value of a column and broadcast it back.
+
+    The column is factorized into integer codes, so the cleaning rules run once
+    per unique value instead of once per row; missing cells (code -1) are
+    normalised as None. The result stays an object column; letting pandas
+    re-infer a string dtype would cost as much as the per-cell cleaning.
+    """
+    codes, uniques = pd.factorize(series)
+    cleaned = [normaliser(value) for value in uniques]
+    cleaned.append(normaliser(None))
+    return pd.Series(np.array(cleaned, dtype=object)[codes], index=series.index, name=series.name,
+                     dtype=object)
+
+def normalize_student_columns(df, normalisers=COLUMN_NORMALISERS):
+    """Normalise every low-cardinality student column present in df"""
+    df = df.copy()
+    for column, normaliser in normalisers.items():
+        if column in df.columns:
+            df[column] = normalize_column(df[column], normaliser)
+    return df
+
+def assign_admission_numbers(df, year=None, start=1):
+    """Fill blank admission numbers with ADM{year}{i:04d} in row order, counting from start"""
+    year = year or datetime.now().year
+    empty_admission = df['admission_no'] == ''
+    df.loc[empty_admission, 'admission_no'] = [f"ADM{year}{str(i).zfill(4)}" for i in range(start, start + empty_admission.sum())]
+    return df
+
+def _arrow_safe(df):
+    """Make object columns Arrow-serializable (Excel columns often mix numbers and text)"""
+    mixed = [col for col in df.columns if df[col].dtype == object
+             and pd.api.types.infer_dtype(df[col], skipna=True) not in ('string', 'empty')]
+    if not mixed:
+        return df
+    df = df.copy()
+    for col in mixed:
+        df[col] = df[col].map(lambda v: v if v is None or (isinstance(v, float) and np.isnan(v)) else str(v))
+    return df
+
+def _df_to_shm(df):
+    """Write a DataFrame into a shared memory block as an Arrow IPC stream"""
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    buf = sink.getvalue()
+
+    shm = shared_memory.SharedMemory(create=True, size=max(buf.size, 1))
+    shm.buf[:buf.size] = buf.to_pybytes()
+    name = shm.name
+    shm.close()
+    return name, buf.size
+
+def _df_from_shm(name, size, unlink=False):
+    """Read a DataFrame back from a shared memory Arrow IPC stream"""
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        data = bytes(shm.buf[:size])
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+    return pa.ipc.open_stream(pa.py_buffer(data)).read_all().to_pandas()
+
+def _read_workbook_worker(filename):
+    """Worker: read one workbook and hand it back through shared memory"""
+    df = _arrow_safe(read_student_workbook(filename))
+    return _df_to_shm(df)
+
+def _clean_chunk_worker(payload, tenant_id, academic_year, created_at, target):
+    """Worker: clean one shard, reading and writing it through shared memory"""
+    if pa is None:
+        return clean_student_chunk(payload, tenant_id, academic_year, created_at, target)
+
+    name, size = payload
+    chunk = _df_from_shm(name, size, unlink=True)
+    cleaned = clean_student_chunk(chunk, tenant_id, academic_year, created_at, target)
+    return _df_to_shm(_arrow_safe(cleaned))
+
+def effective_workers(rows, workers=None):
+    """Workers worth starting: more than the cores, or too few rows per worker, only adds serialization overhead"""
+    return min(workers or os.cpu_count() or 1, os.cpu_count() or 1, rows // MIN_ROWS_PER_WORKER or 1)
+
+def clean_dataframe_parallel(df, tenant_id, academic_year, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                             target='postgres', created_at=None):
+    """Clean an already-read student DataFrame in shards across a process pool"""
+    workers = effective_workers(len(df), workers)
+    if created_at is None:
+        created_at = datetime.now().isoformat() if target == 'supabase' else datetime.now()
+
+    if workers <= 1 or len(df) <= chunk_size:
+        cleaned = clean_student_chunk(df, tenant_id, academic_year, created_at, target)
+        return assign_admission_numbers(cleaned.reset_index(drop=True))
+
+    if pa is not None:
+        df = _arrow_safe(df)
+
+    chunks = [df.iloc[i:i + chunk_size] for i in range(0, len(df), chunk_size)]
+    logger.info(f"Cleaning {len(df)} rows in {len(chunks)} shards across {workers} workers")
+
+    payloads = []
+    try:
+        payloads = [_df_to_shm(chunk) if pa is not None else chunk for chunk in chunks]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_clean_chunk_worker, payload, tenant_id, academic_year, created_at, target)
+                       for payload in payloads]
+            # Collect in submission order so shard order matches row order
+            results = [future.result() for future in futures]
+    except Exception:
+        # Workers unlink their inputs; clean up whatever is still around
+        for payload in payloads:
+            if pa is not None:
+                try:
+                    leftover = shared_memory.SharedMemory(name=payload[0])
+                    leftover.close()
+                    leftover.unlink()
+                except FileNotFoundError:
+                    pass
+        raise
+
+    if pa is not None:
+        results = [_df_from_shm(name, size, unlink=True) for name, size in results]
+
+    cleaned = pd.concat(results, ignore_index=True)
+    return assign_admission_numbers(cleaned)
+
+def clean_excel_parallel(filenames, tenant_id, academic_year, workers=None, chunk_size=DEFAULT_CHUNK_SIZE,
+                         target='postgres'):
+    """Read one or more student workbooks and clean them across CPU cores"""
+    workers = workers or os.cpu_count() or 1
+    logger.info(f"Reading {len(filenames)} Excel file(s)...")
+
+    if len(filenames) > 1 and workers > 1 and pa is not None:
+        # Workbooks are parsed in parallel too; openpyxl parsing is single-threaded
+        with ProcessPoolExecutor(max_workers=min(workers, len(filenames))) as executor:
+            handles = list(executor.map(_read_workbook_worker, filenames))
+        frames = [_df_from_shm(name, size, unlink=True) for name, size in handles]
+    else:
+        frames = [read_student_workbook(filename) for filename in filenames]
+
+    df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=list(COLUMN_MAPPING.values()))
+    cleaned = clean_dataframe_parallel(df, tenant_id, academic_year, workers=workers,
+                                       chunk_size=chunk_size, target=target)
+
+    logger.info(f"Processed {len(cleaned)} student records")
+    return cleaned
+
+def make_synthetic_students(rows, seed=42):
+    """Build a renamed student DataFrame resembling the school workbooks"""
+    rng = np.random.default_rng(seed)
+    first_names = np.array(['aarav', 'ananya', 'ravi kumar', 'lakshmi', 'mohammed', 'priya', 'sai', 'divya'])
+    surnames = np.array(['reddy', 'sharma', 'khan', 'naidu', 'rao', 'patel'])
+    mobiles = rng.integers(6000000000, 9999999999, size=rows).astype(float)
+    mobiles[rng.random(rows) < 0.1] = np.nan
+    admission = np.array([f"G{i}" for i in range(rows)], dtype=object)
+    admission[rng.random(rows) < 0.2] = np.nan
+
+    return pd.DataFrame({
+        'serial_number': np.arange(1, rows + 1),
+        'student_name': rng.choice(first_names, rows) + ' ' + rng.choice(surnames, rows),
+        'father_name': rng.choice(first_names, rows) + ' ' + rng.choice(surnames, rows),
+        'mobile': mobiles,
+        'alternate_mobile': np.nan,
+        'gender': rng.choice(np.array(['M', 'F', 'male', ' Female ', None], dtype=object), rows),
+        'dob': pd.to_datetime('2008-01-01') + pd.to_timedelta(rng.integers(0, 3650, rows), unit='D'),
+        'address': rng.choice(np.array([' Main Road, Kurnool ', 'Gandhi Nagar', None], dtype=object), rows),
+        'religion': rng.choice(np.array(['hindu', 'muslim', 'christian ', None], dtype=object), rows),
+        'caste': rng.choice(np.array(['bc', 'SC', 'general', 'oc', None], dtype=object), rows),
+        'blood_group': rng.choice(np.array(['A+', 'O+', 'B+', None], dtype=object), rows),
+        'admission_no': admission,
+        'bus_facility': rng.choice(np.array(['YES', 'NO'], dtype=object), rows),
+    })
+
+def _clean_text_columns_per_cell(df):
+    """The row-by-row string cleaning the normalisers replace (benchmark reference only)"""
+    df = df.copy()
+    df['gender'] = df['gender'].fillna('').astype(str).str.strip().str.upper().map(GENDER_MAPPING).fillna('Male')
+    for column in ('student_name', 'father_name', 'religion'):
+        df[column] = df[column].fillna('').astype(str).str.strip().str.title()
+    df['address'] = df['address'].fillna('').astype(str).str.strip()
+    df['caste'] = df['caste'].fillna('').astype(str).str.strip().str.upper().map(CASTE_MAPPING).fillna('Other')
+    return df
+
+def benchmark_normalisation(df):
+    """Compare per-cell string cleaning with memoized per-distinct-value normalisation"""
+    columns = [column for column in COLUMN_NORMALISERS if not column.endswith('mobile')]
+    distinct = sum(df[column].nunique() for column in columns)
+
+    start = time.perf_counter()
+    per_cell = _clean_text_columns_per_cell(df)
+    per_cell_elapsed = time.perf_counter() - start
+
+    for normaliser in set(COLUMN_NORMALISERS.values()):
+        normaliser.cache_clear()
+    start = time.perf_counter()
+    memoized = normalize_student_columns(df, {column: COLUMN_NORMALISERS[column] for column in columns})
+    memoized_elapsed = time.perf_counter() - start
+
+    assert per_cell[columns].astype(object).equals(memoized[columns]), "Memoized normalisation differs from per-cell cleaning"
+    print(f"Text columns: {len(df) * len(columns)} cells, {distinct} distinct values: per-cell "
+          f"{per_cell_elapsed:.2f}s, memoized {memoized_elapsed:.2f}s ({per_cell_elapsed / memoized_elapsed:.1f}x)")
+
+def benchmark(rows, max_workers, chunk_size=DEFAULT_CHUNK_SIZE):
+    """Time cleaning of a synthetic dataset for 1..max_workers workers"""
+    df = make_synthetic_students(rows)
+    created_at = datetime.now()
+    benchmark_normalisation(df)
+
+    print(f"Benchmark: {rows} rows, chunk size {chunk_size}, arrow={'yes' if pa is not None else 'no'}")
+    # clean_dataframe_parallel lowers the worker count itself; only counts it would really use are timed
+    counts = sorted({effective_workers(rows, workers) for workers in range(1, max_workers + 1)})
+    if counts[-1] < max_workers:
+        print(f"At most {counts[-1]} worker(s) for {rows} rows on {os.cpu_count()} CPU(s); larger counts are skipped")
+    print(f"{'workers':>8} {'seconds':>10} {'rows/s':>12} {'speedup':>8}")
+
+    baseline = None
+    for workers in counts:
+        start = time.perf_counter()
+        cleaned = clean_dataframe_parallel(df, 'benchmark-tenant', '2025-26', workers=workers,
+                                           chunk_size=chunk_size, created_at=created_at)
+        elapsed = time.perf_counter() - start
+        baseline = baseline or elapsed
+
+        # Generated admission numbers must stay unique across shards
+        assert cleaned['admission_no'].is_unique, "Duplicate admission numbers across shards"
+        print(f"{workers:>8} {elapsed:>10.2f} {rows / elapsed:>12.0f} {baseline / elapsed:>7.2f}x")
+
+def main():
+    """Command line entry point: clean workbooks or run the scaling benchmark"""
+    parser = argparse.ArgumentParser(description='Clean student workbooks across CPU cores')
+    parser.add_argument('files', nargs='*', help='Excel workbooks to clean')
+    parser.add_argument('--tenant-id', default='9abe534f-1a12-474c-a387-f8795ad3ab5a')
+    parser.add_argument('--academic-year', default='2025-26')
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--output', help='Write cleaned rows to this CSV file')
+    parser.add_argument('--benchmark', action='store_true', help='Run the 1..N worker scaling benchmark')
+    parser.add_argument('--rows', type=int, default=1000000, help='Synthetic rows for --benchmark')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.rows, args.workers, args.chunk_size)
+        return True
+
+    if not args.files:
+        parser.error('at least one Excel file is required (or use --benchmark)')
+
+    df = clean_excel_parallel(args.files, args.tenant_id, args.academic_year,
+                              workers=args.workers, chunk_size=args.chunk_size)
+    if args.output:
+        df.to_csv(args.output, index=False)
+        logger.info(f"Cleaned data written to {args.output}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
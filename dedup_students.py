@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Duplicate Student Detection
+Finds probable duplicate students (spelling variants, repeated across sections)
+using blocking keys and fuzzy name matching inside each block
+"""
+import re
+import sys
+import csv
+import time
+import argparse
+import logging
+from collections import defaultdict
+from functools import lru_cache
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from clean_students_parallel import normalize_phone
+
+try:
+    from rapidfuzz import fuzz
+except ImportError:
+    fuzz = None  # difflib is slower but gives comparable scores
+
+logger = logging.getLogger(__name__)
+
+# Constants
+NAME_SIMILARITY_THRESHOLD = 0.85
+MAX_BLOCK_SIZE = 200  # Larger blocks are skipped: they come from placeholder values, not real duplicates
+PHONE_SUFFIX_DIGITS = 4
+PLACEHOLDER_DOB = '2010-01-01'  # The importers fill missing dates of birth with this; it says nothing about the student
+REVIEW_FILE = 'duplicate_students_review.csv'
+
+SOUNDEX_CODES = {
+    **dict.fromkeys('BFPV', '1'), **dict.fromkeys('CGJKQSXZ', '2'), **dict.fromkeys('DT', '3'),
+    'L': '4', **dict.fromkeys('MN', '5'), 'R': '6'
+}
+
+@lru_cache(maxsize=65536)
+def soundex(word):
+    """Classic 4-character Soundex code ('' for words without letters)"""
+    word = re.sub(r'[^A-Z]', '', word.upper())
+    if not word:
+        return ''
+
+    code = word[0]
+    previous = SOUNDEX_CODES.get(word[0], '')
+    for letter in word[1:]:
+        digit = SOUNDEX_CODES.get(letter, '')
+        if digit and digit != previous:
+            code += digit
+        if letter not in 'HW':
+            previous = digit
+    return (code + '000')[:4]
+
+def name_tokens(name):
+    """Upper-case alphabetic tokens of a name, in sorted order"""
+    return sorted(re.findall(r'[A-Z]+', str(name or '').upper()))
+
+@lru_cache(maxsize=262144)
+def name_similarity(a, b):
+    """Similarity between two token-sorted names, 0..1 (names repeat, so scores are memoized)"""
+    if fuzz is not None:
+        return fuzz.ratio(a, b) / 100
+    return SequenceMatcher(None, a, b).ratio()
+
+def _blocking_keys(record):
+    """
+    Keys that put likely duplicates in the same block.
+
+    Each pass tolerates a different kind of difference: a re-typed phone, a
+    missing date of birth, or a misspelt name.
+    """
+    dob, phone, tokens = record['dob'], record['phone'], record['name'].split()
+    phonetic = ''.join(soundex(token) for token in tokens)
+    first_phonetic = soundex(tokens[0]) if tokens else ''
+    suffix = phone[-PHONE_SUFFIX_DIGITS:] if phone else None
+
+    keys = []
+    if dob and first_phonetic:
+        keys.append(('dob+name', dob, first_phonetic))
+    if dob and suffix:
+        keys.append(('dob+phone', dob, suffix))
+    if phonetic and suffix:
+        keys.append(('name+phone', phonetic, suffix))
+    return keys
+
+def find_probable_duplicates(df, threshold=NAME_SIMILARITY_THRESHOLD, max_block_size=MAX_BLOCK_SIZE):
+    """
+    Return probable duplicate pairs from a cleaned student DataFrame.
+
+    Rows are grouped by blocking keys in a hash index and fuzzy-compared only
+    within a block, so the work grows with the number of rows rather than
+    with every possible pair.
+    """
+    # Only the matching columns are read row by row; full rows are fetched for matches only
+    names = df['name'] if 'name' in df.columns else df['student_name']
+    mobiles = df['mobile'] if 'mobile' in df.columns else pd.Series([None] * len(df))
+    dobs = df['dob'].astype(str).str[:10]
+    dobs = dobs.astype(object).where(df['dob'].notna() & (dobs != PLACEHOLDER_DOB), None)  # None, not NaN, when unknown
+
+    records = []
+    for position, (name, dob, mobile) in enumerate(zip(names.tolist(), dobs.tolist(), mobiles.tolist())):
+        records.append({
+            'position': position,
+            'dob': dob,
+            'phone': normalize_phone(mobile),
+            'name': ' '.join(name_tokens(name)),
+        })
+
+    blocks = defaultdict(list)
+    for record in records:
+        for key in _blocking_keys(record):
+            blocks[key].append(record['position'])
+
+    pairs = {}
+    skipped = 0
+    for key, members in blocks.items():
+        if len(members) < 2:
+            continue
+        if len(members) > max_block_size:
+            skipped += 1
+            continue
+
+        for i, a in enumerate(members):
+            for b in members[i + 1:]:
+                if (a, b) in pairs:
+                    pairs[(a, b)]['matched_on'].add(key[0])
+                    continue
+                score = name_similarity(records[a]['name'], records[b]['name'])
+                if score >= threshold:
+                    pairs[(a, b)] = {'score': score, 'matched_on': {key[0]}}
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} oversized blocks (more than {max_block_size} rows share a key)")
+
+    display_names = names.tolist()
+    admission_numbers = df['admission_no'].tolist() if 'admission_no' in df.columns else [None] * len(df)
+
+    results = []
+    for (a, b), match in sorted(pairs.items()):
+        results.append({
+            'row_a': a + 1,
+            'row_b': b + 1,
+            'name_a': display_names[a],
+            'name_b': display_names[b],
+            'admission_no_a': admission_numbers[a],
+            'admission_no_b': admission_numbers[b],
+            'dob_a': records[a]['dob'],
+            'dob_b': records[b]['dob'],
+            'phone_a': records[a]['phone'],
+            'phone_b': records[b]['phone'],
+            'similarity': round(match['score'], 3),
+            'matched_on': '+'.join(sorted(match['matched_on'])),
+        })
+
+    logger.info(f"Compared {len(records)} students in {len(blocks)} blocks: {len(results)} probable duplicate pairs")
+    return results
+
+def write_review_file(pairs, path=REVIEW_FILE):
+    """Write probable duplicate pairs to a CSV for manual review"""
+    fields = ['row_a', 'row_b', 'name_a', 'name_b', 'admission_no_a', 'admission_no_b',
+              'dob_a', 'dob_b', 'phone_a', 'phone_b', 'similarity', 'matched_on']
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=fields)
+        writer.writeheader()
+        writer.writerows(pairs)
+    logger.info(f"Duplicate review file written: {path} ({len(pairs)} pairs)")
+    return path
+
+def drop_later_duplicates(df, pairs):
+    """Keep the first row of each duplicate pair and drop the later one"""
+    later_rows = {pair['row_b'] - 1 for pair in pairs}
+    keep = [position not in later_rows for position in range(len(df))]
+    return df[keep].reset_index(drop=True)
+
+def review_duplicates(df, review_file=REVIEW_FILE, skip_duplicates=False):
+    """Dedup stage for the importers: write probable duplicates for review, optionally dropping them"""
+    pairs = find_probable_duplicates(df)
+    if not pairs:
+        return df
+
+    write_review_file(pairs, review_file)
+    if skip_duplicates:
+        before = len(df)
+        df = drop_later_duplicates(df, pairs)
+        logger.info(f"Skipped {before - len(df)} probable duplicate students")
+    return df
+
+def _synthetic_names(rows, rng):
+    """Varied two-word names built from syllables, so blocks look like a real tenant's"""
+    syllables = np.array(['ra', 'vi', 'ku', 'mar', 'an', 'ya', 'sha', 'li', 'moh', 'med', 'pri', 'sai', 'dev',
+                          'na', 'red', 'dy', 'su', 'resh', 'ka', 'vya', 'ar', 'jun', 'lak', 'shmi'])
+    words = [''.join(parts) for parts in rng.choice(syllables, size=(rows * 2, 3))]
+    return [f"{words[i]} {words[rows + i]}" for i in range(rows)]
+
+def benchmark(sizes):
+    """Time duplicate detection on synthetic data with injected spelling variants"""
+    from clean_students_parallel import make_synthetic_students, clean_dataframe_parallel
+
+    rng = np.random.default_rng(7)
+    print(f"{'rows':>8} {'seconds':>9} {'pairs':>8}")
+    for rows in sizes:
+        raw = make_synthetic_students(rows)
+        raw['student_name'] = _synthetic_names(rows, rng)
+        # Re-list 1% of students with a typo in the name
+        variants = raw.sample(frac=0.01, random_state=1).copy()
+        variants['student_name'] = variants['student_name'].str.replace('a', 'e', n=1)
+        raw = pd.concat([raw, variants], ignore_index=True)
+        df = clean_dataframe_parallel(raw, 'benchmark-tenant', '2025-26', workers=1)
+
+        start = time.perf_counter()
+        pairs = find_probable_duplicates(df)
+        print(f"{len(df):>8} {time.perf_counter() - start:>9.2f} {len(pairs):>8}")
+
+def main():
+    """Command line entry point: check a workbook, or benchmark scaling"""
+    parser = argparse.ArgumentParser(description='Find probable duplicate students in a workbook')
+    parser.add_argument('file', nargs='?', help='Excel workbook to check')
+    parser.add_argument('--output', default=REVIEW_FILE, help='Review CSV to write')
+    parser.add_argument('--threshold', type=float, default=NAME_SIMILARITY_THRESHOLD)
+    parser.add_argument('--benchmark', action='store_true', help='Time detection at 10k, 50k and 100k rows')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        benchmark([10000, 50000, 100000])
+        return True
+    if not args.file:
+        parser.error('a workbook is required (or use --benchmark)')
+
+    from clean_students_parallel import clean_excel_parallel
+    df = clean_excel_parallel([args.file], 'review', '', workers=1)
+    write_review_file(find_probable_duplicates(df, args.threshold), args.output)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Exam Results Engine
+Totals, percentages, grades, section/class ranks and subject toppers for every
+student sitting an exam, computed from one marks query with pandas group-bys
+and written out as report-card summary files
+"""
+import os
+import re
+import sys
+import time
+import argparse
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+ACADEMIC_YEAR = '2025-26'
+OUTPUT_DIR = 'exam_results'
+
+# Same scale as calculateGrade in ViewReportCard.js: (minimum percentage, grade), highest first. MarksEntry.js
+# stores marks.grade on its own scale (B+ at 70, F below 33), so results report that as entered_grade and
+# never write these grades back
+GRADE_SCALE = [(90, 'A+'), (80, 'A'), (70, 'A-'), (60, 'B+'), (50, 'B'), (40, 'B-'), (30, 'C+'), (20, 'C')]
+LOWEST_GRADE = 'C-'
+
+# Every mark of the exam across all classes that sat it, with the student, class and subject names
+MARKS_QUERY = """
+    SELECT m.id AS mark_id, m.student_id, s.name AS student_name, s.roll_no, m.exam_id, e.name AS exam_name,
+           e.class_id, c.class_name, c.section, m.subject_id, sub.name AS subject_name,
+           m.marks_obtained, COALESCE(m.max_marks, e.max_marks) AS max_marks, m.grade
+    FROM marks m
+    JOIN exams e ON e.id = m.exam_id
+    JOIN students s ON s.id = m.student_id
+    JOIN classes c ON c.id = e.class_id
+    LEFT JOIN subjects sub ON sub.id = m.subject_id
+    WHERE m.tenant_id = %(tenant_id)s AND e.academic_year = %(academic_year)s
+      AND (%(exam_name)s::text IS NULL OR e.name = %(exam_name)s)
+      AND (%(exam_id)s::uuid IS NULL OR e.id = %(exam_id)s::uuid)
+"""
+
+def grade_for(percentages):
+    """Letter grades for an array of percentages"""
+    thresholds = [minimum for minimum, _ in GRADE_SCALE]
+    grades = [grade for _, grade in GRADE_SCALE]
+    return np.select([percentages >= minimum for minimum in thresholds], grades, default=LOWEST_GRADE)
+
+def percent(obtained, maximum):
+    """Percentages rounded to 2 places, 0 where nothing could be scored"""
+    return (100 * obtained / maximum.where(maximum > 0)).fillna(0.0).round(2)
+
+def load_marks(conn, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR, exam_name=None, exam_id=None):
+    """All marks for the exam in one query"""
+    start = time.perf_counter()
+    cursor = conn.cursor()
+    try:
+        cursor.execute(MARKS_QUERY, {'tenant_id': tenant_id, 'academic_year': academic_year,
+                                     'exam_name': exam_name, 'exam_id': exam_id})
+        columns = [column[0] for column in cursor.description]
+        marks = pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        cursor.close()
+    logger.info(f"Loaded {len(marks)} marks in {time.perf_counter() - start:.1f}s")
+    return marks
+
+def compute_results(marks):
+    """
+    Report-card results for every student in the marks frame.
+
+    Returns (students, subjects, toppers). students has one row per student
+    and exam with total, max, percentage, grade and ranks within the section
+    (class_id) and within the class (class_name, all sections). subjects has
+    one row per mark with its percentage, report-card grade, the grade
+    stored at marks entry (entered_grade) and section rank. toppers
+    lists the highest scorers of each subject per section, ties included.
+    Ranks are competition ranks: equal totals share a rank and the next
+    rank is skipped (1, 2, 2, 4).
+    """
+    subjects = marks.assign(
+        marks_obtained=pd.to_numeric(marks['marks_obtained']).astype(float).fillna(0.0),
+        max_marks=pd.to_numeric(marks['max_marks']).astype(float).fillna(0.0),
+        subject_name=marks['subject_name'].fillna('Unknown subject'),
+        entered_grade=marks['grade'],
+    )
+    subjects['percentage'] = percent(subjects['marks_obtained'], subjects['max_marks'])
+    subjects['grade'] = grade_for(subjects['percentage'])
+    subjects['subject_rank'] = subjects.groupby(['exam_id', 'subject_id'], dropna=False)['marks_obtained'] \
+        .rank(method='min', ascending=False).astype(int)
+
+    students = subjects.groupby(['exam_id', 'student_id'], as_index=False).agg(
+        student_name=('student_name', 'first'), roll_no=('roll_no', 'first'), exam_name=('exam_name', 'first'),
+        class_id=('class_id', 'first'), class_name=('class_name', 'first'), section=('section', 'first'),
+        subjects=('subject_id', 'nunique'), total=('marks_obtained', 'sum'), max_total=('max_marks', 'sum'))
+    students['percentage'] = percent(students['total'], students['max_total'])
+    students['grade'] = grade_for(students['percentage'])
+    # Exams are per section (class_id); the whole class is every section with the same exam name and class name
+    students['section_rank'] = students.groupby('exam_id')['percentage'] \
+        .rank(method='min', ascending=False).astype(int)
+    students['class_rank'] = students.groupby(['exam_name', 'class_name'])['percentage'] \
+        .rank(method='min', ascending=False).astype(int)
+    students['section_size'] = students.groupby('exam_id')['student_id'].transform('size')
+    students['class_size'] = students.groupby(['exam_name', 'class_name'])['student_id'].transform('size')
+    students = students.sort_values(['class_name', 'section', 'section_rank', 'student_name'])
+
+    toppers = subjects[subjects['subject_rank'] == 1][
+        ['exam_id', 'exam_name', 'class_name', 'section', 'subject_name', 'student_id', 'student_name',
+         'marks_obtained', 'max_marks', 'percentage']].sort_values(['class_name', 'section', 'subject_name'])
+
+    columns = ['mark_id', 'exam_id', 'student_id', 'class_name', 'section', 'subject_id', 'subject_name',
+               'marks_obtained', 'max_marks', 'percentage', 'grade', 'entered_grade', 'subject_rank']
+    return students.reset_index(drop=True), subjects[columns].reset_index(drop=True), toppers.reset_index(drop=True)
+
+def write_results(students, subjects, toppers, output_dir=OUTPUT_DIR, label='exam'):
+    """Write the three result tables as CSV files; returns their paths"""
+    os.makedirs(output_dir, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_') or 'exam'
+    paths = []
+    for name, frame in (('students', students), ('subjects', subjects), ('toppers', toppers)):
+        path = os.path.join(output_dir, f"{slug}_{name}.csv")
+        frame.to_csv(path, index=False)
+        paths.append(path)
+    return paths
+
+def make_synthetic_marks(students, subjects=6, seed=7):
+    """Exam-shaped marks for timing: 12 classes of 4 sections, one exam per section"""
+    rng = np.random.default_rng(seed)
+    sections = [(f"Class {c}", s) for c in range(1, 13) for s in 'ABCD']
+    section = rng.integers(0, len(sections), students)
+    count = students * subjects
+    student = np.repeat(np.arange(students), subjects)
+    return pd.DataFrame({
+        'mark_id': [f"mark-{i}" for i in range(count)],
+        'student_id': [f"student-{i}" for i in student],
+        'student_name': [f"Student {i}" for i in student],
+        'roll_no': student % 60 + 1,
+        'exam_id': [f"exam-{i}" for i in section[student]],
+        'exam_name': 'Mid Term',
+        'class_id': [f"class-{i}" for i in section[student]],
+        'class_name': [sections[i][0] for i in section[student]],
+        'section': [sections[i][1] for i in section[student]],
+        'subject_id': [f"subject-{i}" for i in np.tile(np.arange(subjects), students)],
+        'subject_name': [f"Subject {i}" for i in np.tile(np.arange(subjects), students)],
+        'marks_obtained': rng.integers(0, 101, count).astype(float),
+        'max_marks': 100.0,
+        'grade': None,
+    })
+
+def main():
+    """Compute report-card results for an exam, or time the engine on synthetic data"""
+    parser = argparse.ArgumentParser(description='Compute exam totals, grades, ranks and subject toppers')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--academic-year', default=ACADEMIC_YEAR)
+    parser.add_argument('--exam-name', help="Exam name, e.g. 'Mid Term'; every class that sat it is ranked together")
+    parser.add_argument('--exam-id', help='A single exam (one section)')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--benchmark', type=int, metavar='STUDENTS', help='Time the engine on synthetic data')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        marks = make_synthetic_marks(args.benchmark)
+        start = time.perf_counter()
+        students, subjects, toppers = compute_results(marks)
+        print(f"{args.benchmark} students, {len(marks)} marks: {len(students)} results and "
+              f"{len(toppers)} subject toppers in {time.perf_counter() - start:.2f}s")
+        return True
+
+    if not args.exam_name and not args.exam_id:
+        logger.error("Give --exam-name or --exam-id")
+        return False
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    marks = load_marks(conn, args.tenant_id, args.academic_year, args.exam_name, args.exam_id)
+    if marks.empty:
+        logger.warning("No marks found for this exam")
+        return True
+
+    students, subjects, toppers = compute_results(marks)
+    paths = write_results(students, subjects, toppers, args.output_dir,
+                          f"{args.academic_year}_{args.exam_name or args.exam_id}")
+    logger.info(f"{len(students)} students in {students['class_name'].nunique()} classes; "
+                f"results written to {', '.join(paths)}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+"""
+Face Embedding Index
+Keeps a tenant's active facial templates in one contiguous float32 matrix, memory-mapped
+from a local cache file and refreshed incrementally by updated_at, and answers top-k
+cosine matches for a batch of faces with a single matrix multiplication
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+INDEX_DIR = '.face_index'
+EMBEDDING_DIM = 128  # face_recognition/dlib encodings; use --dim for other models
+TOP_K = 5
+DEFAULT_THRESHOLD = 0.8  # facial_templates.confidence_threshold default
+MIN_CAPACITY = 1024  # Rows reserved in the matrix file; it doubles when full
+COMPACT_RATIO = 0.25  # Rewrite the file once this share of rows are dead
+EPOCH = '1970-01-01T00:00:00+00:00'
+
+# Everything changed since the watermark, inactive rows included so deactivations reach the index
+TEMPLATES_QUERY = """
+    SELECT id, person_id, person_type, face_encoding, confidence_threshold, is_active, updated_at
+    FROM facial_templates
+    WHERE tenant_id = %(tenant_id)s AND updated_at > %(since)s
+    ORDER BY updated_at
+"""
+
+def decode_encoding(data, dim=EMBEDDING_DIM):
+    """bytea face_encoding as a float32 vector: raw float32 or float64 (face_recognition's dtype), else None"""
+    if data is None:
+        return None
+    data = bytes(data)
+    if len(data) == dim * 4:
+        return np.frombuffer(data, dtype='<f4')
+    if len(data) == dim * 8:
+        return np.frombuffer(data, dtype='<f8').astype(np.float32)
+    return None
+
+def normalize(vectors):
+    """Rows scaled to unit length, so a dot product is the cosine similarity"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+class FaceIndex:
+    """
+    Unit-length template embeddings in a memory-mapped float32 matrix.
+
+    Row i of the matrix belongs to ids[i]. Updated templates are overwritten
+    in place, new ones appended, and deactivated ones masked out until enough
+    dead rows pile up to compact the file. Metadata and the updated_at
+    watermark sit in a JSON file next to the matrix.
+    """
+
+    def __init__(self, directory, dim=EMBEDDING_DIM):
+        self.directory = directory
+        self.dim = dim
+        self.matrix_path = os.path.join(directory, 'embeddings.f32')
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.ids, self.person_ids, self.person_types = [], [], []
+        self.thresholds = np.zeros(0, dtype=np.float32)
+        self.active = np.zeros(0, dtype=bool)
+        self.watermark = EPOCH
+        self.capacity = 0
+        self.matrix = None
+        self.rows = {}
+
+    @property
+    def count(self):
+        return len(self.ids)
+
+    def load(self):
+        """Open the cached index; returns False when there is none (or it was built for another dim)"""
+        if not os.path.exists(self.meta_path):
+            return False
+        with open(self.meta_path, 'r') as f:
+            meta = json.load(f)
+        if meta['capacity'] and not os.path.exists(self.matrix_path):
+            return False
+        if meta['dim'] != self.dim:
+            logger.warning(f"Cached index has {meta['dim']}-d embeddings, not {self.dim}; rebuilding")
+            return False
+        self.ids, self.person_ids, self.person_types = meta['ids'], meta['person_ids'], meta['person_types']
+        self.thresholds = np.array(meta['thresholds'], dtype=np.float32)
+        self.active = np.array(meta['active'], dtype=bool)
+        self.watermark = meta['watermark']
+        self.capacity = meta['capacity']
+        if self.capacity:  # An index whose templates were all deactivated has no matrix file
+            self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+', shape=(self.capacity, self.dim))
+        self.rows = {template_id: row for row, template_id in enumerate(self.ids)}
+        return True
+
+    def save(self):
+        """Flush the matrix and write the metadata atomically"""
+        os.makedirs(self.directory, exist_ok=True)
+        if self.matrix is not None:
+            self.matrix.flush()
+        meta = {'dim': self.dim, 'capacity': self.capacity, 'watermark': self.watermark, 'ids': self.ids,
+                'person_ids': self.person_ids, 'person_types': self.person_types,
+                'thresholds': self.thresholds.tolist(), 'active': self.active.tolist()}
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def _reserve(self, rows):
+        """Make room for `rows` rows, doubling the matrix file so appends stay amortised O(1)"""
+        if rows <= self.capacity:
+            return
+        capacity = max(MIN_CAPACITY, self.capacity * 2, rows)
+        os.makedirs(self.directory, exist_ok=True)
+        if self.matrix is not None:
+            self.matrix.flush()
+            del self.matrix
+        with open(self.matrix_path, 'ab') as f:
+            f.truncate(capacity * self.dim * 4)
+        self.capacity = capacity
+        self.matrix = np.memmap(self.matrix_path, dtype=np.float32, mode='r+', shape=(capacity, self.dim))
+
+    def apply(self, rows):
+        """
+        Fold changed template rows into the index; returns (added, updated, removed).
+
+        rows are (id, person_id, person_type, face_encoding, confidence_threshold,
+        is_active, updated_at) in updated_at order, as TEMPLATES_QUERY returns them.
+        """
+        added = updated = removed = 0
+        new_rows = [row for row in rows if str(row[0]) not in self.rows and row[5]]
+        self._reserve(self.count + len(new_rows))
+        thresholds = list(self.thresholds)
+        active = list(self.active)
+
+        for template_id, person_id, person_type, encoding, threshold, is_active, updated_at in rows:
+            template_id = str(template_id)
+            vector = decode_encoding(encoding, self.dim) if is_active else None
+            if is_active and vector is None:
+                logger.warning(f"Template {template_id} has no usable {self.dim}-d encoding; skipped")
+            row = self.rows.get(template_id)
+            if vector is None:
+                if row is not None and active[row]:
+                    active[row] = False
+                    removed += 1
+            elif row is None:
+                row = self.count
+                self.rows[template_id] = row
+                self.ids.append(template_id)
+                self.person_ids.append(str(person_id))
+                self.person_types.append(person_type)
+                thresholds.append(float(threshold if threshold is not None else DEFAULT_THRESHOLD))
+                active.append(True)
+                self.matrix[row] = normalize(vector)
+                added += 1
+            else:
+                thresholds[row] = float(threshold if threshold is not None else DEFAULT_THRESHOLD)
+                active[row] = True
+                self.matrix[row] = normalize(vector)
+                updated += 1
+            self.watermark = max(self.watermark, str(updated_at.isoformat() if hasattr(updated_at, 'isoformat')
+                                                     else updated_at))
+
+        self.thresholds = np.array(thresholds, dtype=np.float32)
+        self.active = np.array(active, dtype=bool)
+        if self.count and (~self.active).sum() > COMPACT_RATIO * self.count:
+            self.compact()
+        return added, updated, removed
+
+    def compact(self):
+        """Drop dead rows by rewriting the matrix file with only the active ones"""
+        keep = np.flatnonzero(self.active)
+        vectors = np.array(self.matrix[keep])
+        self.ids = [self.ids[i] for i in keep]
+        self.person_ids = [self.person_ids[i] for i in keep]
+        self.person_types = [self.person_types[i] for i in keep]
+        self.thresholds = self.thresholds[keep]
+        self.active = np.ones(len(keep), dtype=bool)
+        self.rows = {template_id: row for row, template_id in enumerate(self.ids)}
+        del self.matrix
+        self.matrix, self.capacity = None, 0
+        os.remove(self.matrix_path)
+        if len(keep):
+            self._reserve(len(keep))
+            self.matrix[:len(keep)] = vectors
+        logger.info(f"Compacted face index to {len(keep)} templates")
+
+    def search(self, queries, k=TOP_K):
+        """
+        Top-k templates by cosine similarity for each query embedding.
+
+        queries is an (n, dim) array or a single vector. Returns one list per
+        query of (template_id, person_id, person_type, score, matched) with the
+        best template per person, matched meaning score >= the template's
+        confidence_threshold.
+        """
+        queries = normalize(np.atleast_2d(queries))
+        if not self.count:
+            return [[] for _ in queries]
+        scores = queries @ self.matrix[:self.count].T  # (n, templates), one BLAS call for the whole batch
+        scores[:, ~self.active] = -np.inf
+        # Look a little past k so several templates of one person still leave k people
+        depth = min(self.count, k * 3)
+        top = np.argpartition(-scores, depth - 1, axis=1)[:, :depth]
+
+        results = []
+        for query_scores, candidates in zip(scores, top):
+            candidates = candidates[np.argsort(-query_scores[candidates])]
+            matches, seen = [], set()
+            for row in candidates:
+                score = float(query_scores[row])
+                if score == -np.inf or self.person_ids[row] in seen:
+                    continue
+                seen.add(self.person_ids[row])
+                matches.append((self.ids[row], self.person_ids[row], self.person_types[row], score,
+                                bool(score >= self.thresholds[row])))
+                if len(matches) == k:
+                    break
+            results.append(matches)
+        return results
+
+def fetch_changes(conn, tenant_id, since):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(TEMPLATES_QUERY, {'tenant_id': tenant_id, 'since': since})
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def refresh_index(conn, tenant_id=TENANT_ID, index_dir=INDEX_DIR, dim=EMBEDDING_DIM, rebuild=False):
+    """Open the tenant's cached index and bring it up to date with templates changed since its watermark"""
+    directory = os.path.join(index_dir, tenant_id)
+    index = FaceIndex(directory, dim)
+    if rebuild or not index.load():
+        for path in (index.matrix_path, index.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        index = FaceIndex(directory, dim)
+
+    start = time.perf_counter()
+    rows = fetch_changes(conn, tenant_id, index.watermark)
+    added, updated, removed = index.apply(rows)
+    index.save()
+    logger.info(f"Face index: {int(index.active.sum())} active templates; {added} added, {updated} updated, "
+                f"{removed} removed since last refresh ({time.perf_counter() - start:.2f}s)")
+    return index
+
+def synthetic_templates(count, dim=EMBEDDING_DIM, seed=7):
+    """Template rows shaped like TEMPLATES_QUERY output, with random float64 encodings"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((count, dim))
+    return [(f"template-{i}", f"student-{i // 2}", 'student', vectors[i].astype('<f8').tobytes(), 0.8, True,
+             f"2025-06-01T08:{i // 60000 % 60:02d}:{i // 1000 % 60:02d}.{i % 1000:03d}+00:00")
+            for i in range(count)], vectors
+
+def benchmark(sizes, dim=EMBEDDING_DIM, batch=32, repeats=50):
+    """Query latency for single faces and batches at each index size, against a per-template loop"""
+    import tempfile
+    for size in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            rows, vectors = synthetic_templates(size, dim)
+            index = FaceIndex(tmp, dim)
+            start = time.perf_counter()
+            index.apply(rows)
+            index.save()
+            built = time.perf_counter() - start
+            index = FaceIndex(tmp, dim)
+            index.load()
+
+            rng = np.random.default_rng(1)
+            picks = rng.integers(0, size, repeats * batch)
+            probes = vectors[picks] + rng.normal(0, 0.2, (len(picks), dim))  # A noisy capture of a known face
+
+            single = []
+            for probe in probes[:repeats]:
+                start = time.perf_counter()
+                index.search(probe)
+                single.append(time.perf_counter() - start)
+            start = time.perf_counter()
+            results = []
+            for i in range(repeats):
+                results.extend(index.search(probes[i * batch:(i + 1) * batch]))
+            batched = (time.perf_counter() - start) / len(probes)
+            correct = np.mean([bool(result) and result[0][1] == f"student-{pick // 2}"
+                               for result, pick in zip(results, picks)])
+
+            loop_probes = normalize(probes[:5])
+            start = time.perf_counter()
+            for probe in loop_probes:
+                max(range(size), key=lambda row: float(np.dot(index.matrix[row], probe)))
+            loop = (time.perf_counter() - start) / len(loop_probes)
+
+            single_ms = np.array(single) * 1000
+            print(f"{size:>7} templates: build {built:.2f}s; single query p50 {np.median(single_ms):.2f}ms "
+                  f"p95 {np.percentile(single_ms, 95):.2f}ms; batch of {batch} {batched * 1000:.3f}ms/face; "
+                  f"one-by-one loop {loop * 1000:.0f}ms/face; top-1 correct {correct:.1%}")
+    return True
+
+def main():
+    """Refresh a tenant's face index, match a stored encoding, or run the latency benchmark"""
+    parser = argparse.ArgumentParser(description='In-memory face embedding index for attendance matching')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--index-dir', default=INDEX_DIR)
+    parser.add_argument('--dim', type=int, default=EMBEDDING_DIM, help='Embedding dimension of the face model')
+    parser.add_argument('--rebuild', action='store_true', help='Discard the cached index and reload every template')
+    parser.add_argument('--query-template', help='Match the encoding of this template id against the index')
+    parser.add_argument('--top-k', type=int, default=TOP_K)
+    parser.add_argument('--benchmark', default=None, metavar='SIZES', nargs='?', const='1000,10000,100000',
+                        help='Time queries at these index sizes (default 1000,10000,100000)')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        return benchmark([int(size) for size in args.benchmark.split(',')], args.dim)
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    index = refresh_index(conn, args.tenant_id, args.index_dir, args.dim, args.rebuild)
+    if args.query_template:
+        row = index.rows.get(args.query_template)
+        if row is None:
+            logger.error(f"Template {args.query_template} is not in the index")
+            return False
+        for template_id, person_id, person_type, score, matched in index.search(index.matrix[row], args.top_k)[0]:
+            print(f"{person_type} {person_id} (template {template_id}): {score:.3f}{' match' if matched else ''}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Tenant Fee Dues Engine
+Recomputes due, paid, remaining and status for every student and fee component
+of a tenant from three bulk queries, with pandas group-bys instead of per-row SQL
+"""
+import sys
+import time
+import argparse
+import logging
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+UPDATE_PAGE_SIZE = 1000  # Rows per UPDATE ... FROM (VALUES ...) statement
+AMOUNT_TOLERANCE = 0.005  # Stored amounts within half a paisa are left alone
+REPORT_FILE = 'fee_dues_report.csv'
+GENERAL_DISCOUNT_COMPONENTS = {'', 'all'}  # Discounts with no (or 'ALL') component apply to every component
+
+# Class-level fee components only; student-level rows are legacy concessions superseded by student_discounts
+STRUCTURE_QUERY = """
+    SELECT class_id, academic_year, fee_component, COALESCE(base_amount, amount) AS base_amount,
+           COALESCE(discount_applied, 0) AS discount_applied, due_date
+    FROM fee_structure
+    WHERE tenant_id = %(tenant_id)s AND student_id IS NULL
+"""
+DISCOUNTS_QUERY = """
+    SELECT student_id, academic_year, fee_component, discount_type, discount_value
+    FROM student_discounts
+    WHERE tenant_id = %(tenant_id)s AND is_active
+"""
+# Every student with their payments (one row with NULL payment columns when they have none)
+PAYMENTS_QUERY = """
+    SELECT s.id AS student_id, s.class_id, sf.id AS fee_id, sf.academic_year, sf.fee_component, sf.amount_paid,
+           sf.payment_date, sf.receipt_number, sf.total_amount, sf.remaining_amount, sf.status
+    FROM students s
+    LEFT JOIN student_fees sf ON sf.student_id = s.id AND sf.tenant_id = s.tenant_id
+                              AND COALESCE(sf.status, '') <> 'cancelled'
+    WHERE s.tenant_id = %(tenant_id)s
+"""
+
+UPDATE_SQL = """
+    UPDATE student_fees AS sf
+    SET total_amount = v.total_amount, remaining_amount = v.remaining_amount, status = v.status
+    FROM (VALUES %s) AS v(id, total_amount, remaining_amount, status)
+    WHERE sf.id = v.id::uuid
+"""
+
+def normalize_year(values):
+    """'2024-2025' -> '2024-25', as the app's normalizeAcademicYear does"""
+    years = values.fillna('').astype(str).str.strip()
+    return years.str.replace(r'^(\d{4})-\d{2}(\d{2})$', r'\1-\2', regex=True)
+
+def component_key(values):
+    """Case- and space-insensitive component names, so 'Tuition Fee' matches 'tuition fee'"""
+    return values.fillna('').astype(str).str.strip().str.lower().str.replace(r'\s+', ' ', regex=True)
+
+def fetch_frame(conn, sql, tenant_id):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, {'tenant_id': tenant_id})
+        columns = [column[0] for column in cursor.description]
+        return pd.DataFrame(cursor.fetchall(), columns=columns)
+    finally:
+        cursor.close()
+
+def load_fee_data(conn, tenant_id=TENANT_ID):
+    """The three inputs of compute_fee_dues, one query each"""
+    start = time.perf_counter()
+    structure = fetch_frame(conn, STRUCTURE_QUERY, tenant_id)
+    discounts = fetch_frame(conn, DISCOUNTS_QUERY, tenant_id)
+    payments = fetch_frame(conn, PAYMENTS_QUERY, tenant_id)
+    logger.info(f"Loaded {len(structure)} fee structure rows, {len(discounts)} discounts and {len(payments)} "
+                f"student/payment rows in {time.perf_counter() - start:.1f}s")
+    return structure, discounts, payments
+
+def compute_fee_dues(structure, discounts, payments, today=None):
+    """
+    Per-student, per-component dues and the updated student_fees rows.
+
+    Returns (dues, fee_rows). dues has one row per student and class fee
+    component with due, paid, remaining and status. fee_rows has one row per
+    payment with the total_amount, remaining_amount and status it should
+    store; remaining and status are as of that payment, in payment order.
+    """
+    today = pd.Timestamp(today or date.today())
+
+    # Class fees per (class, year, component): rows for the same component add up
+    structure = structure.assign(
+        academic_year=normalize_year(structure['academic_year']),
+        key=component_key(structure['fee_component']),
+        base_amount=pd.to_numeric(structure['base_amount']).astype(float),
+        discount_applied=pd.to_numeric(structure['discount_applied']).astype(float),
+        due_date=pd.to_datetime(structure['due_date']),
+    )
+    class_fees = structure.groupby(['class_id', 'academic_year', 'key'], as_index=False).agg(
+        fee_component=('fee_component', 'first'), base_amount=('base_amount', 'sum'),
+        structure_discount=('discount_applied', 'sum'), due_date=('due_date', 'min'))
+
+    students = payments[['student_id', 'class_id']].drop_duplicates('student_id')
+    dues = students.merge(class_fees, on='class_id', how='inner')
+
+    # Student discounts: each one capped at the base amount, specific and general ones both apply
+    discounts = discounts.assign(
+        academic_year=normalize_year(discounts['academic_year']),
+        key=component_key(discounts['fee_component']),
+        discount_value=pd.to_numeric(discounts['discount_value']).astype(float),
+    )
+    general = discounts['key'].isin(GENERAL_DISCOUNT_COMPONENTS)
+    matched = pd.concat([
+        dues[['student_id', 'academic_year', 'key', 'base_amount']].merge(
+            discounts[~general], on=['student_id', 'academic_year', 'key']),
+        dues[['student_id', 'academic_year', 'key', 'base_amount']].merge(
+            discounts[general].drop(columns='key'), on=['student_id', 'academic_year']),
+    ])
+    matched['amount'] = np.minimum(
+        np.where(matched['discount_type'] == 'percentage',
+                 matched['base_amount'] * matched['discount_value'] / 100, matched['discount_value']),
+        matched['base_amount'])
+    individual = matched.groupby(['student_id', 'academic_year', 'key'])['amount'].sum().rename('student_discount')
+    dues = dues.merge(individual, left_on=['student_id', 'academic_year', 'key'], right_index=True, how='left')
+    dues['student_discount'] = dues['student_discount'].fillna(0.0)
+    dues['due'] = (dues['base_amount'] - dues['structure_discount'] - dues['student_discount']).clip(lower=0)
+
+    # Payments per student and component
+    fees = payments.dropna(subset=['fee_id']).assign(
+        academic_year=lambda df: normalize_year(df['academic_year']),
+        key=lambda df: component_key(df['fee_component']),
+        amount_paid=lambda df: pd.to_numeric(df['amount_paid']).astype(float).fillna(0.0),
+        payment_date=lambda df: pd.to_datetime(df['payment_date']),
+    )
+    paid = fees.groupby(['student_id', 'academic_year', 'key'])['amount_paid'].sum().rename('paid')
+    dues = dues.merge(paid, left_on=['student_id', 'academic_year', 'key'], right_index=True, how='left')
+    dues['paid'] = dues['paid'].fillna(0.0)
+    dues['remaining'] = (dues['due'] - dues['paid']).clip(lower=0)
+    dues['status'] = fee_status(dues['paid'], dues['due'], dues['remaining'], dues['due_date'], today)
+
+    # Each payment row: the component total, and what was left after it in payment order
+    fees = fees.merge(dues[['student_id', 'academic_year', 'key', 'due', 'due_date']],
+                      on=['student_id', 'academic_year', 'key'], how='left')
+    unmatched = fees['due'].isna()
+    if unmatched.any():
+        logger.warning(f"{int(unmatched.sum())} payments have no matching class fee component; left unchanged")
+    fees = fees[~unmatched].sort_values(['student_id', 'academic_year', 'key', 'payment_date', 'receipt_number'])
+    cumulative = fees.groupby(['student_id', 'academic_year', 'key'])['amount_paid'].cumsum()
+    fees['new_total'] = fees['due'].round(2)
+    fees['new_remaining'] = (fees['due'] - cumulative).clip(lower=0).round(2)
+    fees['new_status'] = fee_status(cumulative, fees['due'], fees['new_remaining'], fees['due_date'], today)
+
+    columns = ['student_id', 'class_id', 'academic_year', 'fee_component', 'base_amount', 'structure_discount',
+               'student_discount', 'due', 'paid', 'remaining', 'status', 'due_date']
+    return dues[columns].reset_index(drop=True), fees.reset_index(drop=True)
+
+def fee_status(paid, due, remaining, due_date, today):
+    """pending / partial / paid, and overdue once the due date has passed with money outstanding"""
+    status = np.where(paid >= due, 'paid', np.where(paid > 0, 'partial', 'pending'))
+    overdue = (remaining > 0) & (due_date < today).fillna(False).to_numpy(dtype=bool)
+    return np.where(overdue, 'overdue', status)
+
+def changed_rows(fee_rows):
+    """Payment rows whose stored total, remaining or status differ from the recomputed ones"""
+    stored_total = pd.to_numeric(fee_rows['total_amount']).astype(float).fillna(0.0)
+    stored_remaining = pd.to_numeric(fee_rows['remaining_amount']).astype(float).fillna(0.0)
+    changed = ((stored_total - fee_rows['new_total']).abs() > AMOUNT_TOLERANCE) \
+        | ((stored_remaining - fee_rows['new_remaining']).abs() > AMOUNT_TOLERANCE) \
+        | (fee_rows['status'].fillna('') != fee_rows['new_status'])
+    return fee_rows[changed]
+
+def write_back(conn, fee_rows, skip_triggers=False):
+    """Bulk-update changed student_fees rows in one transaction; returns the number updated"""
+    from psycopg2.extras import execute_values  # Only needed when writing
+
+    rows = changed_rows(fee_rows)
+    if rows.empty:
+        logger.info("All student_fees rows are already up to date")
+        return 0
+
+    values = list(zip(rows['fee_id'].astype(str), rows['new_total'].tolist(), rows['new_remaining'].tolist(),
+                      rows['new_status'].tolist()))
+    cursor = conn.cursor()
+    try:
+        if skip_triggers:
+            # The per-row fee triggers would recompute every updated row with their own rules
+            cursor.execute("SET LOCAL session_replication_role = replica")
+        execute_values(cursor, UPDATE_SQL, values, template='(%s, %s::numeric, %s::numeric, %s)',
+                       page_size=UPDATE_PAGE_SIZE)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    logger.info(f"Updated {len(values)} of {len(fee_rows)} student_fees rows")
+    return len(values)
+
+def summarize(dues):
+    """Per-student totals across components"""
+    return dues.groupby('student_id', as_index=False)[['due', 'paid', 'remaining']].sum()
+
+def make_synthetic_fee_data(students, seed=7):
+    """Tenant-shaped inputs for timing: 40 classes, 6 components, ~2.5 payments per student"""
+    rng = np.random.default_rng(seed)
+    classes = [f"class-{i}" for i in range(40)]
+    components = ['Tuition Fee', 'Bus Fee', 'Admission Fee', 'Exam Fee', 'Library Fee', 'Lab Fee']
+    structure = pd.DataFrame([
+        {'class_id': cls, 'academic_year': '2025-26', 'fee_component': component,
+         'base_amount': float(rng.integers(5, 40) * 500), 'discount_applied': 0.0, 'due_date': date(2025, 9, 30)}
+        for cls in classes for component in components])
+
+    student_ids = np.array([f"student-{i}" for i in range(students)])
+    class_ids = rng.choice(classes, students)
+    discounted = rng.choice(students, students // 10, replace=False)
+    discounts = pd.DataFrame({
+        'student_id': student_ids[discounted], 'academic_year': '2025-26',
+        'fee_component': rng.choice(np.array(['Tuition Fee', None], dtype=object), len(discounted)),
+        'discount_type': rng.choice(['percentage', 'fixed_amount'], len(discounted)),
+        'discount_value': rng.choice([10.0, 25.0, 1000.0], len(discounted)),
+    })
+
+    count = int(students * 2.5)
+    payer = rng.integers(0, students, count)
+    payments = pd.DataFrame({
+        'student_id': student_ids[payer], 'class_id': class_ids[payer], 'fee_id': [f"fee-{i}" for i in range(count)],
+        'academic_year': '2025-26', 'fee_component': rng.choice(components[:3], count),
+        'amount_paid': rng.integers(1, 30, count) * 500.0,
+        'payment_date': pd.Timestamp('2025-06-01') + pd.to_timedelta(rng.integers(0, 200, count), unit='D'),
+        'receipt_number': np.arange(count), 'total_amount': 0.0, 'remaining_amount': 0.0, 'status': 'pending',
+    })
+    unpaid = np.setdiff1d(np.arange(students), payer)
+    payments = pd.concat([payments, pd.DataFrame({'student_id': student_ids[unpaid], 'class_id': class_ids[unpaid]})],
+                         ignore_index=True)
+    return structure, discounts, payments
+
+def main():
+    """Recompute fee dues for a tenant, or time the engine on synthetic data"""
+    parser = argparse.ArgumentParser(description='Recompute student fee dues for a whole tenant')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--dry-run', action='store_true', help='Compute and report, but do not write back')
+    parser.add_argument('--skip-triggers', action='store_true',
+                        help='Disable row triggers during the update (needs a role allowed to set session_replication_role)')
+    parser.add_argument('--report', default=REPORT_FILE, help='CSV of per-student, per-component dues')
+    parser.add_argument('--benchmark', type=int, metavar='STUDENTS', help='Time the engine on synthetic data')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        inputs = make_synthetic_fee_data(args.benchmark)
+        start = time.perf_counter()
+        dues, fee_rows = compute_fee_dues(*inputs)
+        print(f"{args.benchmark} students: {len(dues)} dues and {len(fee_rows)} payment rows "
+              f"in {time.perf_counter() - start:.2f}s ({len(changed_rows(fee_rows))} would change)")
+        return True
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    dues, fee_rows = compute_fee_dues(*load_fee_data(conn, args.tenant_id))
+    dues.to_csv(args.report, index=False)
+    totals = summarize(dues)
+    logger.info(f"{len(totals)} students: due {totals['due'].sum():,.2f}, paid {totals['paid'].sum():,.2f}, "
+                f"remaining {totals['remaining'].sum():,.2f} (report: {args.report})")
+
+    if args.dry_run:
+        logger.info(f"Dry run: {len(changed_rows(fee_rows))} student_fees rows would be updated")
+        return True
+    write_back(conn, fee_rows, args.skip_triggers)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,486 @@
+#!/usr/bin/env python3
+"""
+Batch Fee Receipt Generator
+Reprints student_fees receipts as vector PDFs: rows are read in keyset pages by
+receipt_number and each page is written as one multi-page PDF by a worker process
+"""
+import io
+import os
+import sys
+import time
+import zlib
+import argparse
+import logging
+import urllib.request
+from decimal import Decimal, ROUND_HALF_UP
+from datetime import date, datetime
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+OUTPUT_DIR = 'fee_receipts'
+RECEIPTS_PER_FILE = 1000  # Keyset page size; each page becomes one PDF
+PENDING_FILES_PER_WORKER = 2  # Pages fetched ahead of the workers (caps memory)
+LOGO_PX = 240  # Logo is downscaled once to this size and embedded once per PDF
+RECEIPT_NOTE = 'Note: Fees once deposited will not be refunded under any Circumstances'
+CASHIER_NAME = 'System Generated'
+
+RECEIPT_QUERY = """
+    SELECT sf.receipt_number, sf.student_id, sf.academic_year, sf.fee_component, sf.amount_paid,
+           sf.payment_date, sf.payment_mode, sf.remaining_amount,
+           s.name, s.admission_no, c.class_name, c.section,
+           (SELECT p.name FROM parents p WHERE p.student_id = s.id AND p.relation = 'Father' LIMIT 1)
+    FROM student_fees sf
+    LEFT JOIN students s ON s.id = sf.student_id
+    LEFT JOIN classes c ON c.id = s.class_id
+    WHERE sf.tenant_id = %(tenant_id)s AND sf.receipt_number > %(after)s
+      AND COALESCE(sf.status, '') <> 'cancelled'
+      AND (%(academic_year)s IS NULL OR sf.academic_year = %(academic_year)s)
+    ORDER BY sf.receipt_number
+    LIMIT %(limit)s
+"""
+RECEIPT_COLUMNS = ['receipt_number', 'student_id', 'academic_year', 'fee_component', 'amount_paid', 'payment_date',
+                   'payment_mode', 'remaining_amount', 'student_name', 'admission_no', 'class_name', 'section',
+                   'father_name']
+
+# Every payment of the page's students, so "total fees paid" can be summed up to each receipt
+PAYMENTS_QUERY = """
+    SELECT student_id, academic_year, receipt_number, amount_paid
+    FROM student_fees
+    WHERE tenant_id = %(tenant_id)s AND student_id = ANY(%(student_ids)s::uuid[])
+      AND COALESCE(status, '') <> 'cancelled'
+"""
+
+SCHOOL_QUERY = """
+    SELECT name, address, city, state, pincode, phone, email, logo_url
+    FROM school_details WHERE tenant_id = %s ORDER BY updated_at DESC NULLS LAST LIMIT 1
+"""
+
+# Page geometry in PDF points (A4), origin bottom left
+PAGE_SIZE = (595.28, 841.89)
+BOX = (42.5, 415.0, 552.8, 799.4)  # left, bottom, right, top of the receipt border
+LEFT, RIGHT = BOX[0] + 14.5, BOX[2] - 14.5
+INFO_COLUMNS = [LEFT, 250.0, 405.0]
+INFO_ROWS = [684.0, 660.0, 636.0]
+TABLE = {'top': 615.0, 'header': 600.0, 'row': 575.0, 'total': 550.0, 'bottom': 541.0, 'rules': [591.0, 566.0]}
+TABLE_SPLIT = LEFT + 0.7 * (RIGHT - LEFT)
+
+# Bold labels per info row and column; values are drawn right after each label
+RECEIPT_LABELS = [
+    ('Student Name:', 'UID:', 'Receipt No:'),
+    ('Fathers Name:', 'Class:', 'Year:'),
+    (None, None, 'Date:'),
+]
+RECEIPT_FIELDS = [
+    ('student_name', 'admission_no', 'receipt_number'),
+    ('father_name', 'class_label', 'academic_year'),
+    (None, None, 'payment_date'),
+]
+
+# Standard 14 font advance widths (1/1000 em) for ' ' through '~', so text can be centred without embedding fonts
+HELVETICA_WIDTHS = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+HELVETICA_BOLD_WIDTHS = [
+    278, 333, 474, 556, 556, 889, 722, 238, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 333, 333, 584, 584, 584, 611,
+    975, 722, 722, 722, 722, 667, 611, 778, 722, 278, 556, 722, 611, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 333, 278, 333, 584, 556,
+    333, 556, 611, 556, 611, 556, 333, 611, 611, 278, 278, 556, 278, 889, 611, 611,
+    611, 611, 389, 556, 333, 611, 556, 778, 556, 556, 500, 389, 280, 389, 584,
+]
+
+ONES = ['', 'One', 'Two', 'Three', 'Four', 'Five', 'Six', 'Seven', 'Eight', 'Nine']
+TEENS = ['Ten', 'Eleven', 'Twelve', 'Thirteen', 'Fourteen', 'Fifteen', 'Sixteen', 'Seventeen', 'Eighteen', 'Nineteen']
+TENS = ['', '', 'Twenty', 'Thirty', 'Forty', 'Fifty', 'Sixty', 'Seventy', 'Eighty', 'Ninety']
+
+# Set in each worker by init_worker
+_template = None
+
+def number_to_words(n):
+    """Indian-system words for a whole amount, as the app's receipts print them"""
+    n = int(n)
+    if n == 0:
+        return 'Zero'
+    if n < 10:
+        return ONES[n]
+    if n < 20:
+        return TEENS[n - 10]
+    if n < 100:
+        return TENS[n // 10] + (' ' + ONES[n % 10] if n % 10 else '')
+    for size, word in ((10000000, 'Crore'), (100000, 'Lakh'), (1000, 'Thousand'), (100, 'Hundred')):
+        if n >= size:
+            rest = n % size
+            return f"{number_to_words(n // size)} {word}" + (f" {number_to_words(rest)}" if rest else '')
+
+def format_amount(value):
+    """Rs. amount with Indian digit grouping (12,34,567), paise only when present"""
+    # Rounded to paise once, so a carry (999.999 -> 1,000) reaches the rupees
+    amount = Decimal(str(value or 0)).quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    rupees, paise = divmod(int(abs(amount) * 100), 100)
+    whole = f"{rupees}"
+    if len(whole) > 3:
+        head, tail = whole[:-3], whole[-3:]
+        groups = []
+        while len(head) > 2:
+            groups.insert(0, head[-2:])
+            head = head[:-2]
+        whole = ','.join(([head] if head else []) + groups + [tail])
+    return f"Rs. {'-' if amount < 0 else ''}{whole}" + (f".{paise:02d}" if paise else '')
+
+def format_date(value):
+    if isinstance(value, (date, datetime)):
+        return value.strftime('%d/%m/%Y')
+    text = str(value or '')[:10]
+    return '/'.join(reversed(text.split('-'))) if text.count('-') == 2 else text
+
+def text_width(text, size, bold=False):
+    widths = HELVETICA_BOLD_WIDTHS if bold else HELVETICA_WIDTHS
+    return sum(widths[ord(ch) - 32] if 32 <= ord(ch) <= 126 else 556 for ch in text) * size / 1000
+
+def pdf_string(text):
+    """A PDF literal string in WinAnsi encoding (characters outside it become '?')"""
+    data = str(text).encode('cp1252', errors='replace')
+    return b'(' + data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)') + b')'
+
+def text_op(x, y, text, size=10, bold=False, align='left'):
+    """Content stream operators drawing one line of text"""
+    if align != 'left':
+        width = text_width(text, size, bold)
+        x -= width if align == 'right' else width / 2
+    return b'BT /%s %g Tf %.2f %.2f Td %s Tj ET\n' % (b'F2' if bold else b'F1', size, x, y, pdf_string(text))
+
+def fit_size(text, size, max_width, bold=False):
+    while size > 6 and text_width(text, size, bold) > max_width:
+        size -= 0.5
+    return size
+
+def load_school(conn, tenant_id):
+    """school_details for the tenant as a dict (empty when the school has not filled it in)"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SCHOOL_QUERY, (tenant_id,))
+        row = cursor.fetchone()
+    finally:
+        cursor.close()
+    keys = ['name', 'address', 'city', 'state', 'pincode', 'phone', 'email', 'logo_url']
+    return dict(zip(keys, row)) if row else {}
+
+def prepare_logo(logo_url):
+    """Fetch and downscale the school logo once: (width, height, JPEG bytes), or None"""
+    if not logo_url:
+        return None
+    try:
+        if logo_url.startswith(('http://', 'https://')):
+            with urllib.request.urlopen(logo_url, timeout=15) as response:
+                data = response.read()
+        else:
+            with open(logo_url, 'rb') as f:
+                data = f.read()
+        with Image.open(io.BytesIO(data)) as img:
+            img = img.convert('RGBA')
+            img.thumbnail((LOGO_PX, LOGO_PX), Image.LANCZOS)
+            flat = Image.new('RGB', img.size, 'white')
+            flat.paste(img, mask=img.getchannel('A'))  # PDF JPEGs have no alpha, so transparency becomes white
+    except Exception as e:
+        logger.warning(f"Could not load school logo {logo_url}: {e}")
+        return None
+
+    buffer = io.BytesIO()
+    flat.save(buffer, 'JPEG', quality=90)
+    return flat.width, flat.height, buffer.getvalue()
+
+def compile_template(school, logo):
+    """
+    Content stream for everything that is the same on every receipt.
+
+    Border, school header, field labels and the fee table grid are drawn once
+    into a form XObject; each receipt page only adds its own values.
+    """
+    ops = [b'0 g 0 G\n']
+    left, bottom, right, top = BOX
+    ops.append(b'2 w %.2f %.2f %.2f %.2f re S\n' % (left, bottom, right - left, top - bottom))
+
+    # Header: logo on the left, school name and contact centred
+    text_left = LEFT
+    if logo:
+        width, height, _ = logo
+        scale = 72 / max(width, height)
+        ops.append(b'q %.2f 0 0 %.2f %.2f %.2f cm /Logo Do Q\n' % (width * scale, height * scale, LEFT, 712))
+        text_left = LEFT + 80
+    header_width = RIGHT - text_left
+    header_center = (text_left + RIGHT) / 2
+    name = str(school.get('name') or 'School').upper()
+    ops.append(text_op(header_center, 764, name, fit_size(name, 18, header_width, True), True, 'center'))
+    address = ', '.join(str(part) for part in (school.get('address'), school.get('city'), school.get('state'))
+                        if part)
+    if school.get('pincode'):
+        address = f"{address}-{school['pincode']}" if address else str(school['pincode'])
+    contact = ', '.join(part for part in (f"Contact No.: {school['phone']}" if school.get('phone') else '',
+                                          f"Email: {school['email']}" if school.get('email') else '') if part)
+    for y, line in ((748, address), (735, contact)):
+        if line:
+            ops.append(text_op(header_center, y, line, fit_size(line, 9.5, header_width), False, 'center'))
+    ops.append(b'2 w %.2f 704 m %.2f 704 l S\n' % (LEFT, RIGHT))
+
+    # Student information labels
+    ops.append(b'0.8 w %.2f 676 m %.2f 676 l S %.2f 652 m %.2f 652 l S\n' % (LEFT, RIGHT, LEFT, RIGHT))
+    for row, labels in zip(INFO_ROWS, RECEIPT_LABELS):
+        for x, label in zip(INFO_COLUMNS, labels):
+            if label:
+                ops.append(text_op(x, row, label, 10, True))
+
+    # Fee table grid and headings
+    t = TABLE
+    ops.append(b'1.5 w %.2f %.2f %.2f %.2f re S\n' % (LEFT, t['bottom'], RIGHT - LEFT, t['top'] - t['bottom']))
+    ops.append(b'0.8 w %.2f %.2f m %.2f %.2f l S\n' % (TABLE_SPLIT, t['bottom'], TABLE_SPLIT, t['top']))
+    for y in t['rules']:
+        ops.append(b'%.2f %.2f m %.2f %.2f l S\n' % (LEFT, y, RIGHT, y))
+    ops.append(text_op((LEFT + TABLE_SPLIT) / 2, t['header'], 'Particulars', 11, True, 'center'))
+    ops.append(text_op((TABLE_SPLIT + RIGHT) / 2, t['header'], 'Fees Amount', 11, True, 'center'))
+    ops.append(text_op((LEFT + TABLE_SPLIT) / 2, t['total'], 'Total:', 10, True, 'center'))
+
+    # Footer
+    ops.append(b'0.8 w %.2f 505 m %.2f 505 l S\n' % (LEFT, RIGHT))
+    ops.append(text_op(LEFT, 476, RECEIPT_NOTE, 9))
+    ops.append(text_op(RIGHT, 428, 'Authorised Signatory', 10, True, 'right'))
+    return b''.join(ops)
+
+def receipt_ops(receipt):
+    """Content stream for one receipt's values, drawn over the compiled template"""
+    ops = [b'q /Tpl Do Q\n']
+    values = dict(receipt)
+    values['class_label'] = '-'.join(str(part) for part in (receipt.get('class_name'), receipt.get('section'))
+                                     if part)
+    values['payment_date'] = format_date(receipt.get('payment_date'))
+    values['student_name'] = str(receipt.get('student_name') or '').upper()
+    values['father_name'] = str(receipt.get('father_name') or '').upper()
+
+    for row, labels, fields in zip(INFO_ROWS, RECEIPT_LABELS, RECEIPT_FIELDS):
+        for column, (x, label, field) in enumerate(zip(INFO_COLUMNS, labels, fields)):
+            if not field:
+                continue
+            start = x + text_width(label, 10, True) + 4
+            limit = (INFO_COLUMNS[column + 1] if column + 1 < len(INFO_COLUMNS) else RIGHT) - start - 6
+            value = str(values.get(field) or '')
+            ops.append(text_op(start, row, value, fit_size(value, 10, limit)))
+
+    amount = format_amount(receipt.get('amount_paid'))
+    component = str(receipt.get('fee_component') or '')
+    t = TABLE
+    ops.append(text_op(LEFT + 8, t['row'], component, fit_size(component, 10, TABLE_SPLIT - LEFT - 16)))
+    ops.append(text_op((TABLE_SPLIT + RIGHT) / 2, t['row'], amount, 10, False, 'center'))
+    ops.append(text_op((TABLE_SPLIT + RIGHT) / 2, t['total'], amount, 10, True, 'center'))
+
+    ops.append(text_op(LEFT, 520, f"Total fees paid: {format_amount(receipt.get('paid_to_date'))}", 10, True))
+    ops.append(text_op(RIGHT, 520, f"Total fees Due: {format_amount(receipt.get('remaining_amount'))}", 10, True,
+                       'right'))
+    words = f"In Words: Rupees {number_to_words(receipt.get('amount_paid') or 0)} Only"
+    ops.append(text_op(LEFT, 490, words, fit_size(words, 10, RIGHT - LEFT)))
+    ops.append(text_op(LEFT, 458, f"Payment Mode: {receipt.get('payment_mode') or '-'}", 10))
+    ops.append(text_op(LEFT, 444, f"Cashier Name: {CASHIER_NAME}    Date: {values['payment_date']}", 10))
+    return b''.join(ops)
+
+class PdfFile:
+    """Minimal streaming PDF writer: objects are written as they are added, the xref at close"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = open(f"{path}.tmp", 'wb')
+        self.file.write(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+        self.offsets = {}
+        self.next_id = 1
+
+    def reserve(self):
+        number = self.next_id
+        self.next_id += 1
+        return number
+
+    def add(self, body, stream=None, number=None):
+        number = number or self.reserve()
+        self.offsets[number] = self.file.tell()
+        self.file.write(b'%d 0 obj\n' % number + body)
+        if stream is not None:
+            self.file.write(b'\nstream\n' + stream + b'\nendstream')
+        self.file.write(b'\nendobj\n')
+        return number
+
+    def close(self, root):
+        xref = self.file.tell()
+        self.file.write(b'xref\n0 %d\n0000000000 65535 f \n' % self.next_id)
+        for number in range(1, self.next_id):
+            self.file.write(b'%010d 00000 n \n' % self.offsets[number])
+        self.file.write(b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (self.next_id, root, xref))
+        self.file.close()
+        os.replace(f"{self.path}.tmp", self.path)
+
+def write_receipts_pdf(path, receipts, template):
+    """Write receipts to one PDF, sharing the compiled template, fonts and logo across its pages"""
+    content, logo = template
+    pdf = PdfFile(path)
+    catalog, pages = pdf.reserve(), pdf.reserve()
+    fonts = b'<< /F1 %d 0 R /F2 %d 0 R >>' % (
+        pdf.add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>'),
+        pdf.add(b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>'))
+
+    xobjects = b''
+    if logo:
+        width, height, jpeg = logo
+        logo_id = pdf.add(b'<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB '
+                          b'/BitsPerComponent 8 /Filter /DCTDecode /Length %d >>' % (width, height, len(jpeg)), jpeg)
+        xobjects = b'/XObject << /Logo %d 0 R >>' % logo_id
+    compressed = zlib.compress(content)
+    tpl_id = pdf.add(b'<< /Type /XObject /Subtype /Form /BBox [0 0 %.2f %.2f] /Resources << /Font %s %s >> '
+                     b'/Filter /FlateDecode /Length %d >>' % (*PAGE_SIZE, fonts, xobjects, len(compressed)),
+                     compressed)
+    resources = b'<< /Font %s /XObject << /Tpl %d 0 R >> >>' % (fonts, tpl_id)
+
+    kids = []
+    for receipt in receipts:
+        stream = zlib.compress(receipt_ops(receipt))
+        content_id = pdf.add(b'<< /Filter /FlateDecode /Length %d >>' % len(stream), stream)
+        kids.append(pdf.add(b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources %s '
+                            b'/Contents %d 0 R >>' % (pages, *PAGE_SIZE, resources, content_id)))
+
+    pdf.add(b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(b'%d 0 R' % kid for kid in kids), len(kids)),
+            number=pages)
+    pdf.add(b'<< /Type /Catalog /Pages %d 0 R >>' % pages, number=catalog)
+    pdf.close(catalog)
+    return len(kids)
+
+def init_worker(school, logo):
+    """Compile the receipt template once per worker process"""
+    global _template
+    _template = (compile_template(school, logo), logo)
+
+def render_file(receipts, output_dir):
+    """Worker: write one keyset page of receipts as a PDF named after its receipt number range"""
+    path = os.path.join(output_dir, f"receipts_{receipts[0]['receipt_number']}-{receipts[-1]['receipt_number']}.pdf")
+    return path, write_receipts_pdf(path, receipts, _template)
+
+def fetch_receipt_pages(conn, tenant_id, academic_year=None, page_size=RECEIPTS_PER_FILE, after=0):
+    """
+    Yield receipts in pages ordered by receipt_number.
+
+    Each page continues after the last receipt number of the previous one
+    (keyset pagination), so every page is an index range scan however far
+    into the table it is, unlike OFFSET paging.
+    """
+    cursor = conn.cursor()
+    try:
+        while True:
+            cursor.execute(RECEIPT_QUERY, {'tenant_id': tenant_id, 'after': after, 'academic_year': academic_year,
+                                           'limit': page_size})
+            receipts = [dict(zip(RECEIPT_COLUMNS, row)) for row in cursor.fetchall()]
+            if not receipts:
+                return
+
+            student_ids = sorted({str(r['student_id']) for r in receipts if r['student_id']})
+            cursor.execute(PAYMENTS_QUERY, {'tenant_id': tenant_id, 'student_ids': student_ids})
+            add_paid_to_date(receipts, cursor.fetchall())
+
+            yield receipts
+            after = receipts[-1]['receipt_number']
+    finally:
+        cursor.close()
+
+def add_paid_to_date(receipts, payments):
+    """Set each receipt's paid_to_date: the student's payments for that year up to and including it"""
+    history = defaultdict(list)
+    for student_id, academic_year, receipt_number, amount in payments:
+        history[(str(student_id), academic_year)].append((receipt_number, float(amount or 0)))
+    for receipt in receipts:
+        paid = history.get((str(receipt['student_id']), receipt['academic_year']), [])
+        receipt['paid_to_date'] = sum(amount for number, amount in paid if number <= receipt['receipt_number'])
+
+def generate_receipts(pages, school, output_dir=OUTPUT_DIR, workers=None):
+    """Render pages of receipts to PDFs across worker processes; returns (files, receipts)"""
+    os.makedirs(output_dir, exist_ok=True)
+    logo = prepare_logo(school.get('logo_url'))
+    workers = workers or os.cpu_count() or 1
+
+    files = receipts = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(school, logo)) as pool:
+        pending = set()
+        for page in pages:
+            if len(pending) >= workers * PENDING_FILES_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    files, receipts = files + 1, receipts + future.result()[1]
+            pending.add(pool.submit(render_file, page, output_dir))
+        for future in pending:
+            files, receipts = files + 1, receipts + future.result()[1]
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"Wrote {receipts} receipts in {files} PDFs to {output_dir} in {elapsed:.1f}s "
+                f"({receipts / elapsed if elapsed else 0:.0f} receipts/s)")
+    return files, receipts
+
+def synthetic_pages(count, page_size=RECEIPTS_PER_FILE):
+    """Receipt pages shaped like fetch_receipt_pages output, for timing without a database"""
+    components = ['Tuition Fee', 'Bus Fee', 'Admission Fee', 'Exam Fee', 'Fine']
+    for first in range(1, count + 1, page_size):
+        yield [{
+            'receipt_number': number,
+            'student_id': f"student-{number % 700}",
+            'academic_year': '2025-26',
+            'fee_component': components[number % len(components)],
+            'amount_paid': 300 + (number * 37) % 15000,
+            'payment_date': date(2025, 6 + number % 6, 1 + number % 28),
+            'payment_mode': ['Cash', 'UPI', 'Online', 'Card'][number % 4],
+            'remaining_amount': (number * 53) % 20000,
+            'student_name': f"Student {number % 700}",
+            'admission_no': f"SPS{number % 700:04d}",
+            'class_name': f"{number % 10 + 1}th",
+            'section': 'A',
+            'father_name': f"Parent {number % 700}",
+            'paid_to_date': 2000 + (number * 11) % 10000,
+        } for number in range(first, min(first + page_size, count + 1))]
+
+def main():
+    """Reprint a tenant's receipts, or time the renderer on synthetic receipts"""
+    parser = argparse.ArgumentParser(description='Batch-render fee receipts to PDF')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--academic-year', help='Only receipts for this academic year')
+    parser.add_argument('--after', type=int, default=0, help='Resume after this receipt number')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR)
+    parser.add_argument('--per-file', type=int, default=RECEIPTS_PER_FILE, help='Receipts per PDF')
+    parser.add_argument('--workers', type=int, help='Rendering processes (default: CPU count)')
+    parser.add_argument('--logo', help='Logo file or URL, overriding school_details.logo_url')
+    parser.add_argument('--benchmark', type=int, metavar='RECEIPTS', help='Time rendering of synthetic receipts')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        school = {'name': "Global's Sanmarg Public School", 'address': 'Near Fateh Darwaza, Pansal Taleem',
+                  'city': 'Bidar', 'pincode': '585401', 'phone': '+91 9341111576', 'email': 'school@example.com',
+                  'logo_url': args.logo}
+        generate_receipts(synthetic_pages(args.benchmark, args.per_file), school, args.output_dir, args.workers)
+        return True
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    school = load_school(conn, args.tenant_id)
+    if args.logo:
+        school['logo_url'] = args.logo
+    pages = fetch_receipt_pages(conn, args.tenant_id, args.academic_year, args.per_file, args.after)
+    files, receipts = generate_receipts(pages, school, args.output_dir, args.workers)
+    return receipts > 0
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -1,13 +1,40 @@
+import argparse
+import copy
 import json
+import os
 import re
+import string
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from pptx import Presentation
+from pptx.chart.data import CategoryChartData
+from pptx.enum.chart import XL_CHART_TYPE, XL_LEGEND_POSITION
 from pptx.util import Inches, Pt
+from pitch_metrics import ACADEMIC_YEAR, METRICS_CACHE_FILE, METRICS_TTL_SECONDS, deck_metrics, load_metrics
 
-BASE_DIR = Path(r"C:\Users\kened\Desktop\school_xyz\schoolmangmentsystem")
+try:
+    import yaml
+except ImportError:
+    yaml = None  # JSON specs still work without PyYAML
+
+BASE_DIR = Path(__file__).resolve().parent
 PACKAGE_JSON = BASE_DIR / "package.json"
+SPEC_DEFAULT = BASE_DIR / "pitch_deck.yaml"
 OUTPUT_NAME_DEFAULT = "Pitch_Deck.pptx"
 
+# Layouts are looked up by name in the template, falling back to the default template's positions
+LAYOUTS = {"title": ("Title Slide", 0), "bullets": ("Title and Content", 1), "chart": ("Title Only", 5)}
+
+CHART_TYPES = {
+    "column": XL_CHART_TYPE.COLUMN_CLUSTERED,
+    "bar": XL_CHART_TYPE.BAR_CLUSTERED,
+    "line": XL_CHART_TYPE.LINE_MARKERS,
+    "pie": XL_CHART_TYPE.PIE,
+}
+
+# Parsed templates, kept per process: (path, mtime) -> Presentation
+_TEMPLATE_CACHE = {}
+
 
 def load_app_name():
     try:
@@ -21,16 +48,59 @@ def load_app_name():
     return display_name, f"{fname}_Pitch_Deck.pptx"
 
 
+def load_spec(path):
+    """Read a deck spec from YAML or JSON."""
+    path = Path(path)
+    text = path.read_text(encoding="utf-8")
+    if path.suffix.lower() == ".json":
+        return json.loads(text)
+    if yaml is None:
+        raise RuntimeError(f"PyYAML is required to read {path} (pip install pyyaml), or use a .json spec")
+    return yaml.safe_load(text)
+
+
+class _Variables(dict):
+    def __missing__(self, key):
+        # Unknown placeholders are left as written rather than failing the whole deck
+        return "{" + key + "}"
+
+
+def fill(value, variables):
+    """Substitute {placeholders} in strings, lists and dicts of the spec."""
+    if isinstance(value, str):
+        return string.Formatter().vformat(value, (), variables)
+    if isinstance(value, list):
+        return [fill(item, variables) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, variables) for key, item in value.items()}
+    return value
+
+
+def load_template(path=None):
+    """Parsed template for this process; each deck gets a copy instead of re-reading the file."""
+    key = (str(path), os.path.getmtime(path)) if path else (None, 0)
+    if key not in _TEMPLATE_CACHE:
+        _TEMPLATE_CACHE[key] = Presentation(str(path)) if path else Presentation()
+    return copy.deepcopy(_TEMPLATE_CACHE[key])
+
+
+def get_layout(prs, kind):
+    name, index = LAYOUTS[kind]
+    for layout in prs.slide_layouts:
+        if layout.name == name:
+            return layout
+    return prs.slide_layouts[index]
+
+
 def add_title_slide(prs, title, subtitle=""):
-    slide = prs.slides.add_slide(prs.slide_layouts[0])  # Title slide
+    slide = prs.slides.add_slide(get_layout(prs, "title"))
     slide.shapes.title.text = title
     if subtitle:
         slide.placeholders[1].text = subtitle
 
 
 def add_bulleted_slide(prs, title, bullets):
-    # Title and Content layout
-    slide = prs.slides.add_slide(prs.slide_layouts[1])
+    slide = prs.slides.add_slide(get_layout(prs, "bullets"))
     slide.shapes.title.text = title
     tf = slide.shapes.placeholders[1].text_frame
     tf.clear()
@@ -63,192 +133,147 @@ def add_bulleted_slide(prs, title, bullets):
                 add_para(sub, 1)
 
 
-def build_presentation():
-    app_name, suggested_output = load_app_name()
-    prs = Presentation()
+def add_chart_slide(prs, title, data, chart="column"):
+    slide = prs.slides.add_slide(get_layout(prs, "chart"))
+    slide.shapes.title.text = title
+
+    chart_data = CategoryChartData()
+    chart_data.categories = data["categories"]
+    for name, values in data["series"].items():
+        chart_data.add_series(name, values)
 
-    # Title slide
-    add_title_slide(
-        prs,
-        title=f"{app_name}",
-        subtitle="Unified, cross-platform school management platform (Web • Android • iOS)"
+    margin = Inches(0.5)
+    top = Inches(1.5)
+    graphic = slide.shapes.add_chart(
+        CHART_TYPES[chart], margin, top, prs.slide_width - 2 * margin, prs.slide_height - top - margin, chart_data
     )
+    graphic.chart.has_legend = len(data["series"]) > 1 or chart == "pie"
+    if graphic.chart.has_legend:
+        graphic.chart.legend.position = XL_LEGEND_POSITION.BOTTOM
+        graphic.chart.legend.include_in_layout = False
+    graphic.chart.font.size = Pt(12)
+
+
+SLIDE_BUILDERS = {
+    "title": lambda prs, slide, charts: add_title_slide(prs, slide.get("title", ""), slide.get("subtitle", "")),
+    "bullets": lambda prs, slide, charts: add_bulleted_slide(prs, slide.get("title", ""), slide.get("bullets", [])),
+    "chart": lambda prs, slide, charts: add_chart_slide(
+        prs, slide.get("title", ""), charts[slide["metric"]], slide.get("chart", "column")
+    ),
+}
+
 
-    # Problem
-    add_bulleted_slide(prs, "Problem", [
-        "Schools juggle fragmented tools (attendance, communication, records)",
-        "Manual processes lead to errors and delays",
-        "Poor data visibility for teachers and admins",
-        "Legacy ERPs have clunky UX and slow adoption",
-    ])
-
-    # Solution
-    add_bulleted_slide(prs, "Solution", [
-        f"{app_name}: a modern, modular school OS built with React Native + Expo",
-        [
-            "Cross-platform: single codebase for Web/Android/iOS",
-            "Multi-tenant backend powered by Supabase",
-            "Real-time, reliable, and secure",
-        ],
-        [
-            "Teacher-first UX",
-            "Fast, responsive lists and forms",
-            "Clean, configurable logging for focused debugging",
-        ],
-    ])
-
-    # Product Highlights
-    add_bulleted_slide(prs, "Product Highlights", [
-        [
-            "Teacher Dashboard",
-            "Leave Application: enhanced modal, validation, smooth scrolling",
-            "My Students: fast list, search/filter, detail modal with proper scrolling",
-        ],
-        [
-            "Attendance & Records",
-            "Optimized flows with clear success/error feedback",
-            "Export to PDF (reports) and data utilities",
-        ],
-        [
-            "Data Import",
-            "Bulk student import (~700 records) with validation",
-            "Default class creation, tenant assignment, schema alignment",
-        ],
-    ])
-
-    # Market (placeholders – to adjust)
-    add_bulleted_slide(prs, "Market", [
-        "Target: K-12 schools and private institutions",
-        "Pain is universal: attendance, communication, records, reporting",
-        "Top of funnel via pilots, local partnerships, and educator communities",
-    ])
-
-    # Business Model (placeholders – to adjust)
-    add_bulleted_slide(prs, "Business Model", [
-        "SaaS, per-student monthly or annual pricing",
-        [
-            "Tiers: Basic (attendance, student records)",
-            "Pro (communications, reporting, PDF exports)",
-            "Enterprise (advanced analytics, SSO, priority support)",
-        ],
-    ])
-
-    # Traction (derived from project artifacts)
-    add_bulleted_slide(prs, "Traction", [
-        "Core teacher workflows implemented",
-        "Clean console via categorized logging across 200+ files",
-        "Bulk import tool processed ~700 student records",
-        "Foundation for multi-tenant deployment via Supabase",
-    ])
-
-    # Go-To-Market
-    add_bulleted_slide(prs, "Go-To-Market", [
-        [
-            "Pilot Programs",
-            "Run 2-3 pilots to validate adoption and ROI",
-            "Gather testimonials and case studies",
-        ],
-        [
-            "Channel Partners",
-            "Local IT resellers and education consultants",
-        ],
-        [
-            "Community & Content",
-            "Teacher-led webinars, WhatsApp groups, and demos",
-        ],
-    ])
-
-    # Competition & Differentiation
-    add_bulleted_slide(prs, "Competition & Differentiation", [
-        "Legacy ERPs: feature-rich but slow and hard to use",
-        "Newer apps: fragmented, mobile-only, or limited",
-        [
-            "Differentiators",
-            "Cross-platform from day one (Expo)",
-            "Modern, responsive UX",
-            "Real-time Supabase backend, simple tenanting",
-            "Configurable logging and maintainable modular code",
-        ],
-    ])
-
-    # Technology
-    add_bulleted_slide(prs, "Technology", [
-        [
-            "Frontend",
-            "React Native (0.81), Expo (SDK 54)",
-            "RN Paper, Reanimated, Skia, charts, PDF export",
-        ],
-        [
-            "Backend",
-            "Supabase (Auth, DB, Realtime, Storage)",
-            "Multi-tenant aware data flows",
-        ],
-        [
-            "DX",
-            "Categorized logger, filtered console noise",
-            "Optimized lists and forms with platform-aware scrolling",
-        ],
-    ])
-
-    # Roadmap (placeholders – to adjust)
-    add_bulleted_slide(prs, "Roadmap", [
-        [
-            "Q4",
-            "Parent Portal (mobile/web)",
-            "Fees & Payments",
-            "Messaging & Notifications",
-        ],
-        [
-            "Q1",
-            "Exams, Grades, Timetable",
-            "Analytics dashboards",
-            "Role-based access improvements",
-        ],
-    ])
-
-    # Team (placeholders)
-    add_bulleted_slide(prs, "Team", [
-        [
-            "Founder/PM",
-            "EdTech background, school ops experience",
-        ],
-        [
-            "Engineering",
-            "Full-stack RN + Supabase",
-            "Mobile & Web performance tuning",
-        ],
-        [
-            "Advisors",
-            "School admin, curriculum expert",
-        ],
-    ])
-
-    # The Ask (placeholders – to adjust)
-    add_bulleted_slide(prs, "The Ask", [
-        "Seeking pilot partners and early adopters",
-        "Optional: raise capital to accelerate product and GTM",
-        [
-            "Use of funds",
-            "Engineering hires",
-            "Onboarding & support",
-            "GTM experiments",
-        ],
-    ])
-
-    # Contact
-    add_bulleted_slide(prs, "Contact", [
-        f"Product: {app_name}",
-        "Email: info@example.com",
-        "Phone: +1-000-000-0000",
-        "Website: https://example.com",
-    ])
-
-    # Save
-    out_path = BASE_DIR / suggested_output if suggested_output else BASE_DIR / OUTPUT_NAME_DEFAULT
+def build_deck(spec, deck, output_dir, template=None, metrics=None):
+    """Build one deck from the spec with the deck's variables and save it; returns the path."""
+    app_name, suggested_output = load_app_name()
+    variables = _Variables(app_name=app_name)
+    variables.update(spec.get("variables") or {})
+    charts = None
+    if metrics is not None:
+        summary = deck_metrics(metrics, deck.get("tenant_id"))
+        variables.update(summary["variables"])
+        charts = summary["series"]
+    variables.update(deck)
+
+    prs = load_template(template)
+    for slide in spec.get("slides", []):
+        # Slides built from live numbers are left out when metrics were not loaded
+        if slide.get("metrics") and charts is None:
+            continue
+        kind = slide.get("type", "bullets")
+        if kind not in SLIDE_BUILDERS:
+            raise ValueError(f"Unknown slide type '{kind}' (expected one of {', '.join(SLIDE_BUILDERS)})")
+        SLIDE_BUILDERS[kind](prs, fill(slide, variables), charts)
+
+    output_name = fill(deck.get("output") or spec.get("output") or suggested_output or OUTPUT_NAME_DEFAULT, variables)
+    out_path = Path(output_dir) / re.sub(r"[^A-Za-z0-9_.-]+", "_", output_name)
     prs.save(out_path)
     return out_path
 
 
+def deck_output_name(spec, deck, index, count):
+    """File name for one deck: its own `output`, else the spec's, suffixed with the deck name when there are several."""
+    app_name, suggested_output = load_app_name()
+    variables = _Variables(app_name=app_name)
+    variables.update(spec.get("variables") or {})
+    variables.update(deck)
+    if deck.get("output"):
+        output_name = fill(deck["output"], variables)
+    else:
+        output_name = fill(spec.get("output") or suggested_output or OUTPUT_NAME_DEFAULT, variables)
+        if count > 1:
+            stem, ext = os.path.splitext(output_name)
+            output_name = f"{stem}_{deck.get('name') or index + 1}{ext}"
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", output_name)
+
+
+def _build_job(job):
+    return build_deck(*job)
+
+
+def build_decks(spec_path=SPEC_DEFAULT, output_dir=BASE_DIR, template=None, decks=None, workers=None, metrics=None):
+    """Build every deck in the spec (or in a separate decks file), in parallel across processes."""
+    spec_path = Path(spec_path)
+    spec = load_spec(spec_path)
+    if template is None and spec.get("template"):
+        template = spec_path.parent / spec["template"]
+    deck_list = load_spec(decks) if decks else spec.get("decks")
+    if isinstance(deck_list, dict):
+        deck_list = deck_list.get("decks")
+    deck_list = deck_list or [{}]
+
+    output_dir = Path(output_dir)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    # Every deck gets its own file; two decks writing one path would overwrite (or race on) each other
+    names = [deck_output_name(spec, deck, index, len(deck_list)) for index, deck in enumerate(deck_list)]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Several decks would be written to {', '.join(duplicates)}; give each deck its own output")
+    deck_list = [{**deck, "output": name} for deck, name in zip(deck_list, names)]
+
+    # Metrics are fetched once by the caller and shipped to the workers, never queried per deck
+    jobs = [(spec, deck, output_dir, template, metrics) for deck in deck_list]
+
+    workers = min(workers or os.cpu_count() or 1, len(jobs))
+    if workers <= 1:
+        return [_build_job(job) for job in jobs]
+    # Each worker parses the template once and reuses it for every deck it builds
+    with ProcessPoolExecutor(max_workers=workers, initializer=load_template, initargs=(template,)) as pool:
+        return list(pool.map(_build_job, jobs, chunksize=max(1, len(jobs) // (workers * 4))))
+
+
+def build_presentation(output_dir=BASE_DIR):
+    return build_decks(SPEC_DEFAULT, output_dir, workers=1)[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate pitch decks from a YAML/JSON spec")
+    parser.add_argument("--spec", default=SPEC_DEFAULT, help="Slide content spec (.yaml or .json)")
+    parser.add_argument("--decks", help="Separate YAML/JSON list of per-school or per-partner deck variables")
+    parser.add_argument("--template", help=".pptx template providing the slide layouts and theme")
+    parser.add_argument("--output-dir", default=BASE_DIR, help="Directory the decks are written to")
+    parser.add_argument("--workers", type=int, help="Processes to build decks with (default: CPU count)")
+    parser.add_argument("--metrics", action="store_true", help="Add live tenant metrics and charts from the database")
+    parser.add_argument("--academic-year", default=ACADEMIC_YEAR)
+    parser.add_argument("--metrics-ttl", type=int, default=METRICS_TTL_SECONDS, help="Seconds cached metrics stay fresh")
+    parser.add_argument("--refresh-metrics", action="store_true", help="Re-query metrics even if cached")
+    args = parser.parse_args()
+
+    metrics = None
+    if args.metrics:
+        metrics = load_metrics(
+            academic_year=args.academic_year,
+            cache_file=str(BASE_DIR / METRICS_CACHE_FILE),
+            ttl=args.metrics_ttl,
+            refresh=args.refresh_metrics,
+        )
+        if metrics is None:
+            raise SystemExit("Could not load metrics from the database")
+
+    paths = build_decks(args.spec, args.output_dir, args.template, args.decks, args.workers, metrics)
+    for path in paths:
+        print(f"Pitch deck generated: {path}")
+
+
 if __name__ == "__main__":
-    path = build_presentation()
-    print(f"Pitch deck generated: {path}")
+    main()
@@ -10,6 +10,9 @@ import sys
 import json
 from datetime import datetime, date
 import logging
+from clean_students_parallel import clean_excel_parallel, normalize_student_columns
+from dedup_students import review_duplicates
+from reference_cache import ReferenceCache, PostgresSource, REFERENCE_CACHE_FILE
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -28,6 +31,10 @@ DB_CONFIG = {
 TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
 EXCEL_FILE = 'STUDENT  LIST 2025 -26 Global.xlsx'
 ACADEMIC_YEAR = '2025-26'
+CLEAN_WORKERS = 1  # Set above 1 to clean large workbooks across CPU cores (see clean_students_parallel.py)
+DEDUP_REVIEW_FILE = 'duplicate_students_review.csv'  # Probable duplicate students are listed here
+SKIP_PROBABLE_DUPLICATES = False  # Leave later copies of probable duplicates out of the import
+PERSIST_REFERENCE_CACHE = False  # Keep class/student lookups on disk between runs (see reference_cache.py)
 
 def connect_database():
     """Connect to PostgreSQL database"""
@@ -38,8 +45,11 @@ def connect_database():
         logger.error(f"Database connection failed: {e}")
         return None
 
-def clean_excel_data():
+def clean_excel_data(workers=CLEAN_WORKERS):
     """Clean and prepare Excel data for import"""
+    if workers > 1:
+        return clean_excel_parallel([EXCEL_FILE], TENANT_ID, ACADEMIC_YEAR, workers=workers, target='postgres')
+
     logger.info("Reading Excel file...")
     
     # Read the Excel file - skip first row as it contains headers
@@ -74,38 +84,18 @@ def clean_excel_data():
     df['academic_year'] = ACADEMIC_YEAR
     df['created_at'] = datetime.now()
     
-    # Clean gender data - convert to proper format
-    df['gender'] = df['gender'].fillna('').str.strip().str.upper()
-    df['gender'] = df['gender'].map({'M': 'Male', 'F': 'Female', 'MALE': 'Male', 'FEMALE': 'Female'})
-    df['gender'] = df['gender'].fillna('Male')  # Default to Male if not specified
-    
-    # Clean names
-    df['student_name'] = df['student_name'].fillna('').str.strip().str.title()
-    df['father_name'] = df['father_name'].fillna('').str.strip().str.title()
+    # Clean gender, names, address, religion, caste and mobiles once per distinct value
+    df = normalize_student_columns(df)
     
     # Clean dates
     df['dob'] = pd.to_datetime(df['dob'], errors='coerce')
     
-    # Clean addresses
-    df['address'] = df['address'].fillna('').str.strip()
-    
-    # Clean religion and caste
-    df['religion'] = df['religion'].fillna('').str.strip().str.title()
-    df['caste'] = df['caste'].fillna('').str.strip().str.upper()
-    
-    # Map caste values to allowed values
-    caste_mapping = {
-        'BC': 'BC', 'SC': 'SC', 'ST': 'ST', 'OC': 'OC', 
-        'GENERAL': 'OC', 'OTHER': 'Other', '': 'Other'
-    }
-    df['caste'] = df['caste'].map(caste_mapping).fillna('Other')
-    
     # Clean admission numbers
     df['admission_no'] = df['admission_no'].fillna('').astype(str).str.strip()
     df.loc[df['admission_no'] == '', 'admission_no'] = [f"ADM{datetime.now().year}{str(i).zfill(4)}" for i in range(1, len(df[df['admission_no'] == '']) + 1)]
     
     # Add mobile numbers to remarks for parent linking later
-    df['remarks'] = df.apply(lambda row: f"Mobile: {row['mobile']}, Alt Mobile: {row['alternate_mobile']}, Father: {row['father_name']}" if pd.notna(row['mobile']) else '', axis=1)
+    df['remarks'] = df.apply(lambda row: f"Mobile: {row['mobile']}, Alt Mobile: {row['alternate_mobile'] or ''}, Father: {row['father_name']}" if pd.notna(row['mobile']) else '', axis=1)
     
     # Handle missing required fields
     df['name'] = df['student_name']
@@ -114,29 +104,18 @@ def clean_excel_data():
     logger.info(f"Processed {len(df)} student records")
     return df
 
-def get_or_create_class_mapping(conn):
+def get_or_create_class_mapping(conn, cache=None):
     """Get existing classes or create default ones"""
+    cache = cache or ReferenceCache(PostgresSource(conn))
     cursor = conn.cursor()
     
-    # First, check existing classes for this tenant
-    cursor.execute("""
-        SELECT id, class_name, section 
-        FROM classes 
-        WHERE tenant_id = %s
-        ORDER BY class_name, section
-    """, (TENANT_ID,))
-    
-    existing_classes = cursor.fetchall()
+    # First, check existing classes for this tenant (served from the reference cache when warm)
+    existing_classes = cache.rows(TENANT_ID, 'classes')
     
     if existing_classes:
         logger.info(f"Found {len(existing_classes)} existing classes")
-        # Create a mapping of class names to IDs
-        class_mapping = {}
-        for class_id, class_name, section in existing_classes:
-            key = f"{class_name}-{section}".upper() if section else class_name.upper()
-            class_mapping[key] = class_id
-            class_mapping[class_name.upper()] = class_id  # Also map by class name only
-        return class_mapping
+        # Mapping of 'NAME-SECTION' and 'NAME' to class IDs
+        return cache.class_mapping(TENANT_ID)
     else:
         logger.info("No existing classes found. Creating default classes...")
         # Create default classes
@@ -158,15 +137,16 @@ def get_or_create_class_mapping(conn):
             class_mapping[class_name] = class_id
         
         conn.commit()
+        cache.invalidate(TENANT_ID, 'classes')
         logger.info(f"Created {len(default_classes)} default classes")
         return class_mapping
 
-def import_students_to_database(df, conn):
+def import_students_to_database(df, conn, cache=None):
     """Import student data to database"""
     cursor = conn.cursor()
     
     # Get class mapping
-    class_mapping = get_or_create_class_mapping(conn)
+    class_mapping = get_or_create_class_mapping(conn, cache)
     
     # Prepare SQL statement
     insert_sql = """
@@ -220,6 +200,10 @@ def import_students_to_database(df, conn):
     conn.commit()
     cursor.close()
     
+    # New students make any cached admission number lookups stale
+    if cache:
+        cache.invalidate(TENANT_ID, 'students')
+    
     logger.info(f"Import completed: {success_count} successful, {error_count} errors")
     return success_count, error_count
 
@@ -270,9 +254,15 @@ def main():
             logger.error("No data found in Excel file")
             return False
         
+        # Flag students listed more than once (spelling variants, other sections)
+        df = review_duplicates(df, DEDUP_REVIEW_FILE, SKIP_PROBABLE_DUPLICATES)
+        
         # Step 3: Import to database
         logger.info("Step 3: Importing students to database...")
-        success_count, error_count = import_students_to_database(df, conn)
+        reference_cache = ReferenceCache(PostgresSource(conn),
+                                         cache_file=REFERENCE_CACHE_FILE if PERSIST_REFERENCE_CACHE else None)
+        success_count, error_count = import_students_to_database(df, conn, reference_cache)
+        reference_cache.save()
         
         # Step 4: Verify import
         logger.info("Step 4: Verifying import...")
@@ -7,8 +7,17 @@ import pandas as pd
 import os
 import sys
 import json
+import time
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, date
 import logging
+from clean_students_parallel import (
+    COLUMN_MAPPING, clean_excel_parallel, clean_student_chunk, assign_admission_numbers, normalize_student_columns
+)
+from openpyxl import load_workbook
+from dedup_students import review_duplicates
+from reference_cache import ReferenceCache, SupabaseSource, REFERENCE_CACHE_FILE
 from supabase import create_client, Client
 import uuid
 
@@ -50,6 +59,17 @@ SUPABASE_URL, SUPABASE_KEY = load_credentials()
 TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
 EXCEL_FILE = 'STUDENT  LIST 2025 -26 Global.xlsx'
 ACADEMIC_YEAR = '2025-26'
+BATCH_SIZE = 50  # Supabase handles batches well
+CLEAN_WORKERS = 1  # Set above 1 to clean large workbooks across CPU cores (see clean_students_parallel.py)
+DEDUP_REVIEW_FILE = 'duplicate_students_review.csv'  # Probable duplicate students are listed here
+SKIP_PROBABLE_DUPLICATES = False  # Leave later copies of probable duplicates out of the import
+PERSIST_REFERENCE_CACHE = False  # Keep class/student lookups on disk between runs (see reference_cache.py)
+
+# Streaming pipeline settings (read, clean and upload overlap instead of running one after another)
+PIPELINE_MODE = False
+PIPELINE_CHUNK_ROWS = 500  # Rows read from Excel per chunk
+PIPELINE_QUEUE_SIZE = 8  # Max chunks/batches waiting between stages (caps memory)
+PIPELINE_UPLOADERS = 4  # Concurrent upload tasks
 
 def init_supabase():
     """Initialize Supabase client"""
@@ -70,8 +90,11 @@ def init_supabase():
         logger.error(f"Supabase connection failed: {e}")
         return None
 
-def clean_excel_data():
+def clean_excel_data(workers=CLEAN_WORKERS):
     """Clean and prepare Excel data for import"""
+    if workers > 1:
+        return clean_excel_parallel([EXCEL_FILE], TENANT_ID, ACADEMIC_YEAR, workers=workers, target='supabase')
+
     logger.info("Reading Excel file...")
     
     # Read the Excel file - skip first row as it contains headers
@@ -106,41 +129,21 @@ def clean_excel_data():
     df['academic_year'] = ACADEMIC_YEAR
     df['created_at'] = datetime.now().isoformat()
     
-    # Clean gender data - convert to proper format
-    df['gender'] = df['gender'].fillna('').str.strip().str.upper()
-    df['gender'] = df['gender'].map({'M': 'Male', 'F': 'Female', 'MALE': 'Male', 'FEMALE': 'Female'})
-    df['gender'] = df['gender'].fillna('Male')  # Default to Male if not specified
-    
-    # Clean names
-    df['student_name'] = df['student_name'].fillna('').str.strip().str.title()
-    df['father_name'] = df['father_name'].fillna('').str.strip().str.title()
+    # Clean gender, names, address, religion, caste and mobiles once per distinct value
+    df = normalize_student_columns(df)
     
     # Clean dates - convert to YYYY-MM-DD format for Supabase
     df['dob'] = pd.to_datetime(df['dob'], errors='coerce')
     df['dob'] = df['dob'].dt.strftime('%Y-%m-%d')
     df['dob'] = df['dob'].fillna('2010-01-01')  # Default date if missing
     
-    # Clean addresses
-    df['address'] = df['address'].fillna('').str.strip()
-    
-    # Clean religion and caste
-    df['religion'] = df['religion'].fillna('').str.strip().str.title()
-    df['caste'] = df['caste'].fillna('').str.strip().str.upper()
-    
-    # Map caste values to allowed values
-    caste_mapping = {
-        'BC': 'BC', 'SC': 'SC', 'ST': 'ST', 'OC': 'OC', 
-        'GENERAL': 'OC', 'OTHER': 'Other', '': 'Other'
-    }
-    df['caste'] = df['caste'].map(caste_mapping).fillna('Other')
-    
     # Clean admission numbers
     df['admission_no'] = df['admission_no'].fillna('').astype(str).str.strip()
     empty_admission = df['admission_no'] == ''
     df.loc[empty_admission, 'admission_no'] = [f"ADM{datetime.now().year}{str(i).zfill(4)}" for i in range(1, empty_admission.sum() + 1)]
     
     # Add mobile numbers to remarks for parent linking later
-    df['remarks'] = df.apply(lambda row: f"Mobile: {row['mobile']}, Alt Mobile: {row['alternate_mobile']}, Father: {row['father_name']}" if pd.notna(row['mobile']) else '', axis=1)
+    df['remarks'] = df.apply(lambda row: f"Mobile: {row['mobile']}, Alt Mobile: {row['alternate_mobile'] or ''}, Father: {row['father_name']}" if pd.notna(row['mobile']) else '', axis=1)
     
     # Handle missing required fields
     df['name'] = df['student_name']
@@ -154,13 +157,12 @@ def clean_excel_data():
     logger.info(f"Processed {len(df)} student records")
     return df
 
-def get_or_create_classes(supabase):
+def get_or_create_classes(supabase, cache=None):
     """Get existing classes or create default ones"""
+    cache = cache or ReferenceCache(SupabaseSource(supabase))
     try:
-        # First, check existing classes for this tenant
-        response = supabase.table('classes').select('id,class_name,section').eq('tenant_id', TENANT_ID).execute()
-        
-        existing_classes = response.data
+        # First, check existing classes for this tenant (served from the reference cache when warm)
+        existing_classes = cache.rows(TENANT_ID, 'classes')
         
         if existing_classes:
             logger.info(f"Found {len(existing_classes)} existing classes")
@@ -181,6 +183,7 @@ def get_or_create_classes(supabase):
             response = supabase.table('classes').insert(new_class).execute()
             
             if response.data:
+                cache.invalidate(TENANT_ID, 'classes')
                 logger.info(f"Created default class: {new_class['class_name']}-{new_class['section']}")
                 return new_class['id']
             else:
@@ -206,40 +209,43 @@ def import_students_batch(supabase, students_batch):
         logger.error(f"Error importing batch: {e}")
         return 0, len(students_batch)
 
-def import_students_to_supabase(df, supabase):
+def prepare_student_record(row, class_id):
+    """Convert a cleaned DataFrame row into a Supabase students record"""
+    student_data = {
+        'id': row['id'],
+        'admission_no': str(row['admission_no'])[:100],  # Ensure string and truncate
+        'name': str(row['name'])[:100] if pd.notna(row['name']) and row['name'] else 'Unknown',
+        'dob': row['dob'],
+        'gender': row['gender'],
+        'religion': str(row['religion'])[:50] if pd.notna(row['religion']) and row['religion'] else None,
+        'caste': row['caste'] if row['caste'] and row['caste'] != 'Other' else None,
+        'address': str(row['address'])[:500] if pd.notna(row['address']) and row['address'] else None,
+        'academic_year': row['academic_year'],
+        'remarks': str(row['remarks'])[:1000] if pd.notna(row['remarks']) and row['remarks'] else None,
+        'class_id': class_id,
+        'tenant_id': row['tenant_id'],
+        'created_at': row['created_at']
+    }
+    
+    # Remove None values and empty strings to avoid Supabase issues
+    return {k: v for k, v in student_data.items() if v is not None and v != ''}
+
+def import_students_to_supabase(df, supabase, cache=None):
     """Import student data to Supabase"""
     
     # Get or create a default class
-    default_class_id = get_or_create_classes(supabase)
+    default_class_id = get_or_create_classes(supabase, cache)
     
     success_count = 0
     error_count = 0
-    batch_size = 50  # Supabase handles batches well
+    batch_size = BATCH_SIZE
     
     # Convert DataFrame to list of dictionaries for Supabase
     students = []
     
     for index, row in df.iterrows():
         try:
-            student_data = {
-                'id': row['id'],
-                'admission_no': str(row['admission_no'])[:100],  # Ensure string and truncate
-                'name': str(row['name'])[:100] if pd.notna(row['name']) and row['name'] else 'Unknown',
-                'dob': row['dob'],
-                'gender': row['gender'],
-                'religion': str(row['religion'])[:50] if pd.notna(row['religion']) and row['religion'] else None,
-                'caste': row['caste'] if row['caste'] and row['caste'] != 'Other' else None,
-                'address': str(row['address'])[:500] if pd.notna(row['address']) and row['address'] else None,
-                'academic_year': row['academic_year'],
-                'remarks': str(row['remarks'])[:1000] if pd.notna(row['remarks']) and row['remarks'] else None,
-                'class_id': default_class_id,
-                'tenant_id': row['tenant_id'],
-                'created_at': row['created_at']
-            }
-            
-            # Remove None values and empty strings to avoid Supabase issues
-            student_data = {k: v for k, v in student_data.items() if v is not None and v != ''}
-            students.append(student_data)
+            students.append(prepare_student_record(row, default_class_id))
             
         except Exception as e:
             logger.error(f"Error preparing student {row.get('name', 'Unknown')} (row {index + 1}): {e}")
@@ -256,9 +262,161 @@ def import_students_to_supabase(df, supabase):
         
         logger.info(f"Imported batch {i//batch_size + 1}: {batch_success} successful, {batch_errors} errors")
     
+    # New students make any cached admission number lookups stale
+    if cache:
+        cache.invalidate(TENANT_ID, 'students')
+    
     logger.info(f"Import completed: {success_count} successful, {error_count} errors")
     return success_count, error_count
 
+def iter_excel_chunks(filename, chunk_rows=PIPELINE_CHUNK_ROWS):
+    """Stream the Excel file as renamed DataFrame chunks without loading it whole"""
+    workbook = load_workbook(filename, read_only=True, data_only=True)
+    try:
+        rows = workbook['Sheet1'].iter_rows(values_only=True)
+        
+        # Skip first row and use the second as the header (same as skiprows=1)
+        next(rows, None)
+        header = list(next(rows, None) or ())
+        while header and header[-1] is None:
+            header.pop()  # Trailing blank columns are dropped, as pandas does
+        columns = [h if h is not None else f"Unnamed: {i}" for i, h in enumerate(header)]
+        
+        def to_frame(buffer):
+            df = pd.DataFrame([list(values[:len(columns)]) for values in buffer], columns=columns)
+            return df.dropna(how='all').rename(columns=COLUMN_MAPPING)
+        
+        buffer = []
+        for values in rows:
+            buffer.append(values)
+            if len(buffer) >= chunk_rows:
+                yield to_frame(buffer)
+                buffer = []
+        if buffer:
+            yield to_frame(buffer)
+    finally:
+        workbook.close()
+
+def _clean_chunk_timed(chunk, created_at):
+    """Clean one chunk and report how long it took (runs in the cleaning executor)"""
+    start = time.perf_counter()
+    df = clean_student_chunk(chunk, TENANT_ID, ACADEMIC_YEAR, created_at, target='supabase')
+    return df, time.perf_counter() - start
+
+async def run_import_pipeline(supabase, chunks, uploaders=PIPELINE_UPLOADERS, clean_workers=CLEAN_WORKERS,
+                              queue_size=PIPELINE_QUEUE_SIZE, cache=None):
+    """
+    Import students through a reader -> cleaner -> uploader pipeline.
+    
+    The stages are connected by bounded queues, so uploads start while the file
+    is still being read and a slow stage holds the faster ones back instead of
+    letting chunks pile up in memory. Returns (success, errors, rows processed).
+    """
+    loop = asyncio.get_running_loop()
+    class_id = await asyncio.to_thread(get_or_create_classes, supabase, cache)
+    created_at = datetime.now().isoformat()
+    admission_year = datetime.now().year
+    
+    raw_queue = asyncio.Queue(maxsize=queue_size)
+    cleaning_queue = asyncio.Queue(maxsize=max(1, clean_workers))  # Cleaning futures, kept in file order
+    upload_queue = asyncio.Queue(maxsize=queue_size)
+    
+    stats = {'rows': 0, 'success': 0, 'errors': 0, 'read': 0.0, 'clean': 0.0, 'upload': 0.0}
+    
+    if clean_workers > 1:
+        clean_executor = ProcessPoolExecutor(max_workers=clean_workers)
+    else:
+        clean_executor = ThreadPoolExecutor(max_workers=1)
+    upload_executor = ThreadPoolExecutor(max_workers=uploaders)
+    
+    async def reader():
+        iterator = iter(chunks)
+        while True:
+            start = time.perf_counter()
+            chunk = await loop.run_in_executor(None, next, iterator, None)
+            stats['read'] += time.perf_counter() - start
+            if chunk is None:
+                break
+            await raw_queue.put(chunk)
+        await raw_queue.put(None)
+    
+    async def cleaner():
+        while (chunk := await raw_queue.get()) is not None:
+            await cleaning_queue.put(loop.run_in_executor(clean_executor, _clean_chunk_timed, chunk, created_at))
+        await cleaning_queue.put(None)
+    
+    async def batcher():
+        next_admission = 1
+        while (future := await cleaning_queue.get()) is not None:
+            df, elapsed = await future
+            stats['clean'] += elapsed
+            stats['rows'] += len(df)
+            
+            # Number blank admission numbers across chunks, in file order
+            blanks = int((df['admission_no'] == '').sum())
+            assign_admission_numbers(df, admission_year, start=next_admission)
+            next_admission += blanks
+            
+            students = []
+            for row in df.to_dict('records'):
+                try:
+                    students.append(prepare_student_record(row, class_id))
+                except Exception as e:
+                    logger.error(f"Error preparing student {row.get('name', 'Unknown')}: {e}")
+                    stats['errors'] += 1
+            
+            for i in range(0, len(students), BATCH_SIZE):
+                await upload_queue.put(students[i:i+BATCH_SIZE])
+        
+        for _ in range(uploaders):
+            await upload_queue.put(None)
+    
+    async def uploader(number):
+        while (batch := await upload_queue.get()) is not None:
+            start = time.perf_counter()
+            batch_success, batch_errors = await loop.run_in_executor(
+                upload_executor, import_students_batch, supabase, batch)
+            stats['upload'] += time.perf_counter() - start
+            stats['success'] += batch_success
+            stats['errors'] += batch_errors
+            logger.info(f"Uploader {number}: {batch_success} successful, {batch_errors} errors "
+                        f"({stats['success']} imported so far)")
+    
+    started = time.perf_counter()
+    tasks = [
+        asyncio.create_task(reader()),
+        asyncio.create_task(cleaner()),
+        asyncio.create_task(batcher()),
+    ] + [asyncio.create_task(uploader(n + 1)) for n in range(uploaders)]
+    
+    try:
+        await asyncio.gather(*tasks)
+    except Exception:
+        for task in tasks:
+            task.cancel()
+        raise
+    finally:
+        clean_executor.shutdown(wait=False, cancel_futures=True)
+        upload_executor.shutdown(wait=False, cancel_futures=True)
+    
+    elapsed = time.perf_counter() - started
+    
+    # Time each stage would need on its own; the largest one bounds throughput
+    stage_times = {
+        'read': stats['read'],
+        'clean': stats['clean'] / max(1, clean_workers),
+        'upload': stats['upload'] / uploaders,
+    }
+    slowest = max(stage_times, key=stage_times.get)
+    logger.info(f"Pipeline finished in {elapsed:.2f}s ({stats['rows'] / elapsed if elapsed else 0:.0f} rows/s)")
+    logger.info("Stage time: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in stage_times.items())
+                + f" - slowest stage: {slowest}")
+    
+    if cache:
+        cache.invalidate(TENANT_ID, 'students')
+    
+    return stats['success'], stats['errors'], stats['rows']
+
 def verify_import(supabase):
     """Verify the imported data"""
     try:
@@ -295,17 +453,37 @@ def main():
             logger.error("Failed to connect to Supabase. Please check your configuration.")
             return False
         
-        # Step 2: Clean Excel data
-        logger.info("Step 2: Processing Excel data...")
-        df = clean_excel_data()
+        reference_cache = ReferenceCache(SupabaseSource(supabase),
+                                         cache_file=REFERENCE_CACHE_FILE if PERSIST_REFERENCE_CACHE else None)
         
-        if len(df) == 0:
-            logger.error("No data found in Excel file")
-            return False
+        if PIPELINE_MODE:
+            # Steps 2-3: Stream Excel data through clean and upload stages
+            # (duplicate review needs the whole file; run dedup_students.py on it separately)
+            logger.info("Steps 2-3: Streaming Excel data into Supabase...")
+            success_count, error_count, records_processed = asyncio.run(
+                run_import_pipeline(supabase, iter_excel_chunks(EXCEL_FILE), cache=reference_cache))
+            
+            if records_processed == 0:
+                logger.error("No data found in Excel file")
+                return False
+        else:
+            # Step 2: Clean Excel data
+            logger.info("Step 2: Processing Excel data...")
+            df = clean_excel_data()
+            records_processed = len(df)
+            
+            if len(df) == 0:
+                logger.error("No data found in Excel file")
+                return False
+            
+            # Flag students listed more than once (spelling variants, other sections)
+            df = review_duplicates(df, DEDUP_REVIEW_FILE, SKIP_PROBABLE_DUPLICATES)
+            
+            # Step 3: Import to Supabase
+            logger.info("Step 3: Importing students to Supabase...")
+            success_count, error_count = import_students_to_supabase(df, supabase, reference_cache)
         
-        # Step 3: Import to Supabase
-        logger.info("Step 3: Importing students to Supabase...")
-        success_count, error_count = import_students_to_supabase(df, supabase)
+        reference_cache.save()
         
         # Step 4: Verify import
         logger.info("Step 4: Verifying import...")
@@ -313,7 +491,7 @@ def main():
         
         logger.info("="*60)
         logger.info("IMPORT SUMMARY")
-        logger.info(f"Records processed: {len(df)}")
+        logger.info(f"Records processed: {records_processed}")
         logger.info(f"Successfully imported: {success_count}")
         logger.info(f"Errors: {error_count}")
         logger.info(f"Total students in database: {total_imported}")
@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Mock Expo Push Server
+Local stand-in for Expo's push send endpoint, used to exercise the push fan-out
+worker's batching, retries and token pruning without sending real notifications
+"""
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import push_fanout
+
+logger = logging.getLogger(__name__)
+
+# Tokens with this prefix are answered with DeviceNotRegistered, like uninstalled apps
+DEAD_TOKEN_PREFIX = 'ExponentPushToken[dead-'
+
+class MockPushHandler(BaseHTTPRequestHandler):
+    """Answers Expo-style POST /--/api/v2/push/send requests with one ticket per message"""
+    server_version = 'MockExpoPush/1.0'
+
+    def log_message(self, format, *args):
+        pass  # Keep fan-out logs readable
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        messages = json.loads(self.rfile.read(length) or b'[]')
+        messages = messages if isinstance(messages, list) else [messages]
+
+        # Simulated network + provider latency per request
+        time.sleep(self.server.latency)
+
+        with self.server.lock:
+            self.server.requests += 1
+            failing = random.random() < self.server.failure_rate
+            if failing:
+                self.server.failures += 1
+        if failing:
+            self._send_json(503, {'errors': [{'code': 'UNAVAILABLE', 'message': 'Simulated outage'}]})
+            return
+        if len(messages) > push_fanout.EXPO_BATCH_SIZE:
+            self._send_json(400, {'errors': [{'code': 'PUSH_TOO_MANY_NOTIFICATIONS',
+                                              'message': f"{len(messages)} messages in one request"}]})
+            return
+
+        tickets = []
+        with self.server.lock:
+            for message in messages:
+                token = message.get('to', '')
+                if token.startswith(DEAD_TOKEN_PREFIX):
+                    tickets.append({'status': 'error', 'message': f"{token} is not a registered push token",
+                                    'details': {'error': 'DeviceNotRegistered'}})
+                else:
+                    self.server.delivered.append(token)
+                    tickets.append({'status': 'ok', 'id': f"ticket-{len(self.server.delivered)}"})
+        self._send_json(200, {'data': tickets})
+
+def start_mock_server(latency=0.05, failure_rate=0.0, port=0):
+    """Start the mock server in a background thread and return it"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockPushHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.failure_rate = failure_rate
+    server.delivered = []
+    server.requests = 0
+    server.failures = 0
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}/--/api/v2/push/send"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def synthetic_recipients(recipients, dead_share=0.05, seed=7):
+    """Recipient rows as RECIPIENTS_QUERY returns them: some users with two devices, some listed twice"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(recipients):
+        devices = 2 if rng.random() < 0.2 else 1
+        for device in range(devices):
+            prefix = DEAD_TOKEN_PREFIX if rng.random() < dead_share else 'ExponentPushToken['
+            rows.append((f"nr-{i}", f"user-{i}", 'Parent', f"{prefix}{i}-{device}]"))
+    # Parents with two children get one recipient row per child but share their devices
+    siblings = [(f"{row_id}-sibling", user, kind, token) for row_id, user, kind, token in rows
+                if int(user.split('-')[1]) % 10 == 0]
+    return rows + siblings
+
+def run_against_mock(recipients, concurrency, latency, failure_rate, batch_size=push_fanout.EXPO_BATCH_SIZE,
+                     retries=push_fanout.MAX_RETRIES, runs=5):
+    """Fan one synthetic notification out through a fresh mock server and check what arrived"""
+    server = start_mock_server(latency, failure_rate)
+    try:
+        notification = {'id': 'notification-1', 'type': 'ANNOUNCEMENT', 'message': 'School closed tomorrow'}
+        all_rows = synthetic_recipients(recipients)
+        rows, statuses, invalid = all_rows, {}, []
+
+        # Like repeated --pending runs: only rows left 'Pending' by a batch that never got through are sent again
+        start = time.perf_counter()
+        for _ in range(runs):
+            messages, recipients_by_token = push_fanout.build_messages(notification, rows)
+            tickets = asyncio.run(push_fanout.send_messages(messages, server.url, batch_size, concurrency, retries))
+            run_statuses, run_invalid, failures = push_fanout.classify_tickets(messages, tickets, recipients_by_token)
+            statuses.update(run_statuses)
+            invalid += run_invalid
+            rows = [row for row in rows if statuses[row[0]] == 'Pending' and row[3] not in invalid]
+            if not rows:
+                break
+        elapsed = time.perf_counter() - start
+
+        tokens = {row[3] for row in all_rows}
+        live = {token for token in tokens if not token.startswith(DEAD_TOKEN_PREFIX)}
+        assert len(server.delivered) == len(set(server.delivered)), "No device should get the message twice"
+        assert set(server.delivered) <= live, "Dead tokens should never be delivered"
+        assert set(invalid) == tokens - live or server.failures, "Every dead token should be pruned"
+        assert set(invalid) <= tokens - live, "Only dead tokens should be pruned"
+        reachable = {row[0] for row in all_rows if row[3] in live}
+        assert all(statuses[row_id] == 'Sent' for row_id in reachable) or rows, \
+            "Every recipient with a live device should be sent once no batch is left to retry"
+        assert all(status != 'Failed' for row_id, status in statuses.items() if row_id in reachable), \
+            "Outages must leave recipients 'Pending', not 'Failed'"
+        return elapsed, server.requests, server.failures, len(tokens), len(all_rows), len(set(invalid)), statuses
+    finally:
+        server.shutdown()
+
+def main():
+    """Serve the mock endpoint, or compare batched fan-out against one request per device"""
+    parser = argparse.ArgumentParser(description='Mock Expo push endpoint for fan-out testing')
+    parser.add_argument('--serve', action='store_true', help='Only run the server (pass its URL as --push-url)')
+    parser.add_argument('--port', type=int, default=54322)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds of simulated latency per request')
+    parser.add_argument('--failure-rate', type=float, default=0.05, help='Share of requests answered with 503')
+    parser.add_argument('--recipients', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=push_fanout.SEND_CONCURRENCY)
+    parser.add_argument('--retries', type=int, default=push_fanout.MAX_RETRIES, help='Retries per batch within a run')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(levelname)s - %(message)s')
+    push_fanout.RETRY_BASE_DELAY = 0.05  # Keep simulated outages short
+
+    if args.serve:
+        server = start_mock_server(args.latency, args.failure_rate, args.port)
+        print(f"Mock Expo push running at {server.url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return True
+
+    for label, batch_size, concurrency in (('one per device', 1, 1), ('batched', push_fanout.EXPO_BATCH_SIZE,
+                                                                       args.concurrency)):
+        elapsed, requests, failed, tokens, rows, pruned, statuses = run_against_mock(
+            args.recipients, concurrency, args.latency, args.failure_rate, batch_size, args.retries)
+        sent = sum(1 for status in statuses.values() if status == 'Sent')
+        pending = sum(1 for status in statuses.values() if status == 'Pending')
+        print(f"{label:>15}: {rows} recipient devices -> {tokens} tokens in {requests} requests "
+              f"({failed} retried) in {elapsed:.2f}s; {sent} recipients sent, {pending} still pending, "
+              f"{pruned} tokens pruned")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
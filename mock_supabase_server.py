@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Mock Supabase REST Server
+Local stand-in for the Supabase REST API, used to exercise the streaming import pipeline
+"""
+import sys
+import json
+import time
+import asyncio
+import argparse
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from supabase import create_client
+
+import import_students_supabase as importer
+from clean_students_parallel import make_synthetic_students
+
+logger = logging.getLogger(__name__)
+
+# Any non-empty key is accepted by the client; the mock never checks it
+MOCK_KEY = 'mock.anon.key'
+
+class MockSupabaseHandler(BaseHTTPRequestHandler):
+    """Answers PostgREST-style requests for /rest/v1/<table>"""
+    server_version = 'MockSupabase/1.0'
+
+    def log_message(self, format, *args):
+        pass  # Keep pipeline logs readable
+
+    def _table(self):
+        return self.path.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        table = self._table()
+        with self.server.lock:
+            rows = list(self.server.tables.get(table, []))
+        self._send_json(200, rows[:5], {'Content-Range': f"0-{max(len(rows) - 1, 0)}/{len(rows)}"})
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        payload = json.loads(self.rfile.read(length) or b'[]')
+        rows = payload if isinstance(payload, list) else [payload]
+
+        # Simulated network + database latency per request
+        time.sleep(self.server.latency)
+
+        with self.server.lock:
+            self.server.tables.setdefault(self._table(), []).extend(rows)
+            self.server.requests += 1
+        self._send_json(201, rows)
+
+def start_mock_server(latency=0.05, port=0):
+    """Start the mock server in a background thread and return it"""
+    server = ThreadingHTTPServer(('127.0.0.1', port), MockSupabaseHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.tables = {}
+    server.requests = 0
+    server.lock = threading.Lock()
+    server.url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def synthetic_chunks(rows, chunk_rows):
+    """Yield synthetic renamed student chunks, as iter_excel_chunks would"""
+    df = make_synthetic_students(rows)
+    for i in range(0, rows, chunk_rows):
+        yield df.iloc[i:i + chunk_rows]
+
+def run_against_mock(rows, uploaders, latency, chunk_rows, queue_size):
+    """Run the import pipeline against a fresh mock server and check what arrived"""
+    server = start_mock_server(latency)
+    try:
+        supabase = create_client(server.url, MOCK_KEY)
+        start = time.perf_counter()
+        success, errors, processed = asyncio.run(importer.run_import_pipeline(
+            supabase, synthetic_chunks(rows, chunk_rows), uploaders=uploaders, queue_size=queue_size))
+        elapsed = time.perf_counter() - start
+
+        students = server.tables.get('students', [])
+        admission_numbers = [student['admission_no'] for student in students]
+        assert len(students) == rows == success == processed, "Mock server did not receive every row"
+        assert len(set(admission_numbers)) == len(admission_numbers), "Duplicate admission numbers uploaded"
+        assert errors == 0
+        return elapsed, server.requests
+    finally:
+        server.shutdown()
+
+def main():
+    """Serve the mock API, or run the pipeline against it for several uploader counts"""
+    parser = argparse.ArgumentParser(description='Mock Supabase REST API for import pipeline testing')
+    parser.add_argument('--serve', action='store_true', help='Only run the server (use its URL in credentials.txt)')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency', type=float, default=0.05, help='Seconds of simulated latency per request')
+    parser.add_argument('--rows', type=int, default=5000)
+    parser.add_argument('--uploaders', default='1,4,8', help='Comma separated uploader counts to compare')
+    parser.add_argument('--chunk-rows', type=int, default=importer.PIPELINE_CHUNK_ROWS)
+    parser.add_argument('--queue-size', type=int, default=importer.PIPELINE_QUEUE_SIZE)
+    args = parser.parse_args()
+
+    if args.serve:
+        server = start_mock_server(args.latency, args.port)
+        print(f"Mock Supabase running at {server.url} (Ctrl+C to stop)")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            server.shutdown()
+        return True
+
+    print(f"Pipeline against mock server: {args.rows} rows, {args.latency * 1000:.0f}ms per request")
+    print(f"{'uploaders':>10} {'seconds':>10} {'rows/s':>10} {'requests':>10}")
+    for uploaders in [int(n) for n in args.uploaders.split(',')]:
+        elapsed, requests = run_against_mock(args.rows, uploaders, args.latency, args.chunk_rows, args.queue_size)
+        print(f"{uploaders:>10} {elapsed:>10.2f} {args.rows / elapsed:>10.0f} {requests:>10}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+"""
+Mock UPI Reconciliation Database
+In-memory stand-in for the upi_transactions and student_fees tables, speaking just
+enough of the psycopg2 cursor API to run load_pending and clear_matches end to end,
+with the student_fee_id foreign key and the status guard enforced
+"""
+import os
+import sys
+import copy
+import argparse
+import logging
+import tempfile
+
+import psycopg2
+
+import upi_reconcile
+
+logger = logging.getLogger(__name__)
+
+class MockCursor:
+    """Cursor that recognises upi_reconcile's statements; execute_values rows arrive through mogrify"""
+
+    def __init__(self, db):
+        self.db = db
+        self.connection = db
+        self.description = None
+        self.results = []
+        self.values = []
+
+    def mogrify(self, template, args):
+        self.values.append(tuple(args))
+        return b''
+
+    def execute(self, sql, params=None):
+        sql = sql.decode('utf-8') if isinstance(sql, bytes) else sql
+        rows, self.values = self.values, []
+        self.results, self.description = [], None
+        if sql.lstrip().startswith('SELECT') and 'verification_notes' in sql:
+            self._select_settled(params['tenant_id'])
+        elif sql.lstrip().startswith('SELECT') and 'FROM upi_transactions' in sql:
+            self._select_pending(params['tenant_id'])
+        elif 'INSERT INTO student_fees' in sql:
+            for row in rows:
+                self.db.fees[row[0]] = row
+        elif 'UPDATE upi_transactions' in sql:
+            self._update_transactions(rows)
+        elif 'DELETE FROM student_fees' in sql:
+            for (fee_id,) in rows:
+                self.db.fees.pop(fee_id, None)
+        else:
+            raise NotImplementedError(sql)
+
+    def _select_pending(self, tenant_id):
+        columns = ['id', 'student_id', 'amount', 'reference_number', 'payment_date', 'fee_component', 'academic_year']
+        self.description = [(column,) for column in columns]
+        self.results = [tuple(txn[column] for column in columns) for txn in self.db.transactions.values()
+                        if txn['tenant_id'] == tenant_id and txn['student_fee_id'] is None
+                        and txn['payment_status'] == 'PENDING_ADMIN_VERIFICATION']
+
+    def _select_settled(self, tenant_id):
+        self.results = [(txn['reference_number'], txn.get('verification_notes')) for txn in self.db.transactions.values()
+                        if txn['tenant_id'] == tenant_id and (txn['student_fee_id'] is not None
+                                                              or txn['payment_status'] != 'PENDING_ADMIN_VERIFICATION')]
+
+    def _update_transactions(self, rows):
+        for txn_id, fee_id, notes in rows:
+            txn = self.db.transactions.get(txn_id)
+            if txn is None or txn['payment_status'] != 'PENDING_ADMIN_VERIFICATION':
+                continue
+            txn.update(payment_status='SUCCESS', student_fee_id=fee_id, verification_notes=notes)
+            self.results.append((txn_id,))
+        # upi_transactions_student_fee_id_fkey is not deferrable: checked when the statement ends
+        missing = [txn['id'] for txn in self.db.transactions.values()
+                   if txn['student_fee_id'] is not None and txn['student_fee_id'] not in self.db.fees]
+        if missing:
+            raise psycopg2.IntegrityError('insert or update on table "upi_transactions" violates foreign key '
+                                          f'constraint "upi_transactions_student_fee_id_fkey" ({len(missing)} rows)')
+
+    def fetchall(self):
+        return self.results
+
+    def close(self):
+        pass
+
+class MockUpiDatabase:
+    """upi_transactions and student_fees keyed by id, with commit and rollback"""
+    encoding = 'UTF8'
+
+    def __init__(self, transactions, tenant_id=upi_reconcile.TENANT_ID):
+        self.transactions = {txn['id']: {**txn, 'tenant_id': tenant_id, 'student_fee_id': None,
+                                         'payment_status': 'PENDING_ADMIN_VERIFICATION'}
+                             for txn in transactions}
+        self.fees = {}
+        self.commit()
+
+    def cursor(self):
+        return MockCursor(self)
+
+    def commit(self):
+        self._committed = copy.deepcopy((self.transactions, self.fees))
+
+    def rollback(self):
+        self.transactions, self.fees = copy.deepcopy(self._committed)
+
+def reconcile_statements(db, paths):
+    """load_pending, load_settled and reconcile over the given statement files, as main() does"""
+    pending = upi_reconcile.load_pending(db, upi_reconcile.TENANT_ID)
+    references, bank_references = upi_reconcile.load_settled(db, upi_reconcile.TENANT_ID)
+    chunks = (chunk for path in paths for chunk in upi_reconcile.iter_statement_chunks(path))
+    matches, unmatched = upi_reconcile.reconcile(upi_reconcile.PendingIndex(pending, references, bank_references),
+                                                 chunks)
+    return pending, matches, unmatched
+
+def run_against_mock(payments, settled_meanwhile=25):
+    """Reconcile a synthetic statement and clear it into a fresh mock database, checking what was written"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'statement.csv')
+        db = MockUpiDatabase(upi_reconcile.make_synthetic_statement(path, payments))
+        pending, matches, _ = reconcile_statements(db, [path])
+        # The same export given twice (or two overlapping exports) must not add matches
+        _, overlapping, _ = reconcile_statements(db, [path, path])
+        assert len(overlapping) == len(matches), "Repeated statement lines should be counted once"
+
+        # An admin verifies some matched payments by hand between the load and the write
+        settled = {match['txn']['id'] for match in matches[:settled_meanwhile]}
+        for txn_id in settled:
+            db.transactions[txn_id]['payment_status'] = 'SUCCESS'
+        db.commit()
+
+        cleared = upi_reconcile.clear_matches(db, matches)
+        linked = {txn['student_fee_id'] for txn in db.transactions.values() if txn['student_fee_id'] is not None}
+        assert cleared == len(matches) - len(settled), "Every unsettled match should be cleared"
+        assert linked == set(db.fees), "Every fee row should belong to exactly one cleared transaction"
+        assert all(db.transactions[txn_id]['student_fee_id'] is None for txn_id in settled), \
+            "Payments settled meanwhile must not get a fee row"
+
+        # Running again on the same statement must not clear the transactions that were never credited
+        _, rerun, _ = reconcile_statements(db, [path, path])
+        assert not rerun, f"A second run matched {len(rerun)} statement lines that were already cleared"
+    return len(pending), len(matches), cleared, len(db.fees)
+
+def main():
+    """Run load_pending, reconcile and clear_matches against the mock database"""
+    parser = argparse.ArgumentParser(description='Exercise UPI reconciliation writes against an in-memory database')
+    parser.add_argument('--payments', type=int, default=2000)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    pending, matched, cleared, fees = run_against_mock(args.payments)
+    print(f"{pending} pending, {matched} matched, {cleared} cleared with {fees} student_fees rows")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
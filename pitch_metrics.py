@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+Pitch Deck Metrics
+Tenant-level student counts, attendance rates and fee collection for the pitch
+deck, fetched with a few GROUP BY queries and cached on disk with a TTL
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from datetime import date
+
+logger = logging.getLogger(__name__)
+
+# Constants
+METRICS_TTL_SECONDS = 60 * 60
+METRICS_CACHE_FILE = '.pitch_metrics_cache.json'
+METRICS_MONTHS = 6  # Months of attendance and fee history charted
+ACADEMIC_YEAR = '2025-26'
+
+# One aggregate query per metric covering every tenant, so a run costs len(METRIC_QUERIES) round trips
+METRIC_QUERIES = {
+    'students': """
+        SELECT t.id, t.name, COUNT(s.id)
+        FROM tenants t
+        LEFT JOIN students s ON s.tenant_id = t.id AND s.academic_year = %(academic_year)s
+        WHERE t.status = 'active'
+        GROUP BY t.id, t.name
+    """,
+    'attendance': """
+        SELECT tenant_id, to_char(date, 'YYYY-MM'), COUNT(*) FILTER (WHERE status = 'Present'), COUNT(*)
+        FROM student_attendance
+        WHERE date >= %(since)s
+        GROUP BY 1, 2
+    """,
+    'fees_collected': """
+        SELECT tenant_id, to_char(payment_date, 'YYYY-MM'), SUM(amount_paid)
+        FROM student_fees
+        WHERE academic_year = %(academic_year)s AND COALESCE(status, '') <> 'cancelled'
+        GROUP BY 1, 2
+    """,
+    # Class-wide fee components times the class size; student-specific rows are concessions, not extra billing
+    'fees_billed': """
+        SELECT fs.tenant_id, SUM(fs.amount * c.students)
+        FROM fee_structure fs
+        JOIN (SELECT class_id, COUNT(*) AS students FROM students
+              WHERE academic_year = %(academic_year)s GROUP BY class_id) c ON c.class_id = fs.class_id
+        WHERE fs.student_id IS NULL AND fs.academic_year = %(academic_year)s
+        GROUP BY fs.tenant_id
+    """,
+}
+
+def months_back(count, today=None):
+    """The last count months as 'YYYY-MM' strings, oldest first"""
+    today = today or date.today()
+    months = []
+    year, month = today.year, today.month
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+class MetricsCache:
+    """
+    TTL cache of metric query results in a JSON file.
+
+    Results are keyed by query name and parameters, so a deck run within the
+    TTL reuses them and regenerating many decks touches the database once.
+    """
+
+    def __init__(self, cache_file=METRICS_CACHE_FILE, ttl=METRICS_TTL_SECONDS):
+        self.cache_file = cache_file
+        self.ttl = ttl
+        self.entries = {}
+        if cache_file and os.path.exists(cache_file):
+            try:
+                with open(cache_file, 'r') as f:
+                    self.entries = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable metrics cache {cache_file}: {e}")
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry and time.time() - entry['loaded_at'] < self.ttl:
+            return entry['rows']
+        return None
+
+    def put(self, key, rows):
+        self.entries[key] = {'loaded_at': time.time(), 'rows': rows}
+
+    def save(self):
+        if not self.cache_file:
+            return
+        tmp_path = f"{self.cache_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.cache_file)
+
+def _json_value(value):
+    """Database values as JSON-safe numbers and strings (NUMERIC sums arrive as Decimal)"""
+    if value is None or isinstance(value, (int, float, str)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+def _cache_key(name, academic_year, months):
+    """Query name plus parameters, so a different year or window is cached separately"""
+    return f"{name}:{academic_year}:{months_back(months)[0]}"
+
+def run_metric_queries(conn, cache, academic_year=ACADEMIC_YEAR, months=METRICS_MONTHS):
+    """Rows of every metric query, from the cache when fresh; conn is only used on a miss"""
+    params = {'academic_year': academic_year, 'since': f"{months_back(months)[0]}-01"}
+    results = {}
+    queried = 0
+    for name, sql in METRIC_QUERIES.items():
+        key = _cache_key(name, academic_year, months)
+        rows = cache.get(key) if cache else None
+        if rows is None:
+            if conn is None:
+                raise RuntimeError(f"Metric '{name}' is not cached and no database connection is available")
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                rows = [[_json_value(value) for value in row] for row in cursor.fetchall()]
+            finally:
+                cursor.close()
+            queried += 1
+            if cache:
+                cache.put(key, rows)
+        results[name] = rows
+
+    logger.info(f"Metrics loaded with {queried} queries ({len(METRIC_QUERIES) - queried} from cache)")
+    return results
+
+def build_metrics(results, months=METRICS_MONTHS):
+    """Per-tenant metrics from the query rows: {'months': [...], 'tenants': {id: {...}}}"""
+    month_keys = months_back(months)
+    tenants = {}
+    for tenant_id, name, students in results['students']:
+        tenants[str(tenant_id)] = {
+            'name': name,
+            'students': int(students or 0),
+            'present': dict.fromkeys(month_keys, 0),
+            'marked': dict.fromkeys(month_keys, 0),
+            'collected': dict.fromkeys(month_keys, 0.0),
+            'collected_total': 0.0,
+            'billed': 0.0,
+        }
+
+    for tenant_id, month, present, marked in results['attendance']:
+        tenant = tenants.get(str(tenant_id))
+        if tenant and month in tenant['marked']:
+            tenant['present'][month] += int(present or 0)
+            tenant['marked'][month] += int(marked or 0)
+
+    for tenant_id, month, amount in results['fees_collected']:
+        tenant = tenants.get(str(tenant_id))
+        if tenant:
+            tenant['collected_total'] += float(amount or 0)
+            if month in tenant['collected']:
+                tenant['collected'][month] += float(amount or 0)
+
+    for tenant_id, amount in results['fees_billed']:
+        tenant = tenants.get(str(tenant_id))
+        if tenant:
+            tenant['billed'] += float(amount or 0)
+
+    return {'months': month_keys, 'tenants': tenants}
+
+def load_metrics(conn=None, academic_year=ACADEMIC_YEAR, months=METRICS_MONTHS,
+                 cache_file=METRICS_CACHE_FILE, ttl=METRICS_TTL_SECONDS, refresh=False):
+    """Metrics for every tenant, opening a database connection only if the cache is stale"""
+    cache = MetricsCache(cache_file, ttl)
+    if refresh:
+        cache.entries = {}
+
+    missing = any(cache.get(_cache_key(name, academic_year, months)) is None for name in METRIC_QUERIES)
+    if conn is None and missing:
+        from import_students import connect_database
+        conn = connect_database()
+        if not conn:
+            return None
+
+    results = run_metric_queries(conn, cache, academic_year, months)
+    cache.save()
+    return build_metrics(results, months)
+
+def _percent(part, whole):
+    return round(100.0 * part / whole, 1) if whole else 0.0
+
+def deck_metrics(metrics, tenant_id=None):
+    """Summary numbers and chart series for one tenant, or for all tenants when tenant_id is None"""
+    tenants = metrics['tenants']
+    scope = [tenants[tenant_id]] if tenant_id in tenants else list(tenants.values())
+    if tenant_id and tenant_id not in tenants:
+        logger.warning(f"No metrics for tenant {tenant_id}; using totals across all tenants")
+    months = metrics['months']
+
+    present = [sum(t['present'][m] for t in scope) for m in months]
+    marked = [sum(t['marked'][m] for t in scope) for m in months]
+    collected = [sum(t['collected'][m] for t in scope) for m in months]
+    collected_total = sum(t['collected_total'] for t in scope)
+    billed = sum(t['billed'] for t in scope)
+
+    return {
+        'variables': {
+            'tenant_name': scope[0]['name'] if tenant_id in tenants else '',
+            'schools': len(scope),
+            'total_students': f"{sum(t['students'] for t in scope):,}",
+            'attendance_rate': f"{_percent(sum(present), sum(marked))}%",
+            'fees_collected': f"{collected_total:,.0f}",
+            'fee_collection_rate': f"{_percent(collected_total, billed)}%",
+        },
+        'series': {
+            'students': {
+                'categories': [t['name'] for t in scope],
+                'series': {'Students': [t['students'] for t in scope]},
+            },
+            'attendance': {
+                'categories': months,
+                'series': {'Attendance %': [_percent(p, m) for p, m in zip(present, marked)]},
+            },
+            'fees': {
+                'categories': months,
+                'series': {'Fees collected': collected},
+            },
+        },
+    }
+
+def main():
+    """Print the metrics the pitch deck would use"""
+    parser = argparse.ArgumentParser(description='Fetch tenant metrics for the pitch deck')
+    parser.add_argument('--academic-year', default=ACADEMIC_YEAR)
+    parser.add_argument('--tenant-id', help='Summarise one tenant instead of all of them')
+    parser.add_argument('--ttl', type=int, default=METRICS_TTL_SECONDS, help='Seconds cached results stay fresh')
+    parser.add_argument('--refresh', action='store_true', help='Ignore cached results')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    metrics = load_metrics(academic_year=args.academic_year, ttl=args.ttl, refresh=args.refresh)
+    if metrics is None:
+        return False
+    for name, value in deck_metrics(metrics, args.tenant_id)['variables'].items():
+        print(f"{name}: {value}")
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
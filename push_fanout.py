@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Push Notification Fan-out Worker
+Sends a notification to every pending recipient's devices: recipients and tokens
+resolved in one join, tokens deduplicated, messages posted to Expo in batches of
+100 with bounded concurrency and retry, and dead tokens deactivated in bulk
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import logging
+from datetime import datetime
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+EXPO_PUSH_URL = 'https://exp.host/--/api/v2/push/send'
+EXPO_BATCH_SIZE = 100  # Expo accepts at most 100 messages per request
+SEND_CONCURRENCY = 6  # Batches in flight at once
+MAX_RETRIES = 4  # Per batch, for network errors, 429 and 5xx responses
+RETRY_BASE_DELAY = 1.0  # Seconds; doubled on every retry, with jitter
+REQUEST_TIMEOUT = 30
+PUSH_BODY_LIMIT = 178  # Longer bodies are cut, as FeeReminderNotificationService does at 100
+UPDATE_PAGE_SIZE = 1000  # Rows per UPDATE ... FROM (VALUES ...) statement
+INVALID_TOKEN_ERRORS = {'DeviceNotRegistered'}  # Expo ticket errors meaning the token will never work again
+RETRYABLE_ERRORS = {'BatchFailed'}  # Batches that never got through; their recipients stay 'Pending' for the next run
+
+# Title, Android channel and priority per notification_type_enum value
+NOTIFICATION_STYLES = {
+    'ANNOUNCEMENT': ('📢 Announcement', 'formal-notifications', 'high'),
+    'ATTENDANCE_MARKED': ('📋 Attendance Update', 'formal-notifications', 'high'),
+    'GRADE_ENTERED': ('📝 Marks Updated', 'formal-notifications', 'normal'),
+    'HOMEWORK_UPLOADED': ('📚 New Homework', 'formal-notifications', 'normal'),
+    'EXAM_SCHEDULED': ('🗓️ Exam Scheduled', 'formal-notifications', 'normal'),
+    'EVENT_CREATED': ('🎉 New Event', 'formal-notifications', 'normal'),
+    'Fee Reminder': ('💰 Fee Payment Reminder', 'fee-notifications', 'high'),
+}
+DEFAULT_STYLE = ('VidyaSetu', 'formal-notifications', 'normal')
+
+NOTIFICATION_QUERY = """
+    SELECT id, type::text, message FROM notifications WHERE id = %(notification_id)s
+"""
+# Due notifications with a pending recipient who has a device, oldest first. Recipients without an active
+# token are never sent anything and stay 'Pending' for the in-app list, so they must not requeue a notification
+PENDING_QUERY = """
+    SELECT n.id FROM notifications n
+    WHERE n.tenant_id = %(tenant_id)s AND (n.scheduled_at IS NULL OR n.scheduled_at <= now())
+      AND EXISTS (SELECT 1 FROM notification_recipients nr
+                  JOIN push_tokens pt ON pt.user_id = nr.recipient_id AND pt.is_active
+                  WHERE nr.notification_id = n.id AND nr.delivery_status = 'Pending')
+    ORDER BY n.created_at
+"""
+# Every pending recipient with each of their active devices; recipients without a device stay in-app only
+RECIPIENTS_QUERY = """
+    SELECT nr.id, nr.recipient_id, nr.recipient_type, pt.token
+    FROM notification_recipients nr
+    JOIN push_tokens pt ON pt.user_id = nr.recipient_id AND pt.is_active
+    WHERE nr.notification_id = %(notification_id)s AND nr.delivery_status = 'Pending'
+"""
+
+UPDATE_RECIPIENTS_SQL = """
+    UPDATE notification_recipients AS nr
+    SET delivery_status = v.status, sent_at = CASE WHEN v.status = 'Sent' THEN now() ELSE nr.sent_at END
+    FROM (VALUES %s) AS v(id, status)
+    WHERE nr.id = v.id::uuid
+"""
+PRUNE_TOKENS_SQL = """
+    UPDATE push_tokens SET is_active = false, updated_at = now() WHERE token = ANY(%s)
+"""
+UPDATE_NOTIFICATION_SQL = """
+    UPDATE notifications SET delivery_status = %s, sent_at = now() WHERE id = %s
+"""
+
+def build_messages(notification, rows):
+    """
+    One Expo message per distinct token.
+
+    rows are (recipient row id, recipient_id, recipient_type, token). Returns
+    (messages, recipients_by_token); a token shared by several recipient
+    rows, e.g. a parent listed once per child, gets a single message.
+    """
+    title, channel_id, priority = NOTIFICATION_STYLES.get(notification['type'], DEFAULT_STYLE)
+    body = notification['message'] or ''
+    if len(body) > PUSH_BODY_LIMIT:
+        body = body[:PUSH_BODY_LIMIT - 3] + '...'
+
+    recipients_by_token = {}
+    for row_id, recipient_id, recipient_type, token in rows:
+        recipients_by_token.setdefault(token, []).append((row_id, recipient_id, recipient_type))
+
+    messages = []
+    for token, recipients in recipients_by_token.items():
+        _, recipient_id, recipient_type = recipients[0]
+        messages.append({
+            'to': token,
+            'sound': 'default',
+            'title': title,
+            'body': body,
+            'priority': priority,
+            'channelId': channel_id,
+            'data': {
+                'type': 'formal_notification',
+                'notificationType': notification['type'],
+                'notificationId': str(notification['id']),
+                'userId': str(recipient_id),
+                'userType': recipient_type,
+            },
+        })
+    return messages, recipients_by_token
+
+def _retry_delay(attempt, response=None):
+    """Retry-After when the provider sends one, else exponential backoff with jitter"""
+    if response is not None:
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            pass
+    return RETRY_BASE_DELAY * (2 ** attempt) * (0.5 + random.random())
+
+async def send_batch(client, url, batch, headers, retries=MAX_RETRIES):
+    """POST one batch; returns one ticket per message, error tickets for the whole batch if it never got through"""
+    error, reason = 'unknown error', 'BatchFailed'
+    for attempt in range(retries + 1):
+        response = None
+        try:
+            response = await client.post(url, json=batch, headers=headers)
+            if response.status_code == 200:
+                tickets = response.json().get('data') or []
+                if len(tickets) == len(batch):
+                    return tickets
+                error = f"{len(tickets)} tickets for {len(batch)} messages"
+            else:
+                error = f"HTTP {response.status_code}: {response.text[:200]}"
+                if response.status_code != 429 and response.status_code < 500:
+                    reason = 'BatchRejected'
+                    break  # The request itself is wrong; sending it again will not help
+        except httpx.HTTPError as e:
+            error = str(e) or type(e).__name__
+        if attempt < retries:
+            await asyncio.sleep(_retry_delay(attempt, response))
+
+    logger.error(f"Batch of {len(batch)} failed after {attempt + 1} attempts: {error}")
+    return [{'status': 'error', 'message': error, 'details': {'error': reason}} for _ in batch]
+
+async def send_messages(messages, url=EXPO_PUSH_URL, batch_size=EXPO_BATCH_SIZE, concurrency=SEND_CONCURRENCY,
+                        retries=MAX_RETRIES, access_token=None):
+    """Send all messages in provider-sized batches, at most `concurrency` requests at a time; tickets in order"""
+    headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip, deflate'}
+    if access_token:
+        headers['Authorization'] = f"Bearer {access_token}"
+    batches = [messages[i:i + batch_size] for i in range(0, len(messages), batch_size)]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(timeout=REQUEST_TIMEOUT,
+                                 limits=httpx.Limits(max_connections=concurrency)) as client:
+        async def bounded(batch):
+            async with semaphore:
+                return await send_batch(client, url, batch, headers, retries)
+
+        results = await asyncio.gather(*(bounded(batch) for batch in batches))
+    return [ticket for tickets in results for ticket in tickets]
+
+def classify_tickets(messages, tickets, recipients_by_token):
+    """
+    Recipient row statuses and tokens to deactivate from Expo's tickets.
+
+    A recipient row is 'Sent' when any of its devices accepted the message,
+    'Pending' when none did but one was in a batch that ran out of retries (so
+    the next run picks it up again), and 'Failed' otherwise. Tokens Expo
+    reports as DeviceNotRegistered are returned for pruning.
+    """
+    delivered, retryable, invalid, failures = set(), set(), [], {}
+    for message, ticket in zip(messages, tickets):
+        token = message['to']
+        if ticket.get('status') == 'ok':
+            delivered.add(token)
+            continue
+        error = (ticket.get('details') or {}).get('error') or ticket.get('message') or 'error'
+        failures[error] = failures.get(error, 0) + 1
+        if error in INVALID_TOKEN_ERRORS:
+            invalid.append(token)
+        elif error in RETRYABLE_ERRORS:
+            retryable.add(token)
+
+    rank = {'Failed': 0, 'Pending': 1, 'Sent': 2}
+    statuses = {}
+    for token, recipients in recipients_by_token.items():
+        status = 'Sent' if token in delivered else 'Pending' if token in retryable else 'Failed'
+        for row_id, _, _ in recipients:
+            if rank[status] >= rank[statuses.get(row_id, 'Failed')]:
+                statuses[row_id] = status
+    return statuses, invalid, failures
+
+def fetch_rows(conn, sql, params):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+    finally:
+        cursor.close()
+
+def record_results(conn, notification_id, statuses, invalid_tokens):
+    """Recipient statuses, pruned tokens and the notification's own status in one transaction"""
+    from psycopg2.extras import execute_values  # Only needed when writing
+
+    # 'Pending' rows are already 'Pending'; leaving them untouched is what queues them for the next run
+    final = [(row_id, status) for row_id, status in statuses.items() if status != 'Pending']
+    cursor = conn.cursor()
+    try:
+        if final:
+            execute_values(cursor, UPDATE_RECIPIENTS_SQL, final, page_size=UPDATE_PAGE_SIZE)
+        if invalid_tokens:
+            cursor.execute(PRUNE_TOKENS_SQL, (list(invalid_tokens),))
+        counts = {status: sum(1 for value in statuses.values() if value == status) for status in ('Sent', 'Pending')}
+        status = 'Sent' if counts['Sent'] or not statuses else 'Pending' if counts['Pending'] else 'Failed'
+        cursor.execute(UPDATE_NOTIFICATION_SQL, (status, notification_id))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+def fan_out(conn, notification_id, url=EXPO_PUSH_URL, concurrency=SEND_CONCURRENCY, access_token=None,
+            dry_run=False):
+    """Send one notification to all its pending recipients' devices; returns a summary dict"""
+    start = time.perf_counter()
+    found = fetch_rows(conn, NOTIFICATION_QUERY, {'notification_id': notification_id})
+    if not found:
+        logger.error(f"Notification {notification_id} not found")
+        return None
+    notification = dict(zip(['id', 'type', 'message'], found[0]))
+
+    rows = fetch_rows(conn, RECIPIENTS_QUERY, {'notification_id': notification_id})
+    messages, recipients_by_token = build_messages(notification, rows)
+    summary = {'recipients': len({row[0] for row in rows}), 'tokens': len(messages)}
+    if dry_run or not messages:
+        logger.info(f"Notification {notification_id}: {summary['recipients']} recipients with "
+                    f"{summary['tokens']} devices{' (dry run)' if dry_run else ''}")
+        return summary
+
+    tickets = asyncio.run(send_messages(messages, url, concurrency=concurrency, access_token=access_token))
+    statuses, invalid, failures = classify_tickets(messages, tickets, recipients_by_token)
+    record_results(conn, notification_id, statuses, invalid)
+
+    summary.update(sent=sum(1 for status in statuses.values() if status == 'Sent'),
+                   failed=sum(1 for status in statuses.values() if status == 'Failed'),
+                   pending=sum(1 for status in statuses.values() if status == 'Pending'),
+                   pruned=len(invalid), errors=failures)
+    logger.info(f"Notification {notification_id}: {summary['sent']} recipients sent, {summary['failed']} failed, "
+                f"{summary['pending']} left pending for retry, "
+                f"{len(messages)} devices in {-(-len(messages) // EXPO_BATCH_SIZE)} requests, "
+                f"{len(invalid)} tokens pruned in {time.perf_counter() - start:.1f}s")
+    if failures:
+        logger.warning(f"Push errors: {failures}")
+    return summary
+
+def main():
+    """Fan out one notification, or every pending one for a tenant"""
+    parser = argparse.ArgumentParser(description='Send push notifications to all pending recipients in batches')
+    parser.add_argument('--notification-id', help='Notification to send')
+    parser.add_argument('--pending', action='store_true', help='Send every due notification with pending recipients')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--push-url', default=EXPO_PUSH_URL, help='Push endpoint (point at mock_push_server.py to test)')
+    parser.add_argument('--concurrency', type=int, default=SEND_CONCURRENCY)
+    parser.add_argument('--dry-run', action='store_true', help='Resolve recipients and tokens only')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if not args.notification_id and not args.pending:
+        logger.error("Give --notification-id or --pending")
+        return False
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    if args.pending:
+        notification_ids = [row[0] for row in fetch_rows(conn, PENDING_QUERY, {'tenant_id': args.tenant_id})]
+        logger.info(f"{len(notification_ids)} notifications pending as of {datetime.now():%Y-%m-%d %H:%M}")
+    else:
+        notification_ids = [args.notification_id]
+
+    access_token = os.environ.get('EXPO_ACCESS_TOKEN')  # Only needed when the Expo project enforces push security
+    for notification_id in notification_ids:
+        if fan_out(conn, notification_id, args.push_url, args.concurrency, access_token, args.dry_run) is None:
+            return False
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
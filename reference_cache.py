@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Tenant Reference Data Cache
+Shared lookup layer for the importers: classes, subjects, students by admission
+number and parents by phone, loaded once per table and kept in dict indexes
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import logging
+from collections import OrderedDict
+
+from clean_students_parallel import normalize_phone
+
+logger = logging.getLogger(__name__)
+
+# Constants
+REFERENCE_TTL_SECONDS = 15 * 60
+REFERENCE_MAX_ENTRIES = 64  # (tenant, table) entries kept before least recently used ones are evicted
+REFERENCE_CACHE_FILE = '.reference_cache.json'
+SUPABASE_PAGE_SIZE = 1000  # PostgREST returns at most this many rows per request by default
+
+def _class_keys(row):
+    """Keys the importers use to look up a class: 'NAME-SECTION' and 'NAME'"""
+    name = str(row['class_name']).upper()
+    section = row.get('section')
+    return [f"{name}-{str(section).upper()}" if section else name, name]
+
+# What is loaded per table and how each row is indexed
+REFERENCE_TABLES = {
+    'classes': {
+        'columns': ['id', 'class_name', 'section', 'academic_year'],
+        'order': ['class_name', 'section'],
+        'keys': _class_keys,
+    },
+    'subjects': {
+        'columns': ['id', 'name', 'class_id', 'academic_year'],
+        'order': ['name'],
+        'keys': lambda row: [f"{row['class_id']}:{str(row['name']).upper()}"],
+    },
+    'students': {
+        'columns': ['id', 'admission_no', 'name', 'class_id', 'parent_id'],
+        'order': ['admission_no'],
+        'keys': lambda row: [str(row['admission_no']).strip()],
+    },
+    'parents': {
+        'columns': ['id', 'name', 'phone', 'student_id', 'relation'],
+        'order': ['name'],
+        'keys': lambda row: [normalize_phone(row.get('phone'))],
+    },
+}
+
+class PostgresSource:
+    """Loads reference tables through a psycopg2 connection"""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def fetch(self, table, columns, order, tenant_id):
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute(
+                f"SELECT {', '.join(columns)} FROM {table} WHERE tenant_id = %s ORDER BY {', '.join(order)}",
+                (tenant_id,))
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+        finally:
+            cursor.close()
+
+class SupabaseSource:
+    """Loads reference tables through a Supabase client"""
+
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    def fetch(self, table, columns, order, tenant_id):
+        rows = []
+        while True:
+            query = self.supabase.table(table).select(','.join(columns)).eq('tenant_id', tenant_id)
+            for column in order:
+                query = query.order(column)
+            page = query.range(len(rows), len(rows) + SUPABASE_PAGE_SIZE - 1).execute().data or []
+            rows.extend(page)
+            if len(page) < SUPABASE_PAGE_SIZE:
+                return rows
+
+class ReferenceCache:
+    """
+    TTL + LRU cache of tenant reference tables.
+
+    Each (tenant, table) entry holds the rows and a dict index built from them.
+    Entries expire after ttl seconds, the least recently used are evicted past
+    max_entries, and callers invalidate a table after inserting into it.
+    """
+
+    def __init__(self, source, ttl=REFERENCE_TTL_SECONDS, max_entries=REFERENCE_MAX_ENTRIES, cache_file=None):
+        self.source = source
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.cache_file = cache_file
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_file:
+            self.load()
+
+    def _build_entry(self, table, rows, loaded_at):
+        index = {}
+        for row in rows:
+            for key in REFERENCE_TABLES[table]['keys'](row):
+                if key:
+                    index[key] = row
+        return {'rows': rows, 'index': index, 'loaded_at': loaded_at}
+
+    def get(self, tenant_id, table):
+        """Return the cached entry for a table, loading it in one query on a miss"""
+        key = (tenant_id, table)
+        entry = self.entries.get(key)
+
+        if entry and time.time() - entry['loaded_at'] < self.ttl:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        spec = REFERENCE_TABLES[table]
+        rows = self.source.fetch(table, spec['columns'], spec['order'], tenant_id)
+        entry = self._build_entry(table, rows, time.time())
+        logger.info(f"Loaded {len(rows)} {table} for tenant {tenant_id}")
+
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+        return entry
+
+    def rows(self, tenant_id, table):
+        """All cached rows of a table"""
+        return self.get(tenant_id, table)['rows']
+
+    def lookup(self, tenant_id, table, key):
+        """Find one row by its index key (None when missing)"""
+        return self.get(tenant_id, table)['index'].get(key)
+
+    def class_mapping(self, tenant_id):
+        """Class key ('NAME-SECTION' or 'NAME') to class id, as get_or_create_class_mapping returns"""
+        return {key: row['id'] for key, row in self.get(tenant_id, 'classes')['index'].items()}
+
+    def student_by_admission(self, tenant_id, admission_no):
+        return self.lookup(tenant_id, 'students', str(admission_no).strip())
+
+    def parent_by_phone(self, tenant_id, phone):
+        return self.lookup(tenant_id, 'parents', normalize_phone(phone))
+
+    def subject(self, tenant_id, class_id, name):
+        return self.lookup(tenant_id, 'subjects', f"{class_id}:{str(name).upper()}")
+
+    def invalidate(self, tenant_id, table=None):
+        """Drop cached tables for a tenant (all of them when table is None)"""
+        tables = [table] if table else list(REFERENCE_TABLES)
+        for name in tables:
+            self.entries.pop((tenant_id, name), None)
+
+    def load(self):
+        """Restore unexpired entries saved by a previous run"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with open(self.cache_file, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning(f"Ignoring unreadable reference cache {self.cache_file}: {e}")
+            return
+
+        now = time.time()
+        for item in saved.get('entries', []):
+            if item['table'] in REFERENCE_TABLES and now - item['loaded_at'] < self.ttl:
+                self.entries[(item['tenant_id'], item['table'])] = self._build_entry(
+                    item['table'], item['rows'], item['loaded_at'])
+
+    def save(self):
+        """Persist entries so the next run can skip the database round trips"""
+        if not self.cache_file:
+            return
+        entries = [{'tenant_id': tenant_id, 'table': table, 'loaded_at': entry['loaded_at'], 'rows': entry['rows']}
+                   for (tenant_id, table), entry in self.entries.items()]
+        tmp_path = f"{self.cache_file}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'entries': entries}, f, default=str)
+        os.replace(tmp_path, self.cache_file)
+
+def main():
+    """Warm (or clear) the on-disk reference cache for a tenant"""
+    parser = argparse.ArgumentParser(description='Warm the tenant reference data cache used by the importers')
+    parser.add_argument('--tenant-id', default='9abe534f-1a12-474c-a387-f8795ad3ab5a')
+    parser.add_argument('--target', choices=['postgres', 'supabase'], default='supabase')
+    parser.add_argument('--cache-file', default=REFERENCE_CACHE_FILE)
+    parser.add_argument('--clear', action='store_true', help='Delete the cache file instead')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.clear:
+        if os.path.exists(args.cache_file):
+            os.remove(args.cache_file)
+        print(f"Removed {args.cache_file}")
+        return True
+
+    if args.target == 'postgres':
+        from import_students import connect_database
+        conn = connect_database()
+        if not conn:
+            return False
+        source = PostgresSource(conn)
+    else:
+        from import_students_supabase import init_supabase
+        supabase = init_supabase()
+        if not supabase:
+            return False
+        source = SupabaseSource(supabase)
+
+    cache = ReferenceCache(source, cache_file=args.cache_file)
+    for table in REFERENCE_TABLES:
+        print(f"{table}: {len(cache.rows(args.tenant_id, table))} rows")
+    cache.save()
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+"""
+Offline Student Staging Database
+Lands cleaned student rows in a local SQLite (or DuckDB) file so dedup, parent
+grouping and class resolution run locally, then pushes a staged tenant in bulk
+"""
+import os
+import sys
+import uuid
+import argparse
+import logging
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from clean_students_parallel import clean_dataframe_parallel, normalize_phone, read_student_workbook
+
+try:
+    import duckdb
+except ImportError:
+    duckdb = None  # SQLite (standard library) is always available
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+ACADEMIC_YEAR = '2025-26'
+STAGING_DB = 'student_staging.db'
+PUSH_BATCH_SIZE = 500
+
+# Same defaults import_students.py creates when a tenant has no classes
+DEFAULT_CLASSES = [
+    ('NURSERY', 'A'), ('LKG', 'A'), ('UKG', 'A'),
+    ('1ST', 'A'), ('2ND', 'A'), ('3RD', 'A'), ('4TH', 'A'), ('5TH', 'A'),
+    ('6TH', 'A'), ('7TH', 'A'), ('8TH', 'A'), ('9TH', 'A'), ('10TH', 'A')
+]
+
+STAGING_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS staged_students (
+        id TEXT PRIMARY KEY,
+        tenant_id TEXT NOT NULL,
+        admission_no TEXT NOT NULL,
+        name TEXT NOT NULL,
+        dob TEXT NOT NULL,
+        gender TEXT NOT NULL,
+        religion TEXT,
+        caste TEXT,
+        address TEXT,
+        blood_group TEXT,
+        academic_year TEXT NOT NULL,
+        remarks TEXT,
+        father_name TEXT,
+        phone TEXT,
+        alternate_phone TEXT,
+        class_name TEXT,
+        class_id TEXT,
+        parent_id TEXT,
+        duplicate_of TEXT,
+        source_file TEXT,
+        source_row INTEGER,
+        created_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_staged_students_admission ON staged_students (tenant_id, admission_no)",
+    "CREATE INDEX IF NOT EXISTS idx_staged_students_phone ON staged_students (tenant_id, phone)",
+    """
+    CREATE TABLE IF NOT EXISTS staged_classes (
+        id TEXT PRIMARY KEY,
+        tenant_id TEXT NOT NULL,
+        class_name TEXT NOT NULL,
+        section TEXT NOT NULL,
+        academic_year TEXT NOT NULL,
+        created_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_staged_classes_name ON staged_classes (tenant_id, class_name, section)",
+    """
+    CREATE TABLE IF NOT EXISTS staged_parents (
+        id TEXT PRIMARY KEY,
+        tenant_id TEXT NOT NULL,
+        name TEXT NOT NULL,
+        phone TEXT NOT NULL,
+        alternate_number TEXT,
+        relation TEXT,
+        student_id TEXT,
+        created_at TEXT
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_staged_parents_phone ON staged_parents (tenant_id, phone)",
+]
+
+STUDENT_COLUMNS = ['id', 'tenant_id', 'admission_no', 'name', 'dob', 'gender', 'religion', 'caste', 'address',
+                   'blood_group', 'academic_year', 'remarks', 'father_name', 'phone', 'alternate_phone',
+                   'class_name', 'source_file', 'source_row', 'created_at']
+
+def open_staging_db(path=STAGING_DB, engine='sqlite'):
+    """Open (and create if needed) the local staging database"""
+    if engine == 'duckdb':
+        if duckdb is None:
+            raise RuntimeError("DuckDB staging requested but the duckdb package is not installed")
+        conn = duckdb.connect(path)
+    else:
+        conn = sqlite3.connect(path)
+        conn.execute("PRAGMA journal_mode = WAL")
+        conn.execute("PRAGMA synchronous = NORMAL")
+
+    for statement in STAGING_SCHEMA:
+        conn.execute(statement)
+    conn.commit()
+    return conn
+
+def _none_if_blank(value):
+    """Map NaN/empty cells to NULL"""
+    if value is None or (isinstance(value, float) and pd.isna(value)):
+        return None
+    value = str(value).strip()
+    return value or None
+
+def stage_workbooks(conn, filenames, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR, workers=1):
+    """
+    Clean workbooks and land the rows in staged_students (replacing the tenant's previous stage).
+
+    All files are cleaned as one frame, so generated admission numbers keep
+    counting across files instead of restarting (and colliding) in each one.
+    """
+    frames = []
+    for filename in filenames:
+        df = read_student_workbook(filename)
+        frames.append(df.assign(source_file=os.path.basename(filename), source_row=range(1, len(df) + 1)))
+    df = pd.concat(frames, ignore_index=True)
+    df = clean_dataframe_parallel(df, tenant_id, academic_year, workers=workers, target='supabase')
+
+    rows = []
+    for record in df.to_dict('records'):
+        rows.append((
+            record['id'],
+            tenant_id,
+            str(record['admission_no'])[:100],
+            str(record['name'])[:100] if record['name'] else 'Unknown',
+            record['dob'],
+            record['gender'],
+            _none_if_blank(record.get('religion')),
+            record['caste'],
+            _none_if_blank(record.get('address')),
+            _none_if_blank(record.get('blood_group')),
+            academic_year,
+            _none_if_blank(record.get('remarks')),
+            _none_if_blank(record.get('father_name')),
+            normalize_phone(record.get('mobile')),
+            normalize_phone(record.get('alternate_mobile')),
+            _none_if_blank(record.get('class_name')),
+            record['source_file'],
+            int(record['source_row']),
+            record['created_at'],
+        ))
+
+    conn.execute("DELETE FROM staged_students WHERE tenant_id = ?", (tenant_id,))
+    conn.execute("DELETE FROM staged_parents WHERE tenant_id = ?", (tenant_id,))
+    placeholders = ', '.join('?' for _ in STUDENT_COLUMNS)
+    conn.executemany(f"INSERT INTO staged_students ({', '.join(STUDENT_COLUMNS)}) VALUES ({placeholders})", rows)
+    conn.commit()
+
+    logger.info(f"Staged {len(rows)} students from {len(filenames)} file(s) for tenant {tenant_id}")
+    return len(rows)
+
+def mark_duplicates(conn, tenant_id=TENANT_ID):
+    """
+    Flag repeated students so they are not pushed.
+
+    A row is a duplicate when an earlier staged row has the same admission
+    number, or the same name, date of birth and phone. duplicate_of points to
+    the first occurrence.
+    """
+    conn.execute("UPDATE staged_students SET duplicate_of = NULL WHERE tenant_id = ?", (tenant_id,))
+
+    conn.execute("""
+        UPDATE staged_students SET duplicate_of = (
+            SELECT earliest.id FROM staged_students earliest
+            WHERE earliest.tenant_id = staged_students.tenant_id
+              AND earliest.admission_no = staged_students.admission_no
+            ORDER BY earliest.source_file, earliest.source_row
+            LIMIT 1
+        )
+        WHERE tenant_id = ?
+          AND admission_no IN (
+            SELECT admission_no FROM staged_students
+            WHERE tenant_id = ? GROUP BY admission_no HAVING COUNT(*) > 1
+          )
+    """, (tenant_id, tenant_id))
+
+    conn.execute("""
+        UPDATE staged_students SET duplicate_of = (
+            SELECT earliest.id FROM staged_students earliest
+            WHERE earliest.tenant_id = staged_students.tenant_id
+              AND earliest.phone = staged_students.phone
+              AND earliest.dob = staged_students.dob
+              AND UPPER(earliest.name) = UPPER(staged_students.name)
+            ORDER BY earliest.source_file, earliest.source_row
+            LIMIT 1
+        )
+        WHERE tenant_id = ? AND duplicate_of IS NULL AND phone IS NOT NULL
+    """, (tenant_id,))
+
+    # The first occurrence of each group points at itself; clear that
+    conn.execute("UPDATE staged_students SET duplicate_of = NULL WHERE tenant_id = ? AND duplicate_of = id",
+                 (tenant_id,))
+    conn.commit()
+
+    count = conn.execute("SELECT COUNT(*) FROM staged_students WHERE tenant_id = ? AND duplicate_of IS NOT NULL",
+                         (tenant_id,)).fetchone()[0]
+    logger.info(f"Marked {count} duplicate students")
+    return count
+
+def group_parents(conn, tenant_id=TENANT_ID):
+    """Create one staged parent per phone number and link students to it"""
+    conn.execute("DELETE FROM staged_parents WHERE tenant_id = ?", (tenant_id,))
+
+    groups = conn.execute("""
+        SELECT phone, father_name, alternate_phone, id
+        FROM staged_students
+        WHERE tenant_id = ? AND phone IS NOT NULL AND duplicate_of IS NULL
+        ORDER BY phone, source_file, source_row
+    """, (tenant_id,)).fetchall()
+
+    parents = []
+    seen_phones = set()
+    created_at = datetime.now().isoformat()
+    for phone, father_name, alternate_phone, student_id in groups:
+        if phone in seen_phones:
+            continue  # First (eldest in file order) child is the parent's primary student
+        seen_phones.add(phone)
+        parents.append((str(uuid.uuid4()), tenant_id, father_name or 'Parent', phone, alternate_phone,
+                        'Father', student_id, created_at))
+
+    conn.executemany("""
+        INSERT INTO staged_parents (id, tenant_id, name, phone, alternate_number, relation, student_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, parents)
+
+    conn.execute("""
+        UPDATE staged_students SET parent_id = (
+            SELECT p.id FROM staged_parents p
+            WHERE p.tenant_id = staged_students.tenant_id AND p.phone = staged_students.phone
+        )
+        WHERE tenant_id = ?
+    """, (tenant_id,))
+    conn.commit()
+
+    logger.info(f"Grouped students under {len(parents)} parents")
+    return len(parents)
+
+def resolve_classes(conn, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR):
+    """Assign class_id from staged classes, seeding the default classes if there are none"""
+    existing = conn.execute("SELECT COUNT(*) FROM staged_classes WHERE tenant_id = ?", (tenant_id,)).fetchone()[0]
+    if not existing:
+        created_at = datetime.now().isoformat()
+        conn.executemany("""
+            INSERT INTO staged_classes (id, tenant_id, class_name, section, academic_year, created_at)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, [(str(uuid.uuid4()), tenant_id, class_name, section, academic_year, created_at)
+              for class_name, section in DEFAULT_CLASSES])
+        logger.info(f"Staged {len(DEFAULT_CLASSES)} default classes")
+
+    # Match on class name where the workbook has one
+    conn.execute("""
+        UPDATE staged_students SET class_id = (
+            SELECT c.id FROM staged_classes c
+            WHERE c.tenant_id = staged_students.tenant_id
+              AND UPPER(c.class_name) = UPPER(staged_students.class_name)
+            ORDER BY c.section
+            LIMIT 1
+        )
+        WHERE tenant_id = ? AND class_name IS NOT NULL
+    """, (tenant_id,))
+
+    # Otherwise fall back to the first class, as the importers do
+    conn.execute("""
+        UPDATE staged_students SET class_id = (
+            SELECT c.id FROM staged_classes c
+            WHERE c.tenant_id = staged_students.tenant_id
+            ORDER BY c.class_name, c.section
+            LIMIT 1
+        )
+        WHERE tenant_id = ? AND class_id IS NULL
+    """, (tenant_id,))
+    conn.commit()
+
+    unresolved = conn.execute("SELECT COUNT(*) FROM staged_students WHERE tenant_id = ? AND class_id IS NULL",
+                              (tenant_id,)).fetchone()[0]
+    logger.info(f"Class resolution complete ({unresolved} students without a class)")
+    return unresolved
+
+def staging_report(conn, tenant_id=TENANT_ID):
+    """Print a summary of what is staged for a tenant"""
+    def scalar(sql):
+        return conn.execute(sql, (tenant_id,)).fetchone()[0]
+
+    print(f"Staged tenant: {tenant_id}")
+    print(f"  Students:   {scalar('SELECT COUNT(*) FROM staged_students WHERE tenant_id = ?')}")
+    print(f"  Duplicates: {scalar('SELECT COUNT(*) FROM staged_students WHERE tenant_id = ? AND duplicate_of IS NOT NULL')}")
+    print(f"  Parents:    {scalar('SELECT COUNT(*) FROM staged_parents WHERE tenant_id = ?')}")
+    print(f"  Classes:    {scalar('SELECT COUNT(*) FROM staged_classes WHERE tenant_id = ?')}")
+
+    duplicates = conn.execute("""
+        SELECT d.name, d.admission_no, d.source_row, f.name, f.admission_no, f.source_row
+        FROM staged_students d JOIN staged_students f ON f.id = d.duplicate_of
+        WHERE d.tenant_id = ?
+        ORDER BY d.source_file, d.source_row
+        LIMIT 20
+    """, (tenant_id,)).fetchall()
+    for name, admission_no, row, first_name, first_admission, first_row in duplicates:
+        print(f"  - Row {row} {name} ({admission_no}) duplicates row {first_row} {first_name} ({first_admission})")
+
+def _fetch_push_rows(conn, tenant_id):
+    """Read the staged classes, parents and (non-duplicate) students for a push"""
+    def fetch(sql):
+        cursor = conn.execute(sql, (tenant_id,))
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+    classes = fetch("SELECT id, tenant_id, class_name, section, academic_year, created_at "
+                    "FROM staged_classes WHERE tenant_id = ?")
+    parents = fetch("SELECT id, tenant_id, name, phone, alternate_number, relation, student_id, created_at "
+                    "FROM staged_parents WHERE tenant_id = ?")
+    students = fetch("""
+        SELECT id, tenant_id, admission_no, name, dob, gender, religion, caste, address, blood_group,
+               academic_year, remarks, class_id, parent_id, created_at
+        FROM staged_students
+        WHERE tenant_id = ? AND duplicate_of IS NULL
+        ORDER BY source_file, source_row
+    """)
+    return classes, parents, students
+
+def _map_existing_classes(classes, students, remote_classes):
+    """Reuse classes that already exist remotely; returns only the classes still to create"""
+    remote_ids = {(name.upper(), (section or '').upper()): class_id for class_id, name, section in remote_classes}
+    id_map = {}
+    new_classes = []
+    for cls in classes:
+        remote_id = remote_ids.get((cls['class_name'].upper(), cls['section'].upper()))
+        if remote_id:
+            id_map[cls['id']] = remote_id
+        else:
+            new_classes.append(cls)
+
+    for student in students:
+        student['class_id'] = id_map.get(student['class_id'], student['class_id'])
+    return new_classes
+
+def push_to_postgres(conn, pg_conn, tenant_id=TENANT_ID):
+    """Push a staged tenant to PostgreSQL in one transaction using multi-row inserts"""
+    from psycopg2.extras import execute_values  # Only needed when pushing
+
+    classes, parents, students = _fetch_push_rows(conn, tenant_id)
+    cursor = pg_conn.cursor()
+    try:
+        cursor.execute("SELECT id, class_name, section FROM classes WHERE tenant_id = %s", (tenant_id,))
+        classes = _map_existing_classes(classes, students, cursor.fetchall())
+
+        execute_values(cursor, """
+            INSERT INTO classes (id, tenant_id, class_name, section, academic_year, created_at) VALUES %s
+        """, [tuple(c.values()) for c in classes], page_size=PUSH_BATCH_SIZE)
+
+        # parents.student_id and students.parent_id reference each other: insert parents
+        # without the student link, then students, then fill in the link
+        execute_values(cursor, """
+            INSERT INTO parents (id, tenant_id, name, phone, alternate_number, relation, created_at) VALUES %s
+        """, [(p['id'], p['tenant_id'], p['name'], p['phone'], p['alternate_number'], p['relation'],
+               p['created_at']) for p in parents], page_size=PUSH_BATCH_SIZE)
+
+        execute_values(cursor, """
+            INSERT INTO students (id, tenant_id, admission_no, name, dob, gender, religion, caste, address,
+                                  blood_group, academic_year, remarks, class_id, parent_id, created_at) VALUES %s
+        """, [tuple(s.values()) for s in students], page_size=PUSH_BATCH_SIZE)
+
+        execute_values(cursor, """
+            UPDATE parents SET student_id = data.student_id::uuid
+            FROM (VALUES %s) AS data (id, student_id)
+            WHERE parents.id = data.id::uuid
+        """, [(p['id'], p['student_id']) for p in parents if p['student_id']], page_size=PUSH_BATCH_SIZE)
+
+        pg_conn.commit()
+    except Exception:
+        pg_conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    logger.info(f"Pushed {len(classes)} classes, {len(parents)} parents and {len(students)} students to PostgreSQL")
+    return len(students)
+
+def push_to_supabase(conn, supabase, tenant_id=TENANT_ID):
+    """Push a staged tenant to Supabase in large batches"""
+    classes, parents, students = _fetch_push_rows(conn, tenant_id)
+
+    response = supabase.table('classes').select('id,class_name,section').eq('tenant_id', tenant_id).execute()
+    classes = _map_existing_classes(classes, students,
+                                    [(c['id'], c['class_name'], c['section']) for c in response.data or []])
+
+    def insert_all(table, rows, upsert=False):
+        for i in range(0, len(rows), PUSH_BATCH_SIZE):
+            # Drop NULLs so column defaults apply, as the importers do
+            batch = [{k: v for k, v in row.items() if v is not None} for row in rows[i:i + PUSH_BATCH_SIZE]]
+            query = supabase.table(table)
+            (query.upsert(batch) if upsert else query.insert(batch)).execute()
+
+    insert_all('classes', classes)
+    insert_all('parents', [{k: v for k, v in p.items() if k != 'student_id'} for p in parents])
+    insert_all('students', students)
+    # Second pass links each parent to its student now that the students exist
+    insert_all('parents', parents, upsert=True)
+
+    logger.info(f"Pushed {len(classes)} classes, {len(parents)} parents and {len(students)} students to Supabase")
+    return len(students)
+
+def main():
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Stage student imports in a local database, then push them')
+    parser.add_argument('command', choices=['stage', 'report', 'push'])
+    parser.add_argument('files', nargs='*', help='Excel workbooks to stage')
+    parser.add_argument('--db', default=STAGING_DB, help='Staging database file')
+    parser.add_argument('--engine', choices=['sqlite', 'duckdb'], default='sqlite')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--academic-year', default=ACADEMIC_YEAR)
+    parser.add_argument('--workers', type=int, default=1, help='Cleaning worker processes')
+    parser.add_argument('--target', choices=['postgres', 'supabase'], default='supabase', help='Push destination')
+    args = parser.parse_args()
+
+    conn = open_staging_db(args.db, args.engine)
+    try:
+        if args.command == 'stage':
+            if not args.files:
+                parser.error('stage needs at least one Excel file')
+            stage_workbooks(conn, args.files, args.tenant_id, args.academic_year, args.workers)
+            mark_duplicates(conn, args.tenant_id)
+            group_parents(conn, args.tenant_id)
+            resolve_classes(conn, args.tenant_id, args.academic_year)
+            staging_report(conn, args.tenant_id)
+
+        elif args.command == 'report':
+            staging_report(conn, args.tenant_id)
+
+        elif args.command == 'push':
+            if args.target == 'postgres':
+                from import_students import connect_database
+                pg_conn = connect_database()
+                if not pg_conn:
+                    return False
+                try:
+                    push_to_postgres(conn, pg_conn, args.tenant_id)
+                finally:
+                    pg_conn.close()
+            else:
+                from import_students_supabase import init_supabase
+                supabase = init_supabase()
+                if not supabase:
+                    return False
+                push_to_supabase(conn, supabase, args.tenant_id)
+        return True
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
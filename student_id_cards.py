@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Student ID Card Generator
+Renders ID cards for a tenant's students onto print-ready A4 PDF sheets, with
+photos fetched once into an on-disk thumbnail cache and sheets drawn across a process pool
+"""
+import io
+import os
+import sys
+import time
+import zlib
+import hashlib
+import argparse
+import logging
+import tempfile
+import urllib.request
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont, ImageOps
+
+from reference_cache import ReferenceCache, PostgresSource, SupabaseSource
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+ACADEMIC_YEAR = '2025-26'
+SCHOOL_NAME = 'VidyaSethu School'
+OUTPUT_FILE = 'student_id_cards.pdf'
+PHOTO_CACHE_DIR = '.id_card_photos'
+PHOTO_FETCH_THREADS = 16  # Photo downloads are network-bound, so threads rather than processes
+PHOTO_TIMEOUT = 15  # Seconds per photo download
+
+DPI = 300
+CARD_MM = (85.6, 54.0)  # CR80, the standard ID card size
+SHEET_MM = (210.0, 297.0)  # A4 portrait
+CARD_GAP_MM = 3.0  # Cutting gap between cards on a sheet
+JPEG_QUALITY = 90  # Sheets are embedded in the PDF as JPEG at print resolution
+
+HEADER_COLOR = '#2196F3'
+TEXT_COLOR = '#212121'
+LABEL_COLOR = '#616161'
+FONT_FILE = 'DejaVuSans.ttf'  # Falls back to Pillow's built-in font when not installed
+BOLD_FONT_FILE = 'DejaVuSans-Bold.ttf'
+
+# Card layout in pixels at DPI
+CARD_LAYOUT = {
+    'header_height': 150,
+    'photo_box': (40, 200, 280, 500),  # left, top, right, bottom
+    'text_left': 320,
+    'name_top': 205,
+    'name_size': 44,
+    'field_top': 282,
+    'field_size': 32,
+    'field_spacing': 58,
+    'label_width': 230,
+}
+CARD_FIELDS = [('Adm. No', 'admission_no'), ('Class', 'class_label'), ('Blood Group', 'blood_group'), ('DOB', 'dob')]
+STUDENT_COLUMNS = ['id', 'admission_no', 'name', 'dob', 'blood_group', 'photo_url', 'class_id', 'roll_no',
+                   'academic_year']
+
+def mm_to_px(mm):
+    return round(mm / 25.4 * DPI)
+
+CARD_SIZE = (mm_to_px(CARD_MM[0]), mm_to_px(CARD_MM[1]))
+SHEET_SIZE = (mm_to_px(SHEET_MM[0]), mm_to_px(SHEET_MM[1]))
+PHOTO_SIZE = (CARD_LAYOUT['photo_box'][2] - CARD_LAYOUT['photo_box'][0],
+              CARD_LAYOUT['photo_box'][3] - CARD_LAYOUT['photo_box'][1])
+
+def sheet_grid():
+    """Card positions on a sheet: as many columns and rows as fit, centred with a cutting gap"""
+    gap = mm_to_px(CARD_GAP_MM)
+    cols = (SHEET_SIZE[0] + gap) // (CARD_SIZE[0] + gap)
+    rows = (SHEET_SIZE[1] + gap) // (CARD_SIZE[1] + gap)
+    left = (SHEET_SIZE[0] - cols * CARD_SIZE[0] - (cols - 1) * gap) // 2
+    top = (SHEET_SIZE[1] - rows * CARD_SIZE[1] - (rows - 1) * gap) // 2
+    return [(left + c * (CARD_SIZE[0] + gap), top + r * (CARD_SIZE[1] + gap)) for r in range(rows) for c in range(cols)]
+
+def load_students(source, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR, class_label=None):
+    """Card records for a tenant's students, ordered by class and roll number"""
+    classes = {row['id']: row for row in ReferenceCache(source).rows(tenant_id, 'classes')}
+    students = source.fetch('students', STUDENT_COLUMNS, ['admission_no'], tenant_id)
+
+    cards = []
+    for row in students:
+        if academic_year and row.get('academic_year') not in (None, academic_year):
+            continue
+        cls = classes.get(row.get('class_id')) or {}
+        label = '-'.join(str(part) for part in (cls.get('class_name'), cls.get('section')) if part)
+        if class_label and label.upper() != class_label.upper():
+            continue
+        dob = str(row.get('dob') or '')[:10]
+        cards.append({
+            'name': str(row.get('name') or '').strip().upper(),
+            'admission_no': str(row.get('admission_no') or ''),
+            'class_label': label,
+            'blood_group': row.get('blood_group') or '',
+            'dob': '-'.join(reversed(dob.split('-'))) if dob else '',
+            'photo_url': row.get('photo_url'),
+            'roll_no': row.get('roll_no'),
+        })
+
+    cards.sort(key=lambda card: (card['class_label'], card['roll_no'] is None, card['roll_no'] or 0, card['name']))
+    logger.info(f"Loaded {len(cards)} students for ID cards")
+    return cards
+
+def photo_cache_path(cache_dir, url):
+    return os.path.join(cache_dir, hashlib.sha1(url.encode('utf-8')).hexdigest() + '.jpg')
+
+def fetch_photo(url, cache_dir, refresh=False):
+    """Download (or read) one photo and store it as a card-sized JPEG thumbnail; returns its path or None"""
+    path = photo_cache_path(cache_dir, url)
+    if os.path.exists(path) and not refresh:
+        return path
+
+    try:
+        if url.startswith(('http://', 'https://')):
+            with urllib.request.urlopen(url, timeout=PHOTO_TIMEOUT) as response:
+                data = response.read()
+        else:
+            with open(url, 'rb') as f:
+                data = f.read()
+
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft('RGB', (PHOTO_SIZE[0] * 2, PHOTO_SIZE[1] * 2))  # JPEGs decode straight at reduced scale
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            thumb = ImageOps.fit(img, PHOTO_SIZE, Image.LANCZOS, centering=(0.5, 0.35))
+    except Exception as e:
+        logger.warning(f"Could not load photo {url}: {e}")
+        return None
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    thumb.save(tmp_path, 'JPEG', quality=92)
+    os.replace(tmp_path, path)
+    return path
+
+def cache_photos(cards, cache_dir=PHOTO_CACHE_DIR, threads=PHOTO_FETCH_THREADS, refresh=False):
+    """Fetch every distinct photo once and point each card at its cached thumbnail"""
+    os.makedirs(cache_dir, exist_ok=True)
+    urls = sorted({card['photo_url'] for card in cards if card['photo_url']})
+    cached = sum(os.path.exists(photo_cache_path(cache_dir, url)) for url in urls) if not refresh else 0
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        paths = dict(zip(urls, pool.map(lambda url: fetch_photo(url, cache_dir, refresh), urls)))
+
+    for card in cards:
+        card['photo'] = paths.get(card['photo_url'])
+    missing = sum(1 for card in cards if not card['photo'])
+    logger.info(f"Photos: {len(urls)} distinct, {cached} already cached, {missing} cards without a photo")
+    return cards
+
+@lru_cache(maxsize=32)
+def load_font(size, bold=False):
+    """TrueType font at a pixel size, cached per process"""
+    try:
+        return ImageFont.truetype(BOLD_FONT_FILE if bold else FONT_FILE, size)
+    except OSError:
+        return ImageFont.load_default(size)
+
+@lru_cache(maxsize=4)
+def load_card_background(template, school_name, academic_year):
+    """Blank card: the template image when given, else a white card with the school header"""
+    if template:
+        with Image.open(template) as img:
+            return img.convert('RGB').resize(CARD_SIZE, Image.LANCZOS)
+
+    card = Image.new('RGB', CARD_SIZE, 'white')
+    draw = ImageDraw.Draw(card)
+    header = CARD_LAYOUT['header_height']
+    draw.rectangle([0, 0, CARD_SIZE[0], header], fill=HEADER_COLOR)
+    draw.rectangle([0, CARD_SIZE[1] - 18, CARD_SIZE[0], CARD_SIZE[1]], fill=HEADER_COLOR)
+    text, font = fit_text(draw, school_name.upper(), 50, CARD_SIZE[0] - 60, bold=True)
+    draw.text((CARD_SIZE[0] // 2, 62), text, font=font, fill='white', anchor='mm')
+    draw.text((CARD_SIZE[0] // 2, 118), f"STUDENT IDENTITY CARD  •  {academic_year}",
+              font=load_font(26, bold=True), fill='white', anchor='mm')
+    return card
+
+def fit_text(draw, text, size, max_width, bold=False):
+    """(text, font) with the font shrunk until the text fits max_width"""
+    while size > 16 and draw.textlength(text, font=load_font(size, bold)) > max_width:
+        size -= 2
+    return text, load_font(size, bold)
+
+def placeholder_photo(name):
+    """Grey silhouette box with the student's initials, for students without a usable photo"""
+    img = Image.new('RGB', PHOTO_SIZE, '#ECEFF1')
+    initials = ''.join(part[0] for part in name.split()[:2]) or '?'
+    ImageDraw.Draw(img).text((PHOTO_SIZE[0] // 2, PHOTO_SIZE[1] // 2), initials, font=load_font(96, bold=True),
+                             fill='#90A4AE', anchor='mm')
+    return img
+
+def render_card(card, template=None, school_name=SCHOOL_NAME, academic_year=ACADEMIC_YEAR):
+    """One student's card as an RGB image at CARD_SIZE"""
+    img = load_card_background(template, school_name, academic_year).copy()
+    draw = ImageDraw.Draw(img)
+    layout = CARD_LAYOUT
+
+    photo = None
+    if card.get('photo'):
+        try:
+            photo = Image.open(card['photo'])
+        except OSError:
+            photo = None
+    box = layout['photo_box']
+    img.paste(photo or placeholder_photo(card['name']), box[:2])
+    draw.rectangle([box[0] - 2, box[1] - 2, box[2] + 1, box[3] + 1], outline=HEADER_COLOR, width=3)
+
+    left = layout['text_left']
+    text, font = fit_text(draw, card['name'], layout['name_size'], CARD_SIZE[0] - left - 30, bold=True)
+    draw.text((left, layout['name_top']), text, font=font, fill=TEXT_COLOR)
+
+    label_font = load_font(layout['field_size'])
+    value_font = load_font(layout['field_size'], bold=True)
+    for i, (label, key) in enumerate(CARD_FIELDS):
+        y = layout['field_top'] + i * layout['field_spacing']
+        draw.text((left, y), label, font=label_font, fill=LABEL_COLOR)
+        draw.text((left + layout['label_width'], y), f": {card.get(key) or '-'}", font=value_font, fill=TEXT_COLOR)
+    return img
+
+def render_sheet(job):
+    """Worker: draw one A4 sheet of cards and return it as JPEG bytes"""
+    cards, template, school_name, academic_year = job
+    sheet = Image.new('RGB', SHEET_SIZE, 'white')
+    draw = ImageDraw.Draw(sheet)
+    for card, (x, y) in zip(cards, sheet_grid()):
+        sheet.paste(render_card(card, template, school_name, academic_year), (x, y))
+        draw.rectangle([x - 1, y - 1, x + CARD_SIZE[0], y + CARD_SIZE[1]], outline='#BDBDBD')  # Cutting guide
+
+    buffer = io.BytesIO()
+    sheet.save(buffer, 'JPEG', quality=JPEG_QUALITY, dpi=(DPI, DPI))
+    return buffer.getvalue()
+
+def write_pdf(path, pages, page_px=SHEET_SIZE):
+    """
+    Stream JPEG pages into a PDF, one full-page image per page.
+
+    Pages are written as they arrive, so memory holds one sheet at a time
+    no matter how many cards are printed.
+    """
+    width_pt, height_pt = (round(px * 72 / DPI, 2) for px in page_px)
+    offsets = {}
+    page_ids = []
+    tmp_path = f"{path}.tmp"
+
+    with open(tmp_path, 'wb') as f:
+        def write_object(number, body, stream=None):
+            offsets[number] = f.tell()
+            f.write(f"{number} 0 obj\n".encode() + body)
+            if stream is not None:
+                f.write(b"\nstream\n" + stream + b"\nendstream")
+            f.write(b"\nendobj\n")
+
+        f.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        next_id = 3  # 1 is the catalog, 2 the page tree (written last, once the pages are known)
+        for jpeg in pages:
+            with Image.open(io.BytesIO(jpeg)) as img:
+                img_width, img_height = img.size
+            image_id, content_id, page_id = next_id, next_id + 1, next_id + 2
+            next_id += 3
+
+            write_object(image_id, (f"<< /Type /XObject /Subtype /Image /Width {img_width} /Height {img_height} "
+                                    f"/ColorSpace /DeviceRGB /BitsPerComponent 8 /Filter /DCTDecode "
+                                    f"/Length {len(jpeg)} >>").encode(), jpeg)
+            content = zlib.compress(f"q {width_pt} 0 0 {height_pt} 0 0 cm /Im0 Do Q".encode())
+            write_object(content_id, f"<< /Length {len(content)} /Filter /FlateDecode >>".encode(), content)
+            write_object(page_id, (f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {width_pt} {height_pt}] "
+                                   f"/Resources << /XObject << /Im0 {image_id} 0 R >> >> "
+                                   f"/Contents {content_id} 0 R >>").encode())
+            page_ids.append(page_id)
+
+        kids = ' '.join(f"{page_id} 0 R" for page_id in page_ids)
+        write_object(2, f"<< /Type /Pages /Kids [{kids}] /Count {len(page_ids)} >>".encode())
+        write_object(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        xref = f.tell()
+        f.write(f"xref\n0 {next_id}\n0000000000 65535 f \n".encode())
+        for number in range(1, next_id):
+            f.write(f"{offsets[number]:010d} 00000 n \n".encode())
+        f.write(f"trailer\n<< /Size {next_id} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode())
+
+    os.replace(tmp_path, path)
+    return len(page_ids)
+
+def generate_id_cards(cards, output=OUTPUT_FILE, template=None, school_name=SCHOOL_NAME,
+                      academic_year=ACADEMIC_YEAR, workers=None):
+    """Render cards onto A4 sheets across a process pool and write them to one PDF"""
+    per_sheet = len(sheet_grid())
+    jobs = [(cards[i:i + per_sheet], template, school_name, academic_year) for i in range(0, len(cards), per_sheet)]
+    workers = min(workers or os.cpu_count() or 1, max(1, len(jobs)))
+
+    if workers == 1:
+        pages = write_pdf(output, map(render_sheet, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            # map keeps sheet order; sheets are written to the PDF as they complete
+            pages = write_pdf(output, pool.map(render_sheet, jobs, chunksize=4))
+
+    logger.info(f"Wrote {len(cards)} ID cards on {pages} A4 sheets ({per_sheet} per sheet): {output}")
+    return output
+
+def make_synthetic_cards(count, photo_dir, distinct_photos=200):
+    """Cards with generated photos on disk, for timing the generator without a database"""
+    from clean_students_parallel import make_synthetic_students
+
+    photos = []
+    for i in range(min(count, distinct_photos)):
+        path = os.path.join(photo_dir, f"photo_{i}.jpg")
+        Image.new('RGB', (900, 1200), ((i * 37) % 256, (i * 91) % 256, (i * 53) % 256)).save(path, quality=85)
+        photos.append(path)
+
+    df = make_synthetic_students(count)
+    cards = []
+    for i, row in enumerate(df.itertuples()):
+        cards.append({
+            'name': row.student_name.upper(),
+            'admission_no': f"G{i:05d}",
+            'class_label': f"{i % 12 + 1}-{'ABC'[i % 3]}",
+            'blood_group': row.blood_group or '',
+            'dob': row.dob.strftime('%d-%m-%Y'),
+            'photo_url': photos[i % len(photos)] if i % 20 else None,  # Every 20th student has no photo
+            'roll_no': i // 36 + 1,
+        })
+    return cards
+
+def main():
+    """Generate ID cards for a tenant (or time the generator on synthetic students)"""
+    parser = argparse.ArgumentParser(description='Generate printable student ID cards')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--target', choices=['postgres', 'supabase'], default='supabase')
+    parser.add_argument('--academic-year', default=ACADEMIC_YEAR)
+    parser.add_argument('--class', dest='class_label', help="Only this class, e.g. '5-A'")
+    parser.add_argument('--school-name', default=SCHOOL_NAME)
+    parser.add_argument('--template', help='Card background image (drawn header is used when omitted)')
+    parser.add_argument('--output', default=OUTPUT_FILE)
+    parser.add_argument('--photo-cache', default=PHOTO_CACHE_DIR)
+    parser.add_argument('--refresh-photos', action='store_true', help='Download photos again even if cached')
+    parser.add_argument('--workers', type=int, help='Processes rendering sheets (default: CPU count)')
+    parser.add_argument('--benchmark', type=int, metavar='CARDS', help='Time the generator on synthetic students')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        with tempfile.TemporaryDirectory() as tmp:
+            cards = make_synthetic_cards(args.benchmark, tmp)
+            for label in ('cold', 'warm'):
+                start = time.perf_counter()
+                cache_photos(cards, os.path.join(tmp, 'cache'), refresh=False)
+                fetched = time.perf_counter()
+                generate_id_cards(cards, args.output, args.template, args.school_name, args.academic_year,
+                                  args.workers)
+                print(f"{label}: photos {fetched - start:.1f}s, render {time.perf_counter() - fetched:.1f}s")
+        return True
+
+    if args.target == 'postgres':
+        from import_students import connect_database
+        conn = connect_database()
+        if not conn:
+            return False
+        source = PostgresSource(conn)
+    else:
+        from import_students_supabase import init_supabase
+        supabase = init_supabase()
+        if not supabase:
+            return False
+        source = SupabaseSource(supabase)
+
+    cards = load_students(source, args.tenant_id, args.academic_year, args.class_label)
+    if not cards:
+        logger.error("No students found")
+        return False
+
+    cache_photos(cards, args.photo_cache, refresh=args.refresh_photos)
+    generate_id_cards(cards, args.output, args.template, args.school_name, args.academic_year, args.workers)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+Student Photo Bulk Ingestion
+Matches a folder or zip of photos to students by admission number, resizes each
+distinct image to thumbnail and standard sizes across a process pool, uploads them
+concurrently to a storage sink and sets students.photo_url in one batched update
+"""
+import io
+import os
+import re
+import sys
+import time
+import hashlib
+import argparse
+import logging
+import tempfile
+import zipfile
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from PIL import Image, ImageOps
+
+from reference_cache import ReferenceCache, PostgresSource
+
+try:
+    import boto3
+except ImportError:
+    boto3 = None
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+PHOTO_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.heic', '.bmp'}
+PHOTO_SIZES = {'thumb': 160, 'standard': 640}  # Longest side in pixels; photo_url points at 'standard'
+JPEG_QUALITY = 85
+RESIZE_WORKERS = os.cpu_count() or 1
+UPLOAD_THREADS = 16  # Uploads are network-bound, so threads rather than processes
+UPDATE_PAGE_SIZE = 1000  # Rows per UPDATE ... FROM (VALUES ...) statement
+LOCAL_SINK_DIR = 'student_photos'
+STORAGE_BUCKET = 'student-photos'  # Bucket the app's PhotoUpload screen uses
+HASH_CHUNK_SIZE = 1024 * 1024
+
+UPDATE_PHOTO_SQL = """
+    UPDATE students AS s
+    SET photo_url = v.photo_url
+    FROM (VALUES %s) AS v(id, photo_url)
+    WHERE s.id = v.id::uuid AND s.photo_url IS DISTINCT FROM v.photo_url
+"""
+
+class LocalSink:
+    """Writes objects under a directory; URLs are base_url + key, or file paths when no base_url is given"""
+
+    def __init__(self, directory=LOCAL_SINK_DIR, base_url=None):
+        self.directory = directory
+        self.base_url = base_url.rstrip('/') if base_url else None
+
+    def exists(self, key):
+        return os.path.exists(os.path.join(self.directory, key))
+
+    def put(self, key, data, content_type='image/jpeg'):
+        path = os.path.join(self.directory, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def url(self, key):
+        return f"{self.base_url}/{key}" if self.base_url else os.path.abspath(os.path.join(self.directory, key))
+
+class S3Sink:
+    """
+    Uploads to an S3-compatible bucket (AWS, MinIO, or Supabase Storage's S3
+    endpoint) with boto3; credentials come from the usual AWS_* variables.
+    """
+
+    def __init__(self, bucket=STORAGE_BUCKET, endpoint_url=None, public_base_url=None):
+        if boto3 is None:
+            raise RuntimeError("boto3 is required for the S3 sink (pip install boto3)")
+        self.bucket = bucket
+        self.client = boto3.client('s3', endpoint_url=endpoint_url)
+        self.public_base_url = (public_base_url or f"{endpoint_url or 'https://s3.amazonaws.com'}/{bucket}").rstrip('/')
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except self.client.exceptions.ClientError:
+            return False
+
+    def put(self, key, data, content_type='image/jpeg'):
+        self.client.put_object(Bucket=self.bucket, Key=key, Body=data, ContentType=content_type,
+                               CacheControl='public, max-age=31536000, immutable')
+
+    def url(self, key):
+        return f"{self.public_base_url}/{key}"
+
+def admission_key(value):
+    """Admission numbers compared without case or spaces: 'adm 2025 001' matches 'ADM2025001'"""
+    return re.sub(r'\s+', '', str(value or '')).upper()
+
+def photo_candidates(name):
+    """Admission keys a file name may carry: the stem, without a ' (2)' copy suffix, then the part before '_'"""
+    stem = os.path.splitext(os.path.basename(name))[0].strip()
+    keys = []
+    for candidate in (stem, re.sub(r'\s*\(\d+\)$', '', stem), stem.split('_', 1)[0]):
+        key = admission_key(candidate)
+        if key and key not in keys:
+            keys.append(key)
+    return keys
+
+def list_photos(source):
+    """(source, member) references for every photo in a folder (member None) or a zip archive"""
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        return [(source, name) for name in sorted(names)
+                if os.path.splitext(name)[1].lower() in PHOTO_EXTENSIONS and '__MACOSX' not in name]
+
+    photos = []
+    for root, _, files in os.walk(source):
+        for name in files:
+            if os.path.splitext(name)[1].lower() in PHOTO_EXTENSIONS:
+                photos.append((os.path.join(root, name), None))
+    return sorted(photos)
+
+@lru_cache(maxsize=4)
+def _open_zip(path, pid):
+    """
+    One open handle per archive per process.
+
+    Keyed by pid: forked resize workers inherit the parent's cached handle,
+    and sharing its file offset across processes corrupts their reads.
+    """
+    return zipfile.ZipFile(path)
+
+def open_photo(ref):
+    source, member = ref
+    return _open_zip(source, os.getpid()).open(member) if member else open(source, 'rb')
+
+def content_hash(ref):
+    """SHA-256 of the original file, read in chunks so large camera images are never held whole"""
+    digest = hashlib.sha256()
+    with open_photo(ref) as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def match_photos(photos, students):
+    """
+    Map photo references to students by admission number.
+
+    Returns ({student_id: ref}, unmatched refs). When several files match one
+    student the last one in name order wins, so 'ADM1 (2).jpg' replaces 'ADM1.jpg'.
+    """
+    by_admission = {admission_key(row['admission_no']): row['id'] for row in students if row.get('admission_no')}
+    matched, unmatched = {}, []
+    for ref in photos:
+        student_id = next((by_admission[key] for key in photo_candidates(ref[1] or ref[0]) if key in by_admission),
+                          None)
+        if student_id is None:
+            unmatched.append(ref)
+            continue
+        if student_id in matched:
+            logger.warning(f"Several photos for one student; using {ref[1] or ref[0]}")
+        matched[student_id] = ref
+    return matched, unmatched
+
+def resize_photo(ref):
+    """Decode one photo and encode every PHOTO_SIZES rendition as JPEG; returns {size: bytes} or None"""
+    try:
+        with open_photo(ref) as f, Image.open(f) as img:
+            largest = max(PHOTO_SIZES.values())
+            img.draft('RGB', (largest, largest))  # JPEGs decode straight at reduced scale
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            renditions = {}
+            for size_name, size in sorted(PHOTO_SIZES.items(), key=lambda item: -item[1]):
+                img.thumbnail((size, size), Image.LANCZOS)  # Each size is reduced from the previous one
+                buffer = io.BytesIO()
+                img.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+                renditions[size_name] = buffer.getvalue()
+            return renditions
+    except Exception as e:
+        logger.warning(f"Could not decode photo {ref[1] or ref[0]}: {e}")
+        return None
+
+def _resize_job(job):
+    digest, ref = job
+    return digest, resize_photo(ref)
+
+def object_key(tenant_id, digest, size_name):
+    """Content-addressed key: identical images share objects, and re-runs find them already uploaded"""
+    return f"{tenant_id}/{digest[:2]}/{digest}_{size_name}.jpg"
+
+def ingest_photos(matched, sink, tenant_id=TENANT_ID, workers=RESIZE_WORKERS, threads=UPLOAD_THREADS):
+    """
+    Hash, dedupe, resize and upload the matched photos.
+
+    Returns {student_id: photo_url} for every student whose photo was stored.
+    Each distinct image is decoded once however many students share it, and
+    renditions already in the sink are not uploaded again.
+    """
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as io_pool:
+        digests = dict(zip(matched, io_pool.map(content_hash, matched.values())))
+    unique = {}
+    for student_id, digest in digests.items():
+        unique.setdefault(digest, matched[student_id])
+    pending = {digest: ref for digest, ref in unique.items()
+               if not sink.exists(object_key(tenant_id, digest, 'standard'))}
+    logger.info(f"{len(matched)} photos, {len(unique)} distinct, {len(unique) - len(pending)} already stored "
+                f"(hashed in {time.perf_counter() - start:.1f}s)")
+
+    stored = {digest for digest in unique if digest not in pending}
+    failed = []
+    uploads = []
+    with ThreadPoolExecutor(max_workers=threads) as upload_pool:
+        def upload(digest, renditions):
+            # 'standard' goes last: its presence is what marks an image as fully stored
+            for size_name, data in sorted(renditions.items(), key=lambda item: item[0] == 'standard'):
+                sink.put(object_key(tenant_id, digest, size_name), data)
+            return digest
+
+        with ProcessPoolExecutor(max_workers=workers) as resize_pool:
+            for digest, renditions in resize_pool.map(_resize_job, pending.items(), chunksize=8):
+                if renditions:
+                    uploads.append(upload_pool.submit(upload, digest, renditions))
+                else:
+                    failed.append(digest)
+
+        for future in uploads:
+            try:
+                stored.add(future.result())
+            except Exception as e:
+                logger.error(f"Upload failed: {e}")
+
+    logger.info(f"Resized and uploaded {len(uploads)} images in {time.perf_counter() - start:.1f}s")
+    if failed:
+        failed_digests = set(failed)
+        students = sum(1 for digest in digests.values() if digest in failed_digests)
+        names = [unique[digest][1] or unique[digest][0] for digest in failed[:20]]
+        logger.error(f"{len(failed)} images could not be decoded; {students} students keep their old photo: "
+                     f"{', '.join(names)}")
+    return {student_id: sink.url(object_key(tenant_id, digest, 'standard'))
+            for student_id, digest in digests.items() if digest in stored}
+
+def update_photo_urls(conn, photo_urls):
+    """Set students.photo_url for every ingested photo in one transaction; returns the number changed"""
+    from psycopg2.extras import execute_values  # Only needed when writing
+
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, UPDATE_PHOTO_SQL, list(photo_urls.items()), page_size=UPDATE_PAGE_SIZE)
+        updated = cursor.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    logger.info(f"Updated photo_url for {updated} of {len(photo_urls)} students")
+    return updated
+
+def make_synthetic_photos(directory, students, distinct=None, size=(3000, 4000)):
+    """Camera-sized JPEGs named by admission number; with distinct set, images repeat to exercise dedup"""
+    os.makedirs(directory, exist_ok=True)
+    distinct = distinct or students
+    rows = []
+    for i in range(students):
+        shade = (i % distinct) * 37 % 256
+        Image.new('RGB', size, (shade, 120, 255 - shade)).save(os.path.join(directory, f"ADM{i:05d}.jpg"),
+                                                              'JPEG', quality=90)
+        rows.append({'id': f"student-{i}", 'admission_no': f"ADM{i:05d}"})
+    return rows
+
+def benchmark(students, workers, threads):
+    """Time ingestion of synthetic camera photos into a temporary local sink"""
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'photos')
+        rows = make_synthetic_photos(source, students, distinct=max(1, students * 3 // 4))
+        original = sum(os.path.getsize(ref[0]) for ref in list_photos(source))
+        matched, _ = match_photos(list_photos(source), rows)
+        sink = LocalSink(os.path.join(tmp, 'sink'))
+
+        start = time.perf_counter()
+        urls = ingest_photos(matched, sink, 'bench', workers, threads)
+        elapsed = time.perf_counter() - start
+        stored = sum(os.path.getsize(os.path.join(root, name))
+                     for root, _, files in os.walk(sink.directory) for name in files)
+        again = time.perf_counter()
+        ingest_photos(matched, sink, 'bench', workers, threads)
+        print(f"{students} photos ({original / 1e6:.1f} MB) -> {len(urls)} URLs, {stored / 1e6:.2f} MB stored "
+              f"in {elapsed:.2f}s; re-run {time.perf_counter() - again:.2f}s")
+
+        # The same photos from a zip: every worker process must read the archive through its own handle
+        archive = os.path.join(tmp, 'photos.zip')
+        with zipfile.ZipFile(archive, 'w') as zf:
+            for ref in list_photos(source):
+                zf.write(ref[0], os.path.basename(ref[0]))
+        matched, _ = match_photos(list_photos(archive), rows)
+        start = time.perf_counter()
+        zip_urls = ingest_photos(matched, LocalSink(os.path.join(tmp, 'zip_sink')), 'bench', workers, threads)
+        assert len(zip_urls) == len(urls), f"{len(urls) - len(zip_urls)} photos lost reading the zip"
+        print(f"{students} photos from a zip -> {len(zip_urls)} URLs in {time.perf_counter() - start:.2f}s")
+    return True
+
+def main():
+    """Ingest a folder or zip of student photos"""
+    parser = argparse.ArgumentParser(description='Bulk-ingest student photos named by admission number')
+    parser.add_argument('source', nargs='?', help='Folder or .zip of photos')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--sink', choices=['local', 's3'], default='local')
+    parser.add_argument('--sink-dir', default=LOCAL_SINK_DIR, help='Directory for the local sink')
+    parser.add_argument('--base-url', help='Public URL prefix for stored objects')
+    parser.add_argument('--bucket', default=STORAGE_BUCKET)
+    parser.add_argument('--endpoint-url', help='S3-compatible endpoint, e.g. https://<project>.supabase.co/storage/v1/s3')
+    parser.add_argument('--workers', type=int, default=RESIZE_WORKERS, help='Resize processes')
+    parser.add_argument('--threads', type=int, default=UPLOAD_THREADS, help='Concurrent uploads')
+    parser.add_argument('--dry-run', action='store_true', help='Match photos to students and report only')
+    parser.add_argument('--benchmark', type=int, metavar='PHOTOS', help='Time ingestion of synthetic photos')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        return benchmark(args.benchmark, args.workers, args.threads)
+    if not args.source or not os.path.exists(args.source):
+        logger.error("Give a folder or zip of photos")
+        return False
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    students = ReferenceCache(PostgresSource(conn)).rows(args.tenant_id, 'students')
+    photos = list_photos(args.source)
+    matched, unmatched = match_photos(photos, students)
+    logger.info(f"{len(photos)} photos: {len(matched)} matched to students, {len(unmatched)} unmatched")
+    for source, member in unmatched[:20]:
+        logger.warning(f"No student with the admission number in {member or source}")
+    if args.dry_run or not matched:
+        return True
+
+    if args.sink == 's3':
+        sink = S3Sink(args.bucket, args.endpoint_url, args.base_url)
+    else:
+        sink = LocalSink(args.sink_dir, args.base_url)
+    photo_urls = ingest_photos(matched, sink, args.tenant_id, args.workers, args.threads)
+    update_photo_urls(conn, photo_urls)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
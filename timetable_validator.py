@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Timetable Validator and Auto-fill
+Loads a tenant's timetable and period settings once, keeps per-teacher and per-class
+occupancy bitsets over (day, period), reports every clash in one pass and fills free
+slots from teacher_subjects by intersecting those bitsets
+"""
+import sys
+import csv
+import time
+import random
+import argparse
+import logging
+from collections import defaultdict
+
+from reference_cache import PostgresSource
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+ACADEMIC_YEAR = '2025-26'
+DAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']  # As the day_of_week CHECK allows
+PERIODS_PER_SUBJECT = 5  # Weekly periods auto-fill aims for per subject
+CONFLICTS_FILE = 'timetable_conflicts.csv'
+PLAN_FILE = 'timetable_autofill.csv'
+INSERT_PAGE_SIZE = 1000
+
+ENTRY_COLUMNS = ['id', 'class_id', 'subject_id', 'teacher_id', 'day_of_week', 'period_number', 'start_time',
+                 'end_time', 'academic_year']
+PERIOD_COLUMNS = ['period_number', 'start_time', 'end_time', 'period_type', 'is_active', 'academic_year']
+
+INSERT_ENTRIES_SQL = """
+    INSERT INTO timetable_entries (class_id, subject_id, teacher_id, day_of_week, period_number, start_time,
+                                   end_time, academic_year, tenant_id)
+    VALUES %s
+"""
+
+class TimetableIndex:
+    """
+    Occupancy of every teacher and class as integer bitsets.
+
+    Slot s = day * periods + period index, over the active 'class' periods of
+    period_settings. A bit is set when the teacher or class is busy in that
+    slot, so 'both free' is ~(class_bits | teacher_bits) & full and clash checks
+    are a single AND.
+    """
+
+    def __init__(self, periods):
+        self.periods = sorted(periods, key=lambda period: period['period_number'])
+        self.period_index = {period['period_number']: i for i, period in enumerate(self.periods)}
+        self.slots = len(DAYS) * len(self.periods)
+        self.full = (1 << self.slots) - 1
+        self.teacher_bits = defaultdict(int)
+        self.class_bits = defaultdict(int)
+        self.subject_days = defaultdict(int)  # (class, subject) -> bitset of slots, for spreading over days
+        self.owners = {}  # (kind, owner, slot) -> first entry, only consulted when a clash is found
+
+    def period(self, period_number):
+        """period_settings row of a period number, or None when it is not a teaching period"""
+        return self.periods[self.period_index[period_number]] if period_number in self.period_index else None
+
+    def slot(self, day, period_number):
+        """Slot number for a day name and period number, or None when it is not a teaching period"""
+        if day not in DAYS or period_number not in self.period_index:
+            return None
+        return DAYS.index(day) * len(self.periods) + self.period_index[period_number]
+
+    def slot_label(self, slot):
+        period = self.periods[slot % len(self.periods)]
+        return DAYS[slot // len(self.periods)], period['period_number']
+
+    def day_mask(self, slot):
+        """Bits of every slot on the same day as slot"""
+        width = len(self.periods)
+        return ((1 << width) - 1) << (slot // width * width)
+
+    def add(self, entry):
+        """
+        Mark an entry's slot busy; returns the clashes it causes.
+
+        Each clash is (kind, owner id, slot, earlier entry, this entry).
+        """
+        slot = self.slot(entry['day_of_week'], entry['period_number'])
+        if slot is None:
+            return [('invalid_slot', entry['class_id'], None, None, entry)]
+        bit = 1 << slot
+        clashes = []
+        for kind, bits, owner in (('class', self.class_bits, entry['class_id']),
+                                  ('teacher', self.teacher_bits, entry['teacher_id'])):
+            if bits[owner] & bit:
+                clashes.append((kind, owner, slot, self.owners[(kind, owner, slot)], entry))
+            else:
+                bits[owner] |= bit
+                self.owners[(kind, owner, slot)] = entry
+        self.subject_days[(entry['class_id'], entry['subject_id'])] |= bit
+        return clashes
+
+    def free_slots(self, class_id, teacher_id):
+        return self.full & ~(self.class_bits[class_id] | self.teacher_bits[teacher_id])
+
+def teaching_periods(period_rows, academic_year=ACADEMIC_YEAR):
+    """Active class periods of the academic year (breaks and lunch are never timetabled)"""
+    return [row for row in period_rows
+            if row.get('academic_year') == academic_year and row.get('is_active', True) is not False
+            and (row.get('period_type') or 'class') == 'class']
+
+def find_conflicts(index, entries):
+    """Index every entry and return all clashes, in one pass over the timetable"""
+    conflicts = []
+    for entry in entries:
+        conflicts.extend(index.add(entry))
+        period = index.period(entry['period_number'])
+        if period and (str(entry['start_time'])[:5], str(entry['end_time'])[:5]) != \
+                (str(period['start_time'])[:5], str(period['end_time'])[:5]):
+            conflicts.append(('time_mismatch', entry['class_id'], None, period, entry))
+    return conflicts
+
+def autofill(index, subjects, teacher_subjects, periods_per_subject=PERIODS_PER_SUBJECT):
+    """
+    New entries placing each class subject up to periods_per_subject a week.
+
+    subjects are rows with id and class_id; teacher_subjects map subject ids to
+    the teachers assigned to them. Subjects are placed one period per round so
+    every subject gets a share of the free slots. Each placement takes the
+    teacher whose free slots overlap the class's most, and prefers a day the
+    subject is not taught yet. Returns (entries, unplaced) where unplaced maps
+    (class_id, subject_id) to the periods still missing.
+    """
+    teachers_by_subject = defaultdict(list)
+    for row in teacher_subjects:
+        if row.get('teacher_id') and row['teacher_id'] not in teachers_by_subject[row['subject_id']]:
+            teachers_by_subject[row['subject_id']].append(row['teacher_id'])
+
+    needed = {}
+    for subject in subjects:
+        key = (subject['class_id'], subject['id'])
+        missing = periods_per_subject - index.subject_days[key].bit_count()
+        if missing > 0 and teachers_by_subject.get(subject['id']):
+            needed[key] = missing
+
+    placed = []
+    while needed:
+        progress = False
+        # Most constrained first: the subject whose class has the fewest free slots left
+        for key in sorted(needed, key=lambda key: (index.full & ~index.class_bits[key[0]]).bit_count()):
+            class_id, subject_id = key
+            teacher_id = max(teachers_by_subject[subject_id],
+                             key=lambda teacher: index.free_slots(class_id, teacher).bit_count())
+            free = index.free_slots(class_id, teacher_id)
+            if not free:
+                continue
+            taught = index.subject_days[key]
+            fresh = free
+            for slot in range(0, index.slots, len(index.periods)):
+                if taught & index.day_mask(slot):
+                    fresh &= ~index.day_mask(slot)
+            candidates = fresh or free
+            slot = (candidates & -candidates).bit_length() - 1  # Lowest free slot
+            day, period_number = index.slot_label(slot)
+            period = index.period(period_number)
+            entry = {'class_id': class_id, 'subject_id': subject_id, 'teacher_id': teacher_id, 'day_of_week': day,
+                     'period_number': period_number, 'start_time': period['start_time'],
+                     'end_time': period['end_time']}
+            index.add(entry)
+            placed.append(entry)
+            needed[key] -= 1
+            if not needed[key]:
+                del needed[key]
+            progress = True
+        if not progress:
+            break
+
+    return placed, needed
+
+def load_timetable(source, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR):
+    """Periods, entries, subjects and teacher assignments of a tenant, one query per table"""
+    start = time.perf_counter()
+    periods = teaching_periods(source.fetch('period_settings', PERIOD_COLUMNS, ['period_number'], tenant_id),
+                               academic_year)
+    entries = [row for row in source.fetch('timetable_entries', ENTRY_COLUMNS, ['day_of_week', 'period_number'],
+                                           tenant_id) if row.get('academic_year') == academic_year]
+    subjects = [row for row in source.fetch('subjects', ['id', 'name', 'class_id', 'academic_year'], ['name'],
+                                            tenant_id) if row.get('academic_year') == academic_year]
+    teacher_subjects = source.fetch('teacher_subjects', ['teacher_id', 'subject_id'], ['teacher_id'], tenant_id)
+    logger.info(f"Loaded {len(periods)} periods, {len(entries)} timetable entries, {len(subjects)} subjects and "
+                f"{len(teacher_subjects)} teacher assignments in {time.perf_counter() - start:.1f}s")
+    return periods, entries, subjects, teacher_subjects
+
+def write_conflicts(index, conflicts, path=CONFLICTS_FILE):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['kind', 'owner_id', 'day_of_week', 'period_number', 'entry_id', 'other_entry_id',
+                         'class_id', 'subject_id', 'teacher_id'])
+        for kind, owner, slot, other, entry in conflicts:
+            day, period_number = index.slot_label(slot) if slot is not None \
+                else (entry['day_of_week'], entry['period_number'])
+            writer.writerow([kind, owner, day, period_number, entry.get('id'),
+                             other.get('id') if other and kind in ('class', 'teacher') else '',
+                             entry['class_id'], entry['subject_id'], entry['teacher_id']])
+
+def insert_entries(conn, entries, tenant_id=TENANT_ID, academic_year=ACADEMIC_YEAR):
+    """Insert auto-filled entries in one transaction"""
+    from psycopg2.extras import execute_values  # Only needed when writing
+
+    values = [(entry['class_id'], entry['subject_id'], entry['teacher_id'], entry['day_of_week'],
+               entry['period_number'], entry['start_time'], entry['end_time'], academic_year, tenant_id)
+              for entry in entries]
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, INSERT_ENTRIES_SQL, values, page_size=INSERT_PAGE_SIZE)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+    logger.info(f"Inserted {len(values)} timetable entries")
+
+def make_synthetic_timetable(classes=40, teachers=60, periods=8, fill=0.6, seed=7):
+    """A school-sized timetable, placed at random so it has some double bookings"""
+    rng = random.Random(seed)
+    period_rows = [{'period_number': p, 'start_time': f"{8 + p:02d}:00", 'end_time': f"{8 + p:02d}:45",
+                    'period_type': 'class', 'is_active': True, 'academic_year': ACADEMIC_YEAR}
+                   for p in range(1, periods + 1)]
+    subjects = [{'id': f"subject-{c}-{s}", 'class_id': f"class-{c}"} for c in range(classes) for s in range(7)]
+    teacher_subjects = [{'teacher_id': f"teacher-{i % teachers}", 'subject_id': subject['id']}
+                        for i, subject in enumerate(subjects)]
+    class_of = {subject['id']: subject['class_id'] for subject in subjects}
+    entries = []
+    for assignment in rng.sample(teacher_subjects, int(len(teacher_subjects) * fill)):
+        subject_id = assignment['subject_id']
+        for _ in range(3):
+            period = rng.choice(period_rows)
+            entries.append({
+                'id': f"entry-{len(entries)}", 'class_id': class_of[subject_id], 'subject_id': subject_id,
+                'teacher_id': assignment['teacher_id'], 'day_of_week': rng.choice(DAYS),
+                'period_number': period['period_number'], 'start_time': period['start_time'],
+                'end_time': period['end_time'], 'academic_year': ACADEMIC_YEAR,
+            })
+    return period_rows, entries, subjects, teacher_subjects
+
+def conflicts_by_scan(entries):
+    """Pairwise check the per-query approach amounts to, for comparison"""
+    found = 0
+    for i, entry in enumerate(entries):
+        for other in entries[:i]:
+            if entry['day_of_week'] == other['day_of_week'] and entry['period_number'] == other['period_number'] \
+                    and (entry['class_id'] == other['class_id'] or entry['teacher_id'] == other['teacher_id']):
+                found += 1
+                break
+    return found
+
+def main():
+    """Validate a tenant's timetable and optionally auto-fill free slots"""
+    parser = argparse.ArgumentParser(description='Find timetable clashes and auto-fill free periods')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--academic-year', default=ACADEMIC_YEAR)
+    parser.add_argument('--report', default=CONFLICTS_FILE, help='CSV of every clash found')
+    parser.add_argument('--autofill', action='store_true', help='Place teacher_subjects into free slots')
+    parser.add_argument('--periods-per-subject', type=int, default=PERIODS_PER_SUBJECT)
+    parser.add_argument('--apply', action='store_true', help='Insert the auto-filled entries (otherwise only a plan CSV)')
+    parser.add_argument('--benchmark', action='store_true', help='Time validation and auto-fill on a synthetic school')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        periods, entries, subjects, teacher_subjects = make_synthetic_timetable()
+        start = time.perf_counter()
+        index = TimetableIndex(periods)
+        conflicts = find_conflicts(index, entries)
+        checked = time.perf_counter() - start
+        placed, unplaced = autofill(index, subjects, teacher_subjects, args.periods_per_subject)
+        filled = time.perf_counter() - start - checked
+        start = time.perf_counter()
+        scanned = conflicts_by_scan(entries)
+        clashing = len({conflict[4]['id'] for conflict in conflicts if conflict[0] in ('class', 'teacher')})
+        print(f"{len(entries)} entries: {len(conflicts)} clashes over {clashing} entries in {checked * 1000:.1f}ms "
+              f"(pairwise scan: {scanned} entries, {time.perf_counter() - start:.2f}s); "
+              f"auto-fill placed {len(placed)} periods in {filled * 1000:.1f}ms, "
+              f"{sum(unplaced.values())} could not be placed")
+        return True
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    periods, entries, subjects, teacher_subjects = load_timetable(PostgresSource(conn), args.tenant_id,
+                                                                  args.academic_year)
+    if not periods:
+        logger.error(f"No active class periods in period_settings for {args.academic_year}")
+        return False
+
+    index = TimetableIndex(periods)
+    conflicts = find_conflicts(index, entries)
+    write_conflicts(index, conflicts, args.report)
+    counts = defaultdict(int)
+    for conflict in conflicts:
+        counts[conflict[0]] += 1
+    logger.info(f"{len(conflicts)} problems in {len(entries)} entries: {dict(counts) or 'none'} "
+                f"(report: {args.report})")
+
+    if args.autofill:
+        placed, unplaced = autofill(index, subjects, teacher_subjects, args.periods_per_subject)
+        with open(PLAN_FILE, 'w', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=['class_id', 'subject_id', 'teacher_id', 'day_of_week',
+                                                   'period_number', 'start_time', 'end_time'])
+            writer.writeheader()
+            writer.writerows(placed)
+        logger.info(f"Auto-fill placed {len(placed)} periods ({PLAN_FILE}); "
+                    f"{sum(unplaced.values())} periods for {len(unplaced)} subjects found no free slot")
+        if args.apply and placed:
+            insert_entries(conn, placed, args.tenant_id, args.academic_year)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)
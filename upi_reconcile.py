@@ -0,0 +1,407 @@
+#!/usr/bin/env python3
+"""
+UPI Statement Reconciliation
+Streams bank/PSP statement exports (CSV or Excel) in chunks, hash-joins their credits
+to pending upi_transactions by reference number with an amount and date-window
+fallback, and clears every match in one transaction: SUCCESS plus a student_fees row
+"""
+import os
+import re
+import sys
+import csv
+import time
+import uuid
+import random
+import argparse
+import logging
+import tempfile
+from datetime import date, timedelta
+from collections import defaultdict
+
+import pandas as pd
+from openpyxl import load_workbook
+
+logger = logging.getLogger(__name__)
+
+# Constants
+TENANT_ID = '9abe534f-1a12-474c-a387-f8795ad3ab5a'
+CHUNK_ROWS = 5000  # Statement rows per chunk
+HEADER_SCAN_ROWS = 40  # Bank exports put account details above the header row
+DATE_WINDOW_DAYS = 2  # Fallback matches allow the bank date to differ from payment_date by this much
+REFERENCE_LENGTH = 6  # referenceNumberGenerator.js issues 6-character references
+BANK_REFERENCE_PATTERN = re.compile(r'\b(?=[A-Z0-9]*\d)[A-Z0-9]{10,}\b')  # UTR/RRN-like tokens in verification_notes
+UPDATE_PAGE_SIZE = 1000  # Rows per UPDATE ... FROM (VALUES ...) / INSERT statement
+REPORT_FILE = 'upi_reconciliation.csv'
+
+# Statement header names seen in Indian bank and PSP exports, per field
+COLUMN_ALIASES = {
+    'reference': {'utr', 'utr no', 'utr number', 'rrn', 'upi ref no', 'upi ref', 'reference no', 'ref no',
+                  'reference number', 'ref no/cheque no', 'chq/ref no', 'chq/ref number', 'transaction id',
+                  'bank reference', 'transaction reference'},
+    'amount': {'amount', 'credit', 'credit amount', 'credit amt', 'deposit', 'deposits', 'deposit amt',
+               'cr amount', 'amount (inr)', 'amount(inr)', 'transaction amount', 'txn amount'},
+    'date': {'date', 'txn date', 'transaction date', 'value date', 'value dt', 'tran date', 'posting date'},
+    'narration': {'narration', 'description', 'remarks', 'particulars', 'transaction remarks', 'details',
+                  'transaction details', 'note'},
+    'direction': {'dr/cr', 'cr/dr', 'type', 'txn type', 'transaction type'},
+}
+
+PENDING_QUERY = """
+    SELECT id, student_id, amount, reference_number, payment_date, fee_component, academic_year
+    FROM upi_transactions
+    WHERE tenant_id = %(tenant_id)s AND payment_status = 'PENDING_ADMIN_VERIFICATION' AND student_fee_id IS NULL
+"""
+# Everything no longer pending: its reference_number, and the bank reference recorded in its notes when it was verified
+SETTLED_QUERY = """
+    SELECT reference_number, verification_notes
+    FROM upi_transactions
+    WHERE tenant_id = %(tenant_id)s AND NOT (payment_status = 'PENDING_ADMIN_VERIFICATION' AND student_fee_id IS NULL)
+"""
+# student_fee_id is a plain foreign key, so the fee rows are inserted first. The update is guarded by
+# status, so rows an admin settled meanwhile are left alone; fee rows of ids it does not return are deleted
+UPDATE_TRANSACTIONS_SQL = """
+    UPDATE upi_transactions AS u
+    SET payment_status = 'SUCCESS', student_fee_id = v.fee_id::uuid, verified_at = now(), updated_at = now(),
+        verification_notes = v.notes
+    FROM (VALUES %s) AS v(id, fee_id, notes)
+    WHERE u.id = v.id::uuid AND u.payment_status = 'PENDING_ADMIN_VERIFICATION'
+    RETURNING u.id
+"""
+INSERT_FEES_SQL = """
+    INSERT INTO student_fees (id, student_id, academic_year, fee_component, amount_paid, payment_date, payment_mode,
+                              remarks, tenant_id, status, total_amount, remaining_amount)
+    VALUES %s
+"""
+DELETE_FEES_SQL = """
+    DELETE FROM student_fees AS f
+    USING (VALUES %s) AS v(id)
+    WHERE f.id = v.id::uuid
+"""
+
+def _header_key(value):
+    return re.sub(r'\s+', ' ', str(value or '').strip().lower()).rstrip('.').replace(' /', '/').replace('/ ', '/')
+
+def iter_raw_rows(path):
+    """Rows of a statement as lists of values, streamed from CSV or the first sheet of an Excel file"""
+    if os.path.splitext(path)[1].lower() in ('.xlsx', '.xlsm'):
+        workbook = load_workbook(path, read_only=True, data_only=True)
+        try:
+            for values in workbook.worksheets[0].iter_rows(values_only=True):
+                yield list(values)
+        finally:
+            workbook.close()
+        return
+    with open(path, 'r', newline='', encoding='utf-8-sig', errors='replace') as f:
+        yield from csv.reader(f)
+
+def iter_statement_chunks(path, chunk_rows=CHUNK_ROWS):
+    """
+    Statement credits as DataFrame chunks with reference, amount, date and narration columns.
+
+    The header row is the first one (within HEADER_SCAN_ROWS) naming an amount
+    and a date column. Debits are dropped when the export has a Dr/Cr column.
+    """
+    rows = iter_raw_rows(path)
+    mapping = None
+    for _, values in zip(range(HEADER_SCAN_ROWS), rows):
+        keys = [_header_key(value) for value in values]
+        found = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            for position, key in enumerate(keys):
+                if key in aliases and field not in found:
+                    found[field] = position
+        if 'amount' in found and 'date' in found:
+            mapping = found
+            break
+    if mapping is None:
+        raise ValueError(f"No header row with amount and date columns in the first {HEADER_SCAN_ROWS} rows of {path}")
+    columns = ', '.join(f"{field}={keys[position]!r}" for field, position in mapping.items())
+    logger.info(f"{os.path.basename(path)}: columns {columns}")
+
+    def to_frame(buffer):
+        frame = pd.DataFrame({field: [values[position] if position < len(values) else None for values in buffer]
+                              for field, position in mapping.items()})
+        if 'direction' in frame:
+            frame = frame[frame['direction'].astype(str).str.strip().str.upper().str.startswith('C')]
+        frame = frame.assign(
+            amount=pd.to_numeric(frame['amount'].astype(str).str.replace(r'[^\d.\-]', '', regex=True),
+                                 errors='coerce'),
+            date=pd.to_datetime(frame['date'], dayfirst=True, errors='coerce', format='mixed').dt.date,
+        )
+        for field in ('reference', 'narration'):
+            frame[field] = frame[field].fillna('').astype(str).str.strip() if field in frame else ''
+        return frame[frame['amount'] > 0].reset_index(drop=True)
+
+    buffer = []
+    for values in rows:
+        if not any(value not in (None, '') for value in values):
+            continue
+        buffer.append(values)
+        if len(buffer) >= chunk_rows:
+            yield to_frame(buffer)
+            buffer = []
+    if buffer:
+        yield to_frame(buffer)
+
+def to_paise(amount):
+    return int(round(float(amount) * 100))
+
+class PendingIndex:
+    """
+    Pending UPI transactions hashed for the join.
+
+    by_reference maps the normalized reference_number to its transaction;
+    by_amount maps an amount in paise to the transactions of that amount, the
+    fallback when a statement line carries no known reference. A transaction
+    leaves both as soon as it is matched. settled_references holds the
+    reference_number of every transaction that is no longer pending (including
+    those matched here) and settled_bank_references the UTRs recorded when they
+    were verified, so a line paying for one of them never reaches the fallback.
+    """
+
+    def __init__(self, transactions, settled_references=(), settled_bank_references=()):
+        self.transactions = {txn['id']: txn for txn in transactions}
+        self.by_reference = {str(txn['reference_number']).strip().upper(): txn['id'] for txn in transactions}
+        self.settled_references = {str(reference).strip().upper() for reference in settled_references}
+        self.settled_bank_references = {str(reference).strip().upper() for reference in settled_bank_references}
+        self.by_amount = defaultdict(set)
+        for txn in transactions:
+            self.by_amount[to_paise(txn['amount'])].add(txn['id'])
+
+    def take(self, txn_id):
+        txn = self.transactions.pop(txn_id)
+        self.by_reference.pop(str(txn['reference_number']).strip().upper(), None)
+        self.settled_references.add(str(txn['reference_number']).strip().upper())
+        self.by_amount[to_paise(txn['amount'])].discard(txn_id)
+        return txn
+
+    def find_reference(self, reference, narration):
+        """Transaction whose reference is the statement's reference or any token of its narration"""
+        for token in [reference.strip().upper()] + re.findall(r'[A-Z0-9]+', narration.upper()):
+            txn_id = self.by_reference.get(token)
+            if txn_id is not None:
+                return txn_id
+        return None
+
+    def is_settled(self, reference, narration):
+        """Whether the line's UTR was already cleared, or it names a transaction that is no longer pending"""
+        reference = reference.strip().upper()
+        if reference and reference in self.settled_bank_references:
+            return True
+        tokens = [reference] + re.findall(r'[A-Z0-9]+', narration.upper())
+        return any(token in self.settled_references for token in tokens)
+
+    def find_amount_date(self, paise, day, window=DATE_WINDOW_DAYS):
+        """(transaction id, ambiguous): the single pending transaction of this amount within the date window"""
+        if day is None or pd.isna(day):
+            return None, False
+        candidates = [txn_id for txn_id in self.by_amount.get(paise, ())
+                      if abs((self.transactions[txn_id]['payment_date'] - day).days) <= window]
+        if len(candidates) == 1:
+            return candidates[0], False
+        return None, len(candidates) > 1
+
+def reconcile(index, chunks, window=DATE_WINDOW_DAYS):
+    """
+    Match statement credits against the pending index.
+
+    Returns (matches, unmatched) where matches are dicts with the transaction,
+    the statement line and the method ('reference' or 'amount_date'), and
+    unmatched lists statement credits that found no transaction, flagged when
+    several transactions of the same amount made the fallback ambiguous. A
+    reference match also requires the amount to agree. Lines repeated across
+    chunks or overlapping exports (same UTR, or same narration, amount and date
+    when there is none) are counted once, and lines naming a transaction that
+    is already settled never try the fallback. window None turns the amount
+    and date fallback off.
+    """
+    matches, unmatched = [], []
+    deferred = []  # Lines without a reference hit; they try the fallback after every reference has been claimed
+    seen = set()
+    for chunk in chunks:
+        for line in chunk.itertuples(index=False):
+            paise = to_paise(line.amount)
+            key = line.reference.strip().upper() or (line.narration.strip().upper(), paise, line.date)
+            if key in seen:
+                unmatched.append({'line': line, 'reason': 'duplicate statement line'})
+                continue
+            seen.add(key)
+            txn_id = index.find_reference(line.reference, line.narration)
+            if txn_id is not None and to_paise(index.transactions[txn_id]['amount']) == paise:
+                matches.append({'txn': index.take(txn_id), 'line': line, 'method': 'reference'})
+            elif txn_id is not None:
+                unmatched.append({'line': line, 'reason': 'amount differs from reference match'})
+            elif index.is_settled(line.reference, line.narration):
+                unmatched.append({'line': line, 'reason': 'already settled'})
+            else:
+                deferred.append(line)
+
+    for line in deferred:
+        txn_id, ambiguous = index.find_amount_date(to_paise(line.amount), line.date, window) \
+            if window is not None else (None, False)
+        if txn_id is not None:
+            matches.append({'txn': index.take(txn_id), 'line': line, 'method': 'amount_date'})
+        else:
+            unmatched.append({'line': line, 'reason': 'ambiguous amount/date' if ambiguous else 'no transaction'})
+    return matches, unmatched
+
+def load_pending(conn, tenant_id=TENANT_ID):
+    cursor = conn.cursor()
+    try:
+        cursor.execute(PENDING_QUERY, {'tenant_id': tenant_id})
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+def load_settled(conn, tenant_id=TENANT_ID):
+    """(reference numbers, bank references) of every transaction that is no longer pending"""
+    cursor = conn.cursor()
+    try:
+        cursor.execute(SETTLED_QUERY, {'tenant_id': tenant_id})
+        rows = cursor.fetchall()
+    finally:
+        cursor.close()
+    references = {reference for reference, _ in rows if reference}
+    bank_references = {token for _, notes in rows for token in BANK_REFERENCE_PATTERN.findall((notes or '').upper())}
+    return references, bank_references
+
+def clear_matches(conn, matches, tenant_id=TENANT_ID):
+    """Insert student_fees rows for matched transactions and mark them SUCCESS, all in one transaction"""
+    from psycopg2.extras import execute_values  # Only needed when writing
+
+    fee_ids = {match['txn']['id']: str(uuid.uuid4()) for match in matches}
+    fees = [(fee_ids[match['txn']['id']], str(match['txn']['student_id']), match['txn']['academic_year'],
+             match['txn']['fee_component'], match['txn']['amount'], match['txn']['payment_date'], 'UPI',
+             f"UPI ref {match['txn']['reference_number']}", tenant_id, 'paid', match['txn']['amount'], 0)
+            for match in matches]
+    updates = [(str(match['txn']['id']), fee_ids[match['txn']['id']],
+                f"Auto-reconciled by {match['method'].replace('_', '/')} against statement "
+                f"{match['line'].reference or match['line'].narration[:60]} on {match['line'].date}")
+               for match in matches]
+    cursor = conn.cursor()
+    try:
+        execute_values(cursor, INSERT_FEES_SQL, fees, page_size=UPDATE_PAGE_SIZE)
+        cleared = {str(row[0]) for row in execute_values(cursor, UPDATE_TRANSACTIONS_SQL, updates,
+                                                         page_size=UPDATE_PAGE_SIZE, fetch=True)}
+        orphans = [(fee_ids[match['txn']['id']],) for match in matches if str(match['txn']['id']) not in cleared]
+        if orphans:
+            execute_values(cursor, DELETE_FEES_SQL, orphans, page_size=UPDATE_PAGE_SIZE)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+    skipped = len(matches) - len(cleared)
+    logger.info(f"Cleared {len(cleared)} UPI payments with {len(cleared)} student_fees rows"
+                f"{f'; {skipped} were verified by someone else meanwhile' if skipped else ''}")
+    return len(cleared)
+
+def write_report(matches, unmatched, path=REPORT_FILE):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['result', 'method_or_reason', 'upi_transaction_id', 'reference_number', 'amount',
+                         'payment_date', 'statement_date', 'statement_reference', 'narration'])
+        for match in matches:
+            txn, line = match['txn'], match['line']
+            writer.writerow(['matched', match['method'], txn['id'], txn['reference_number'], line.amount,
+                             txn['payment_date'], line.date, line.reference, line.narration])
+        for item in unmatched:
+            line = item['line']
+            writer.writerow(['unmatched', item['reason'], '', '', line.amount, '', line.date, line.reference,
+                             line.narration])
+
+def make_synthetic_statement(path, pending_count, seed=7):
+    """Pending transactions and a bank CSV crediting most of them, some with the reference only in the narration"""
+    rng = random.Random(seed)
+    alphabet = 'ABCDEFGHJKLMNPQRSTUVWXYZ23456789'
+    references = set()
+    while len(references) < pending_count:
+        references.add(''.join(rng.choice(alphabet) for _ in range(REFERENCE_LENGTH)))
+    transactions = [{'id': f"txn-{i}", 'student_id': f"student-{i}", 'amount': float(rng.randint(5, 400) * 50),
+                     'reference_number': reference, 'payment_date': date(2025, 7, 1) + timedelta(days=rng.randint(0, 60)),
+                     'fee_component': 'Tuition Fee', 'academic_year': '2025-26'}
+                    for i, reference in enumerate(sorted(references))]
+
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Account Statement for A/C XXXX1234'])
+        writer.writerow([])
+        writer.writerow(['Txn Date', 'Narration', 'Chq/Ref No.', 'Withdrawal Amt.', 'Deposit Amt.', 'Dr/Cr'])
+        for txn in transactions:
+            roll = rng.random()
+            if roll < 0.05:
+                continue  # Not yet credited
+            day = txn['payment_date'] + timedelta(days=rng.randint(0, 1))
+            utr = str(rng.randint(10 ** 11, 10 ** 12 - 1))
+            if roll < 0.75:
+                narration, reference = f"UPI/{utr}/Fee Payment - Ref: {txn['reference_number']}/okaxis", utr
+            elif roll < 0.9:
+                narration, reference = f"UPI-{txn['reference_number']}-{utr}", utr
+            else:
+                narration, reference = f"UPI/{utr}/PAYMENT FROM PHONE", utr  # Reference lost; fallback only
+            writer.writerow([day.strftime('%d/%m/%Y'), narration, reference, '', f"{txn['amount']:,.2f}", 'CR'])
+            if rng.random() < 0.1:
+                writer.writerow([day.strftime('%d/%m/%Y'), 'NEFT/SALARY DEBIT', utr, '12,500.00', '', 'DR'])
+    return transactions
+
+def main():
+    """Reconcile statement exports against pending UPI payments"""
+    parser = argparse.ArgumentParser(description='Clear pending UPI payments from bank/PSP statement exports')
+    parser.add_argument('statements', nargs='*', help='CSV or Excel statement exports')
+    parser.add_argument('--tenant-id', default=TENANT_ID)
+    parser.add_argument('--window', type=int, default=DATE_WINDOW_DAYS, help='Days either side for fallback matches')
+    parser.add_argument('--no-fallback', action='store_true', help='Only accept reference matches')
+    parser.add_argument('--report', default=REPORT_FILE)
+    parser.add_argument('--dry-run', action='store_true', help='Match and report without updating the database')
+    parser.add_argument('--benchmark', type=int, metavar='PAYMENTS', help='Time matching on a synthetic statement')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    if args.benchmark:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'statement.csv')
+            transactions = make_synthetic_statement(path, args.benchmark)
+            start = time.perf_counter()
+            matches, unmatched = reconcile(PendingIndex(transactions), iter_statement_chunks(path),
+                                           None if args.no_fallback else args.window)
+            elapsed = time.perf_counter() - start
+        wrong = sum(1 for match in matches if match['txn']['reference_number'] not in match['line'].narration
+                    and match['method'] == 'reference')
+        methods = pd.Series([match['method'] for match in matches]).value_counts().to_dict()
+        print(f"{len(transactions)} pending payments: {len(matches)} matched {methods}, {len(unmatched)} "
+              f"statement credits unmatched, {wrong} suspect, in {elapsed:.2f}s")
+        return True
+
+    if not args.statements:
+        logger.error("Give at least one statement file")
+        return False
+
+    from import_students import connect_database
+    conn = connect_database()
+    if not conn:
+        return False
+
+    pending = load_pending(conn, args.tenant_id)
+    logger.info(f"{len(pending)} UPI payments awaiting verification")
+    if not pending:
+        return True
+
+    references, bank_references = load_settled(conn, args.tenant_id)
+    start = time.perf_counter()
+    chunks = (chunk for path in args.statements for chunk in iter_statement_chunks(path))
+    matches, unmatched = reconcile(PendingIndex(pending, references, bank_references), chunks, None if args.no_fallback else args.window)
+    write_report(matches, unmatched, args.report)
+    logger.info(f"{len(matches)} payments matched, {len(unmatched)} statement credits unmatched in "
+                f"{time.perf_counter() - start:.1f}s (report: {args.report})")
+
+    if args.dry_run or not matches:
+        return True
+    clear_matches(conn, matches, args.tenant_id)
+    return True
+
+if __name__ == "__main__":
+    sys.exit(0 if main() else 1)